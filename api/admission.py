@@ -0,0 +1,157 @@
+"""Contrôle d'admission des générations Ollama (chemin asynchrone).
+
+Chaque modèle a un sémaphore de `GENERATION_CONCURRENCY` générations
+simultanées devant lequel au plus `GENERATION_MAX_WAITING` requêtes
+peuvent attendre. Au-delà (ou après `GENERATION_QUEUE_TIMEOUT_SECONDS`
+d'attente), `OverloadedError` est levée et l'API répond 503 avec un
+en-tête Retry-After estimé à partir de la durée moyenne des générations :
+pendant un pic, les requêtes en trop échouent vite au lieu de
+s'accumuler jusqu'au timeout.
+
+`Coalescer` fusionne les questions identiques en cours de traitement :
+les requêtes suivantes attendent le résultat de la première au lieu de
+relancer une génération.
+"""
+import asyncio
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict, Hashable
+
+from config import GENERATION_CONCURRENCY, GENERATION_MAX_WAITING, GENERATION_QUEUE_TIMEOUT_SECONDS
+
+
+class OverloadedError(RuntimeError):
+    """Trop de générations en cours ou en attente pour ce modèle."""
+
+    def __init__(self, model_name: str, retry_after: int):
+        super().__init__(f"Modèle {model_name} saturé, réessayez dans {retry_after}s")
+        self.model_name = model_name
+        self.retry_after = retry_after
+
+
+class ModelLimiter:
+    def __init__(self, model_name: str, concurrency: int = GENERATION_CONCURRENCY,
+                 max_waiting: int = GENERATION_MAX_WAITING,
+                 queue_timeout: float = GENERATION_QUEUE_TIMEOUT_SECONDS):
+        self.model_name = model_name
+        self.concurrency = max(1, concurrency)
+        self.max_waiting = max_waiting
+        self.queue_timeout = queue_timeout
+        self._semaphore = None
+        self._loop = None
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._avg_seconds = None
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # Un sémaphore asyncio est lié à sa boucle (une seule en production, une par client de test)
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._loop = loop
+        return self._semaphore
+
+    def retry_after(self) -> int:
+        """Délai estimé avant qu'une place se libère, en secondes."""
+        average = self._avg_seconds or 10.0
+        return max(1, math.ceil(average * (self.waiting + 1) / self.concurrency))
+
+    def _reject(self) -> OverloadedError:
+        self.rejected += 1
+        return OverloadedError(self.model_name, self.retry_after())
+
+    @asynccontextmanager
+    async def slot(self):
+        """Réserve une place de génération, ou lève `OverloadedError`."""
+        semaphore = self._get_semaphore()
+        if semaphore.locked() and self.waiting >= self.max_waiting:
+            raise self._reject()
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise self._reject()
+        finally:
+            self.waiting -= 1
+
+        self.active += 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            # Moyenne glissante de la durée d'une génération
+            self._avg_seconds = elapsed if self._avg_seconds is None else 0.8 * self._avg_seconds + 0.2 * elapsed
+            self.active -= 1
+            semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+            "concurrency": self.concurrency,
+            "max_waiting": self.max_waiting,
+            "avg_generation_s": round(self._avg_seconds, 2) if self._avg_seconds else None,
+        }
+
+
+class Coalescer:
+    """
+    Partage le résultat d'un traitement entre les appels identiques simultanés.
+
+    Le traitement tourne dans une tâche détachée que chaque appelant attend
+    via `asyncio.shield` : l'annulation d'un appelant (client déconnecté),
+    même le premier, n'interrompt pas les autres. La tâche n'est annulée
+    que lorsque plus personne ne l'attend.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._waiters: Dict[Hashable, int] = {}
+        self.coalesced = 0
+
+    def _done(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+            self._waiters.pop(key, None)
+        # Évite l'avertissement "exception never retrieved" quand personne n'attendait plus
+        task.cancelled() or task.exception()
+
+    async def run(self, key: Hashable, factory: Callable[[], Awaitable]):
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self._inflight.get(key) is task:
+                self._waiters[key] -= 1
+                if not self._waiters[key]:
+                    task.cancel()
+            raise
+
+
+_limiters: Dict[str, ModelLimiter] = {}
+coalescer = Coalescer()
+
+
+def get_limiter(model_name: str) -> ModelLimiter:
+    limiter = _limiters.get(model_name)
+    if limiter is None:
+        limiter = _limiters[model_name] = ModelLimiter(model_name)
+    return limiter
+
+
+def admission_stats() -> dict:
+    return {
+        "models": {name: limiter.stats() for name, limiter in _limiters.items()},
+        "coalesced": coalescer.coalesced,
+    }
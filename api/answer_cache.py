@@ -0,0 +1,155 @@
+"""Cache à deux niveaux des réponses de `query_documents()`.
+
+1. Niveau exact : LRU indexé par question normalisée + modèle + version de l'index.
+2. Niveau sémantique : réutilise la réponse d'une question déjà posée dont
+   l'embedding est à une similarité cosinus supérieure au seuil configuré.
+
+Les deux niveaux ont leur propre TTL. Toute modification de la collection
+par `index_document()` change la version de l'index (date de modification
+du manifeste), ce qui invalide les réponses existantes, y compris dans les
+autres workers.
+"""
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import List, Optional
+
+import numpy as np
+
+from config import (
+    ANSWER_CACHE_ENABLED,
+    ANSWER_CACHE_MAX_ENTRIES,
+    ANSWER_CACHE_TTL_SECONDS,
+    ANSWER_CACHE_SEMANTIC_MAX_ENTRIES,
+    ANSWER_CACHE_SEMANTIC_TTL_SECONDS,
+    ANSWER_CACHE_SEMANTIC_THRESHOLD,
+    INDEX_MANIFEST_PATH,
+)
+
+
+def normalize_question(question: str) -> str:
+    """Minuscules, espaces compactés, ponctuation finale retirée."""
+    text = unicodedata.normalize("NFC", question).lower()
+    text = " ".join(text.split())
+    return re.sub(r"[\s?!.…]+$", "", text)
+
+
+def index_version() -> int:
+    """Version de l'index : date de modification du manifeste d'indexation."""
+    try:
+        return os.stat(INDEX_MANIFEST_PATH).st_mtime_ns
+    except OSError:
+        return 0
+
+
+class AnswerCache:
+    def __init__(self, max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+                 ttl: float = ANSWER_CACHE_TTL_SECONDS,
+                 semantic_max_entries: int = ANSWER_CACHE_SEMANTIC_MAX_ENTRIES,
+                 semantic_ttl: float = ANSWER_CACHE_SEMANTIC_TTL_SECONDS,
+                 semantic_threshold: float = ANSWER_CACHE_SEMANTIC_THRESHOLD):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.semantic_max_entries = semantic_max_entries
+        self.semantic_ttl = semantic_ttl
+        self.semantic_threshold = semantic_threshold
+        self._lock = threading.Lock()
+        self._exact = OrderedDict()   # (question, modèle, version) -> (résultat, créé_le)
+        self._semantic = []           # [(vecteur, modèle, version, résultat, créé_le)]
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    def get(self, question: str, model_name: str,
+            query_vector: Optional[List[float]] = None) -> Optional[dict]:
+        """
+        Cherche une réponse en cache.
+
+        Returns:
+            dict | None: {"result": ..., "tier": "exact" | "semantic", "similarity": ...}
+        """
+        version = index_version()
+        key = (normalize_question(question), model_name, version)
+        now = time.time()
+        with self._lock:
+            entry = self._exact.get(key)
+            if entry is not None:
+                result, created_at = entry
+                if now - created_at <= self.ttl:
+                    self._exact.move_to_end(key)
+                    self.exact_hits += 1
+                    return {"result": result, "tier": "exact", "similarity": 1.0}
+                del self._exact[key]
+
+            if query_vector is not None:
+                match = self._semantic_lookup(query_vector, model_name, version, now)
+                if match is not None:
+                    self.semantic_hits += 1
+                    return {"result": match[0], "tier": "semantic", "similarity": match[1]}
+
+            self.misses += 1
+            return None
+
+    def _semantic_lookup(self, query_vector, model_name: str, version: int, now: float):
+        # Purge des entrées expirées ou obsolètes
+        self._semantic = [
+            entry for entry in self._semantic
+            if now - entry[4] <= self.semantic_ttl and entry[2] == version
+        ]
+        candidates = [entry for entry in self._semantic if entry[1] == model_name]
+        if not candidates:
+            return None
+
+        query = np.asarray(query_vector, dtype=np.float32)
+        query /= (np.linalg.norm(query) or 1.0)
+        matrix = np.stack([entry[0] for entry in candidates])
+        similarities = matrix @ query
+        best = int(np.argmax(similarities))
+        if similarities[best] >= self.semantic_threshold:
+            return candidates[best][3], round(float(similarities[best]), 4)
+        return None
+
+    def put(self, question: str, model_name: str, result,
+            query_vector: Optional[List[float]] = None) -> None:
+        """Enregistre le résultat d'une question (réponse, route, sources...)."""
+        version = index_version()
+        now = time.time()
+        with self._lock:
+            key = (normalize_question(question), model_name, version)
+            self._exact[key] = (result, now)
+            self._exact.move_to_end(key)
+            while len(self._exact) > self.max_entries:
+                self._exact.popitem(last=False)
+
+            if query_vector is not None:
+                vector = np.asarray(query_vector, dtype=np.float32)
+                vector /= (np.linalg.norm(vector) or 1.0)
+                self._semantic.append((vector, model_name, version, result, now))
+                if len(self._semantic) > self.semantic_max_entries:
+                    self._semantic = self._semantic[-self.semantic_max_entries:]
+
+    def invalidate(self) -> None:
+        """Vide les deux niveaux (appelé quand la collection change)."""
+        with self._lock:
+            self._exact.clear()
+            self._semantic = []
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.exact_hits + self.semantic_hits + self.misses
+            return {
+                "enabled": ANSWER_CACHE_ENABLED,
+                "exact_entries": len(self._exact),
+                "semantic_entries": len(self._semantic),
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.exact_hits + self.semantic_hits) / total, 4) if total else None,
+                "index_version": index_version(),
+            }
+
+
+answer_cache = AnswerCache()
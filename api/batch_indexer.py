@@ -0,0 +1,306 @@
+"""Ingestion par lots sous forme de pipeline en flux continu.
+
+Chaque étape (parsing → découpage → embeddings → écriture) tourne
+dans son propre thread et communique avec la suivante par une file bornée :
+le parsing du document suivant se fait pendant l'encodage du document
+courant et pendant les insertions dans la base vectorielle du précédent. Les files bornées
+limitent la mémoire utilisée lorsque l'écriture est plus lente que le parsing.
+
+Comme `index_document()`, le pipeline est incrémental : seuls les chunks
+absents du manifeste sont encodés et écrits.
+
+Usage en ligne de commande :
+    python batch_indexer.py ./data
+"""
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Union
+
+from config import PIPELINE_QUEUE_SIZE, PIPELINE_EMBED_BATCH_SIZE
+from index_document import (
+    load_documents,
+    chunk_documents,
+    embed_chunks,
+    write_chunks,
+    plan_update,
+    apply_deletions,
+    commit_plan,
+    _page_key,
+    _report,
+)
+from embeddings_service import get_embeddings
+from index_manifest import get_manifest, file_sha256
+from vector_store import get_vector_backend
+from uploads import SpooledUpload
+
+SUPPORTED_EXTENSIONS = (".pdf", ".pptx")
+_END = object()
+
+
+@dataclass
+class StageStats:
+    """Compteurs d'une étape du pipeline."""
+    items: int = 0
+    busy_seconds: float = 0.0
+
+    def throughput(self) -> Optional[float]:
+        return round(self.items / self.busy_seconds, 2) if self.busy_seconds else None
+
+
+@dataclass
+class PipelineReport:
+    documents: int = 0                                      # documents écrits et validés
+    unchanged: list = field(default_factory=list)
+    failed: dict = field(default_factory=dict)
+    deleted: int = 0
+    parse: StageStats = field(default_factory=StageStats)   # pages
+    chunk: StageStats = field(default_factory=StageStats)   # chunks
+    embed: StageStats = field(default_factory=StageStats)   # vecteurs
+    write: StageStats = field(default_factory=StageStats)   # objets insérés (ou remplacés)
+    wall_seconds: float = 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "documents": self.documents,
+            "unchanged": self.unchanged,
+            "failed": self.failed,
+            "wall_seconds": round(self.wall_seconds, 3),
+            "pages": self.parse.items,
+            "chunks": self.chunk.items,
+            "vectors": self.embed.items,
+            "inserted": self.write.items,
+            "deleted": self.deleted,
+            "throughput": {
+                "pages_per_s": self.parse.throughput(),
+                "chunks_per_s": self.chunk.throughput(),
+                "vectors_per_s": self.embed.throughput(),
+                "inserted_per_s": self.write.throughput(),
+            },
+            "busy_seconds": {
+                "parse": round(self.parse.busy_seconds, 3),
+                "chunk": round(self.chunk.busy_seconds, 3),
+                "embed": round(self.embed.busy_seconds, 3),
+                "write": round(self.write.busy_seconds, 3),
+            },
+        }
+
+
+def list_documents(directory: str) -> List[str]:
+    """Liste les fichiers PDF/PowerPoint d'un dossier, triés par nom."""
+    return sorted(
+        os.path.join(directory, name)
+        for name in os.listdir(directory)
+        if name.lower().endswith(SUPPORTED_EXTENSIONS)
+    )
+
+
+def run_pipeline(paths: List[Union[str, SpooledUpload]], progress: Optional[Callable[..., None]] = None,
+                 queue_size: int = PIPELINE_QUEUE_SIZE,
+                 embed_batch_size: int = PIPELINE_EMBED_BATCH_SIZE) -> dict:
+    """
+    Indexe plusieurs fichiers en faisant se chevaucher les étapes du pipeline.
+
+    Args:
+        paths (list): Chemins des fichiers PDF/PowerPoint à indexer, ou fichiers
+            reçus par l'API (`SpooledUpload`, libérés dès leur chargement).
+        progress (callable, optional): Callback de suivi (voir `jobs.Job.update`).
+        queue_size (int): Taille maximale des files entre deux étapes.
+        embed_batch_size (int): Nombre de chunks encodés puis insérés par lot.
+
+    Returns:
+        dict: Rapport de débit par étape (pages/s, chunks/s, vecteurs/s) ; les
+            erreurs (`failed`) sont indexées par chemin, ou par nom pour un fichier reçu.
+    """
+    report = PipelineReport()
+    embeddings = get_embeddings()
+    parsed_q = queue.Queue(maxsize=queue_size)
+    chunked_q = queue.Queue(maxsize=queue_size)
+    embedded_q = queue.Queue(maxsize=queue_size)
+    failed_lock = threading.Lock()
+    failed_positions = set()
+    labels = [item.name if isinstance(item, SpooledUpload) else item for item in paths]
+    errors = []
+    # Compteurs par document, ajoutés au rapport seulement une fois le document validé :
+    # un fichier en échec ne compte ni dans `documents` ni dans les débits
+    document_stats = {}
+    seen = {"pages": 0, "chunks": 0, "written": 0}         # avancement affiché (tous documents)
+
+    def stage_stats(position: int, stage: str) -> StageStats:
+        return document_stats.setdefault(position, {}).setdefault(stage, StageStats())
+
+    def committed(position: int) -> None:
+        for stage, stats in document_stats.pop(position, {}).items():
+            total = getattr(report, stage)
+            total.items += stats.items
+            total.busy_seconds += stats.busy_seconds
+        report.documents += 1
+
+    # Les fichiers sont suivis par leur position dans le lot : deux chemins
+    # peuvent avoir le même nom de fichier
+    def fail(position: int, error: Exception) -> None:
+        with failed_lock:
+            failed_positions.add(position)
+            report.failed[labels[position]] = str(error)
+        document_stats.pop(position, None)
+
+    def is_failed(position: int) -> bool:
+        with failed_lock:
+            return position in failed_positions
+
+    def parse_stage():
+        sources = set()
+        try:
+            for position, item in enumerate(paths):
+                start = time.perf_counter()
+                upload = item if isinstance(item, SpooledUpload) else None
+                # Pour un fichier reçu, le nom de la source tient lieu de chemin
+                path = upload.name if upload is not None else item
+                try:
+                    # La source est le nom du fichier : un homonyme écraserait le premier
+                    if os.path.basename(path) in sources:
+                        raise ValueError(f"Un autre fichier du lot s'appelle déjà {os.path.basename(path)}")
+                    sources.add(os.path.basename(path))
+                    # Un fichier identique à la dernière indexation est ignoré
+                    file_hash = upload.sha256 if upload is not None else file_sha256(path)
+                    if get_manifest().is_unchanged(os.path.basename(path), file_hash):
+                        report.unchanged.append(os.path.basename(path))
+                        continue
+                    documents = load_documents(path, content=upload)
+                except Exception as e:
+                    fail(position, e)
+                    continue
+                finally:
+                    if upload is not None:
+                        upload.close()
+                pages = len({_page_key(doc) for doc in documents})
+                stats = stage_stats(position, "parse")
+                stats.busy_seconds += time.perf_counter() - start
+                stats.items += pages
+                seen["pages"] += pages
+                _report(progress, "pipeline", pages_done=seen["pages"])
+                parsed_q.put((position, path, file_hash, documents))
+        finally:
+            # Tampons non consommés (erreur en amont) : libérés quand même
+            for item in paths:
+                if isinstance(item, SpooledUpload):
+                    item.close()
+            parsed_q.put(_END)
+
+    def chunk_stage():
+        try:
+            while (item := parsed_q.get()) is not _END:
+                position, path, file_hash, documents = item
+                source = os.path.basename(path)
+                start = time.perf_counter()
+                try:
+                    chunks = chunk_documents(documents, embeddings, source=source)
+                    plan = plan_update(source, file_hash, chunks)
+                except Exception as e:
+                    fail(position, e)
+                    continue
+                stats = stage_stats(position, "chunk")
+                stats.busy_seconds += time.perf_counter() - start
+                stats.items += len(chunks)
+                seen["chunks"] += len(chunks)
+                _report(progress, "pipeline", chunks_total=seen["chunks"])
+
+                # begin → lots de chunks nouveaux → commit du manifeste
+                chunked_q.put(("begin", position, plan))
+                for i in range(0, len(plan.new_chunks), embed_batch_size):
+                    chunked_q.put(("chunks", position,
+                                   plan.new_chunks[i:i + embed_batch_size],
+                                   plan.new_uuids[i:i + embed_batch_size]))
+                chunked_q.put(("commit", position, plan))
+        finally:
+            chunked_q.put(_END)
+
+    def embed_stage():
+        try:
+            while (item := chunked_q.get()) is not _END:
+                if item[0] != "chunks":
+                    embedded_q.put(item)
+                    continue
+                _, position, batch, uuids = item
+                start = time.perf_counter()
+                try:
+                    vectors = embed_chunks(batch, embeddings)
+                except Exception as e:
+                    fail(position, e)
+                    continue
+                stats = stage_stats(position, "embed")
+                stats.busy_seconds += time.perf_counter() - start
+                stats.items += len(vectors)
+                embedded_q.put(("chunks", position, batch, uuids, vectors))
+        finally:
+            embedded_q.put(_END)
+
+    def write_stage():
+        try:
+            backend = get_vector_backend()
+            while (item := embedded_q.get()) is not _END:
+                kind, position = item[0], item[1]
+                if is_failed(position):
+                    continue
+                start = time.perf_counter()
+                stats = stage_stats(position, "write")
+                try:
+                    if kind == "begin":
+                        report.deleted += apply_deletions(backend, item[2])
+                    elif kind == "chunks":
+                        _, _, batch, uuids, vectors = item
+                        written = write_chunks(backend, batch, vectors, uuids)
+                        stats.items += written
+                        seen["written"] += written
+                    else:
+                        commit_plan(backend, item[2])
+                except Exception as e:
+                    fail(position, e)
+                    continue
+                stats.busy_seconds += time.perf_counter() - start
+                if kind == "commit":
+                    committed(position)
+                _report(progress, "pipeline", chunks_done=seen["written"])
+        except Exception as e:
+            errors.append(e)
+            # Vider la file pour débloquer les étapes amont
+            while embedded_q.get() is not _END:
+                pass
+
+    _report(progress, "pipeline", pages_done=0, chunks_done=0)
+    start = time.perf_counter()
+    threads = [
+        threading.Thread(target=stage, name=f"pipeline-{stage.__name__}", daemon=True)
+        for stage in (parse_stage, chunk_stage, embed_stage, write_stage)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    report.wall_seconds = time.perf_counter() - start
+
+    if errors:
+        raise errors[0]
+
+    result = report.to_dict()
+    print(f"✅ Pipeline terminé : {json.dumps(result['throughput'])}")
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Indexe tous les PDF/PowerPoint d'un dossier.")
+    parser.add_argument("directory", nargs="?", default="data", help="Dossier à indexer (défaut : data)")
+    parser.add_argument("--queue-size", type=int, default=PIPELINE_QUEUE_SIZE)
+    parser.add_argument("--batch-size", type=int, default=PIPELINE_EMBED_BATCH_SIZE)
+    args = parser.parse_args()
+
+    files = list_documents(args.directory)
+    print(f"📂 {len(files)} fichier(s) à indexer dans {args.directory}")
+    print(json.dumps(
+        run_pipeline(files, queue_size=args.queue_size, embed_batch_size=args.batch_size),
+        indent=2, ensure_ascii=False
+    ))
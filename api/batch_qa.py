@@ -0,0 +1,191 @@
+"""Réponses à un lot de questions (endpoint /predict_batch et évaluation hors ligne).
+
+Les questions sont encodées en un seul appel vectorisé, la recherche
+(+ reranking) tourne en parallèle dans le pool de threads, et les
+générations sont envoyées à Ollama (`ainvoke`) derrière le limiteur du
+modèle, comme /predict : la recherche des questions suivantes avance
+pendant que le LLM répond, sans dépasser la concurrence admise par modèle.
+
+Format d'entrée (JSONL, une question par ligne) :
+    {"id": "q1", "question": "Qu'est-ce que Smart Support ?", "model": "mistral"}
+("id" et "model" sont optionnels ; "text" est accepté à la place de "question".)
+
+Usage en ligne de commande :
+    python batch_qa.py questions.jsonl -o reponses.jsonl --model llama3.2
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import Iterable, List, Optional
+
+from answer_cache import answer_cache
+from config import (
+    ANSWER_CACHE_ENABLED,
+    PREDICT_BATCH_RETRIEVAL_WORKERS,
+    PREDICT_BATCH_GENERATION_WORKERS,
+)
+from admission import get_limiter
+from metrics import span
+from embeddings_service import get_embeddings
+from context_builder import estimate_tokens
+from rag import _prepare, _generation_chain, _serve_cached, _finish, _elapsed_ms
+
+
+def parse_questions(lines: Iterable[str], default_model: str = "llama3.2") -> List[dict]:
+    """
+    Lit les questions d'un flux JSONL.
+
+    Raises:
+        ValueError: Si une ligne n'est pas un objet JSON avec une question.
+    """
+    items = []
+    for number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Ligne {number} : JSON invalide ({e.msg})")
+        question = record.get("question", record.get("text")) if isinstance(record, dict) else None
+        if not isinstance(question, str) or not question.strip():
+            raise ValueError(f"Ligne {number} : champ 'question' manquant")
+        items.append({
+            "id": record.get("id", number),
+            "question": question.strip(),
+            "model": record.get("model") or default_model,
+        })
+    return items
+
+
+def _retrieve(item: dict, query_vector: List[float]) -> dict:
+    """Cache de réponses, puis recherche et routage d'une question."""
+    start = time.perf_counter()
+    timings = {}
+    state = {"item": item, "start": start, "timings": timings, "vector": query_vector}
+    if ANSWER_CACHE_ENABLED:
+        cached = answer_cache.get(item["question"], item["model"], query_vector)
+        if cached is not None:
+            result = _serve_cached(cached, item["model"], start, timings)
+            state["result"] = {**result, "cached": cached["tier"]}
+            return state
+    state["route"], state["docs"], state["sources"], _ = _prepare(item["question"], query_vector, timings)
+    return state
+
+
+async def _generate(state: dict) -> dict:
+    """Génération de la réponse d'une question déjà routée (sous le limiteur du modèle)."""
+    item, timings = state["item"], state["timings"]
+    if "result" not in state:
+        chain, generation_input = _generation_chain(state["route"], item["model"], state["docs"],
+                                                    item["question"], timings)
+        async with get_limiter(item["model"]).slot():
+            timings["queue_ms"] = round((time.perf_counter() - state["ready"]) * 1000, 1)
+            with span("query", "generate", timings):
+                answer = (await chain.ainvoke(generation_input)).strip()
+        result = _finish(item["question"], item["model"], state["route"], state["sources"], answer,
+                         estimate_tokens(answer), state["vector"], state["start"], timings)
+        state["result"] = {**result, "cached": None}
+    timings["total_ms"] = _elapsed_ms(state["start"])
+    return state
+
+
+def _output(item: dict, result: Optional[dict] = None, timings: Optional[dict] = None,
+            error: Optional[str] = None) -> dict:
+    record = {"id": item["id"], "question": item["question"], "model": item["model"]}
+    if error is not None:
+        record["error"] = error
+    else:
+        record.update(result)
+    record["latency_ms"] = (timings or {}).get("total_ms")
+    record["timings"] = timings or {}
+    return record
+
+
+async def aanswer_batch(items: List[dict], retrieval_workers: int = PREDICT_BATCH_RETRIEVAL_WORKERS,
+                        generation_workers: int = PREDICT_BATCH_GENERATION_WORKERS) -> List[dict]:
+    """
+    Répond à une liste de questions (voir `parse_questions`).
+
+    Args:
+        items: Questions {"id", "question", "model"}.
+        retrieval_workers: Recherches simultanées (embeddings déjà calculés).
+        generation_workers: Générations du lot en cours ou en attente du
+            limiteur à un instant donné ; le reste du lot attend ici plutôt
+            que de remplir la file d'attente du modèle.
+
+    Returns:
+        list: Une entrée par question, dans l'ordre d'entrée : réponse, route,
+            sources, latence et durées par étape (ou "error", y compris
+            quand le modèle est saturé).
+    """
+    if not items:
+        return []
+
+    # 1. Un seul encodage vectorisé pour toutes les questions
+    start = time.perf_counter()
+    vectors = await asyncio.to_thread(get_embeddings().embed_documents, [item["question"] for item in items])
+    embed_ms = _elapsed_ms(start)
+    print(f"🧮 {len(items)} question(s) encodée(s) en {embed_ms} ms")
+
+    # 2. Recherches en parallèle ; chaque question routée part aussitôt en génération
+    retrievals = asyncio.Semaphore(max(1, retrieval_workers))
+    generations = asyncio.Semaphore(max(1, generation_workers))
+
+    async def answer(item: dict, vector: List[float]) -> dict:
+        try:
+            async with retrievals:
+                state = await asyncio.to_thread(_retrieve, item, vector)
+            state["ready"] = time.perf_counter()
+            async with generations:
+                state = await _generate(state)
+        except Exception as e:
+            return _output(item, error=str(e))
+        state["timings"]["embed_ms"] = round(embed_ms / len(items), 1)
+        return _output(item, state["result"], state["timings"])
+
+    return list(await asyncio.gather(*(answer(item, vector) for item, vector in zip(items, vectors))))
+
+
+def summarize(results: List[dict], wall_seconds: float) -> dict:
+    """Statistiques globales d'un lot (latences p50/p95, débit, erreurs)."""
+    latencies = sorted(r["latency_ms"] for r in results if r.get("latency_ms") is not None)
+
+    def percentile(p):
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(round(p / 100 * (len(latencies) - 1))))]
+
+    return {
+        "questions": len(results),
+        "errors": sum(1 for r in results if "error" in r),
+        "cached": sum(1 for r in results if r.get("cached")),
+        "grounded": sum(1 for r in results if r.get("route") == "grounded"),
+        "wall_seconds": round(wall_seconds, 2),
+        "questions_per_s": round(len(results) / wall_seconds, 2) if wall_seconds else None,
+        "latency_p50_ms": percentile(50),
+        "latency_p95_ms": percentile(95),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Répond à un fichier JSONL de questions.")
+    parser.add_argument("questions", help="Fichier JSONL d'entrée")
+    parser.add_argument("-o", "--output", default="reponses.jsonl", help="Fichier JSONL de sortie")
+    parser.add_argument("--model", default="llama3.2", help="Modèle par défaut")
+    parser.add_argument("--retrieval-workers", type=int, default=PREDICT_BATCH_RETRIEVAL_WORKERS)
+    parser.add_argument("--generation-workers", type=int, default=PREDICT_BATCH_GENERATION_WORKERS)
+    args = parser.parse_args()
+
+    with open(args.questions, encoding="utf-8") as f:
+        questions = parse_questions(f, default_model=args.model)
+    print(f"📂 {len(questions)} question(s) lue(s) dans {args.questions}")
+
+    started = time.perf_counter()
+    answers = asyncio.run(aanswer_batch(questions, args.retrieval_workers, args.generation_workers))
+    with open(args.output, "w", encoding="utf-8") as f:
+        for record in answers:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    print(f"✅ Réponses écrites dans {args.output}")
+    print(json.dumps(summarize(answers, time.perf_counter() - started), indent=2, ensure_ascii=False))
@@ -0,0 +1,531 @@
+"""Benchmark de bout en bout, hors ligne et sans GPU.
+
+Le benchmark passe par les vrais chemins de code (`index_document()`,
+`PowerPointLoader.load()`, `answer_question()`) en remplaçant seulement les
+dépendances externes :
+
+- Ollama par le faux serveur déterministe de `fake_ollama.py` ;
+- Weaviate par le backend FAISS en mémoire/sur disque temporaire ;
+- optionnellement (`--embeddings fake`), le modèle sentence-transformers
+  par des embeddings de hachage déterministes.
+
+Il mesure le temps de démarrage de l'API (import de `main`, lifespan,
+sondes de santé, dans un processus neuf), le débit d'ingestion selon la taille des documents, les latences
+p50/p95/p99 des requêtes selon la taille du corpus et la concurrence, ainsi
+que la mémoire de pointe de chaque phase. Les résultats sont écrits en JSON
+pour comparer les commits entre eux.
+
+Usage en ligne de commande :
+    python benchmark.py -o bench.json
+    python benchmark.py --quick --embeddings fake
+"""
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from fake_ollama import FakeOllamaServer
+
+_VOCABULARY = (
+    "support client plateforme service qualité délai traitement demande équipe projet "
+    "transformation digitale conseil offre contrat facturation incident ticket priorité "
+    "niveau escalade rapport indicateur performance sécurité accès utilisateur réseau "
+    "serveur sauvegarde migration cloud données analyse tableau budget planning réunion "
+    "formation documentation procédure validation livraison maintenance évolution"
+).split()
+
+
+# ---------------------------------------------------------------------------
+# Outils de mesure
+# ---------------------------------------------------------------------------
+
+def _rss_mb() -> Optional[float]:
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss / (1024 * 1024)
+
+
+class PeakMemory:
+    """Échantillonne la mémoire résidente pendant un bloc et retient le pic (Mo)."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.start_mb = None
+        self.peak_mb = None
+        self._stop = threading.Event()
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            current = _rss_mb()
+            if current is not None and current > self.peak_mb:
+                self.peak_mb = current
+
+    def __enter__(self):
+        self.start_mb = self.peak_mb = _rss_mb()
+        if self.start_mb is not None:
+            self._thread = threading.Thread(target=self._sample, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self.start_mb is not None:
+            self._thread.join()
+            self.peak_mb = max(self.peak_mb, _rss_mb())
+
+    def to_dict(self) -> dict:
+        if self.start_mb is None:
+            return {"rss_start_mb": None, "rss_peak_mb": None, "rss_growth_mb": None}
+        return {
+            "rss_start_mb": round(self.start_mb, 1),
+            "rss_peak_mb": round(self.peak_mb, 1),
+            "rss_growth_mb": round(self.peak_mb - self.start_mb, 1),
+        }
+
+
+def _percentiles(values: List[float]) -> dict:
+    if not values:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None, "mean_ms": None, "max_ms": None}
+    array = np.asarray(values)
+    return {
+        "p50_ms": round(float(np.percentile(array, 50)), 1),
+        "p95_ms": round(float(np.percentile(array, 95)), 1),
+        "p99_ms": round(float(np.percentile(array, 99)), 1),
+        "mean_ms": round(float(array.mean()), 1),
+        "max_ms": round(float(array.max()), 1),
+    }
+
+
+@contextlib.contextmanager
+def _quiet(enabled: bool = True):
+    """Masque les traces de diagnostic des modules pendant les mesures."""
+    if not enabled:
+        yield
+        return
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+# ---------------------------------------------------------------------------
+# Données synthétiques
+# ---------------------------------------------------------------------------
+
+def _sentence(rng: random.Random, words: int = 14) -> str:
+    text = " ".join(rng.choice(_VOCABULARY) for _ in range(words))
+    return text[0].upper() + text[1:] + "."
+
+
+def _paragraph(rng: random.Random, sentences: int = 5) -> str:
+    return " ".join(_sentence(rng) for _ in range(sentences))
+
+
+def write_pptx(path: str, slides: int, seed: int = 0) -> str:
+    """PowerPoint synthétique : un titre, du texte et un tableau par slide."""
+    from pptx import Presentation
+    from pptx.util import Inches
+
+    rng = random.Random(seed)
+    presentation = Presentation()
+    layout = presentation.slide_layouts[1]
+    for number in range(slides):
+        slide = presentation.slides.add_slide(layout)
+        slide.shapes.title.text = f"Slide {number + 1} : {rng.choice(_VOCABULARY)}"
+        slide.placeholders[1].text = _paragraph(rng, 3)
+        table = slide.shapes.add_table(3, 3, Inches(1), Inches(5), Inches(6), Inches(1)).table
+        for row in range(3):
+            for col in range(3):
+                table.cell(row, col).text = rng.choice(_VOCABULARY)
+    presentation.save(path)
+    return path
+
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(path: str, pages: int, seed: int = 0, lines_per_page: int = 40) -> str:
+    """PDF synthétique avec une couche texte (Helvetica), sans dépendance externe."""
+    rng = random.Random(seed)
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None,
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>"]
+    page_refs = []
+    for _ in range(pages):
+        lines = ["BT /F1 10 Tf 50 800 Td 12 TL"]
+        for _ in range(lines_per_page):
+            lines.append(f"({_pdf_escape(_sentence(rng, 10))}) Tj T*")
+        lines.append("ET")
+        stream = "\n".join(lines).encode("cp1252", errors="replace")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        content_ref = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_ref
+        )
+        page_refs.append(len(objects))
+    kids = b" ".join(b"%d 0 R" % ref for ref in page_refs)
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_refs))
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        out.write(b"%010d 00000 n \n" % offset)
+    out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+    with open(path, "wb") as f:
+        f.write(out.getvalue())
+    return path
+
+
+class HashingEmbeddings(Embeddings):
+    """Embeddings déterministes par hachage des tokens (aucun modèle à charger)."""
+
+    def __init__(self, dimension: int = 384):
+        from lexical_index import tokenize
+
+        self.dimension = dimension
+        self._tokenize = tokenize
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for token in self._tokenize(text) or [text]:
+            digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+            index = int.from_bytes(digest[:4], "little") % self.dimension
+            vector[index] += 1.0 if digest[4] & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+# ---------------------------------------------------------------------------
+# Environnement isolé
+# ---------------------------------------------------------------------------
+
+def configure_environment(workdir: str, ollama_url: str, args) -> None:
+    """Redirige tous les états persistants vers un dossier temporaire (avant tout import du projet)."""
+    os.environ.update({
+        "VECTOR_BACKEND": "faiss",
+        "FAISS_INDEX_DIR": os.path.join(workdir, "faiss"),
+        "FAISS_INDEX_TYPE": args.faiss_index,
+        "INDEX_MANIFEST_PATH": os.path.join(workdir, "manifest.json"),
+        "BM25_INDEX_PATH": os.path.join(workdir, "bm25.json"),
+        "EMBEDDING_CACHE_PATH": os.path.join(workdir, "embeddings.sqlite"),
+        "EMBEDDING_CACHE_ENABLED": "1" if args.embedding_cache else "0",
+        # Chaque requête doit traverser tout le pipeline
+        "ANSWER_CACHE_ENABLED": "0",
+        "OLLAMA_BASE_URL": ollama_url,
+        "OLLAMA_WARMUP_MODELS": "",
+        "RETRIEVAL_MODE": args.retrieval_mode,
+    })
+    if args.embeddings == "fake":
+        import embeddings_service
+
+        embeddings_service._embeddings = HashingEmbeddings()
+
+
+# ---------------------------------------------------------------------------
+# Phases
+# ---------------------------------------------------------------------------
+
+def bench_ingestion(workdir: str, sizes: List[int], formats: List[str], verbose: bool) -> List[dict]:
+    """Débit de `index_document()` (et de `PowerPointLoader.load()`) selon la taille du document."""
+    from index_document import index_document
+    from ppt_loader import PowerPointLoader
+
+    results = []
+    for fmt in formats:
+        for size in sizes:
+            path = os.path.join(workdir, f"bench_{size}.{fmt}")
+            (write_pdf if fmt == "pdf" else write_pptx)(path, size, seed=size)
+            entry = {"format": fmt, "pages": size, "bytes": os.path.getsize(path)}
+            try:
+                if fmt == "pptx":
+                    start = time.perf_counter()
+                    with _quiet(not verbose):
+                        PowerPointLoader(path).load()
+                    entry["loader_seconds"] = round(time.perf_counter() - start, 4)
+
+                with PeakMemory() as memory, _quiet(not verbose):
+                    start = time.perf_counter()
+                    report = index_document(path)
+                    elapsed = time.perf_counter() - start
+                entry.update({
+                    "seconds": round(elapsed, 4),
+                    "chunks": report.get("added", 0),
+                    "pages_per_s": round(size / elapsed, 2),
+                    "chunks_per_s": round(report.get("added", 0) / elapsed, 2),
+                    **memory.to_dict(),
+                })
+            except Exception as e:
+                entry["error"] = f"{type(e).__name__}: {e}"
+            print(f"📥 {fmt} {size} page(s) : {entry.get('seconds', entry.get('error'))}")
+            results.append(entry)
+    return results
+
+
+def _grow_corpus(target: int, rng: random.Random, batch_size: int = 500) -> int:
+    """Complète la collection avec des chunks synthétiques jusqu'à `target` objets."""
+    from langchain_core.documents import Document
+    from embeddings_service import get_embeddings
+    from index_document import write_chunks
+    from vector_store import get_vector_backend
+
+    backend = get_vector_backend()
+    embeddings = get_embeddings()
+    current = backend.count()
+    while current < target:
+        count = min(batch_size, target - current)
+        chunks = [
+            Document(page_content=_paragraph(rng, 3),
+                     metadata={"source": f"corpus_{(current + i) // 20}.pdf", "page": (current + i) % 20 + 1})
+            for i in range(count)
+        ]
+        uuids = [str(uuid.UUID(int=rng.getrandbits(128))) for _ in chunks]
+        write_chunks(backend, chunks, embeddings.embed_documents([c.page_content for c in chunks]), uuids)
+        current += count
+    return current
+
+
+def bench_queries(corpus_sizes: List[int], concurrency: List[int], queries: int,
+                  model: str, verbose: bool) -> List[dict]:
+    """Latences de `answer_question()` selon la taille du corpus et la concurrence."""
+    rng = random.Random(42)
+    with _quiet(not verbose):
+        import rag
+
+    results = []
+    for size in corpus_sizes:
+        with _quiet(not verbose):
+            start = time.perf_counter()
+            actual = _grow_corpus(size, rng)
+            grow_seconds = time.perf_counter() - start
+        # Moitié de questions proches du corpus, moitié hors sujet
+        questions = [
+            _sentence(rng, 8) if i % 2 == 0 else f"Quelle est la recette de la {i}e galette des rois ?"
+            for i in range(queries)
+        ]
+        for workers in concurrency:
+            latencies, stages, errors, routes = [], {}, 0, {}
+
+            def ask(question):
+                start = time.perf_counter()
+                response = rag.answer_question(question, model_name=model)
+                return (time.perf_counter() - start) * 1000, response
+
+            with PeakMemory() as memory, _quiet(not verbose), ThreadPoolExecutor(max_workers=workers) as pool:
+                wall_start = time.perf_counter()
+                futures = [pool.submit(ask, q) for q in questions]
+                for future in futures:
+                    try:
+                        latency, response = future.result()
+                    except Exception:
+                        errors += 1
+                        continue
+                    latencies.append(latency)
+                    routes[response["route"]] = routes.get(response["route"], 0) + 1
+                    for stage, value in response["timings"].items():
+                        if stage.endswith("_ms") and isinstance(value, (int, float)):
+                            stages.setdefault(stage, []).append(value)
+                wall = time.perf_counter() - wall_start
+
+            entry = {
+                "corpus_chunks": actual,
+                "concurrency": workers,
+                "queries": len(questions),
+                "errors": errors,
+                "routes": routes,
+                "queries_per_s": round(len(latencies) / wall, 2) if wall else None,
+                "latency": _percentiles(latencies),
+                "stages_mean_ms": {stage: round(float(np.mean(v)), 1) for stage, v in sorted(stages.items())},
+                "corpus_build_seconds": round(grow_seconds, 2),
+                **memory.to_dict(),
+            }
+            grow_seconds = 0.0
+            print(f"🔎 corpus={actual} concurrence={workers} p50={entry['latency']['p50_ms']} ms "
+                  f"p95={entry['latency']['p95_ms']} ms")
+            results.append(entry)
+    return results
+
+
+# Exécuté dans un processus neuf : import de l'API, lifespan, puis sondes
+_STARTUP_PROBE = r"""
+import json, sys, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter() - start
+from fastapi.testclient import TestClient
+with TestClient(main.app) as client:
+    live = client.get("/health/live").status_code
+    started = time.perf_counter() - start
+    # Attente de la fin du préchargement (la sonde peut rester à 503 si un composant échoue)
+    while True:
+        response = client.get("/health/ready")
+        ready, prewarm = response.status_code, response.json()["prewarm"]
+        if prewarm["state"] not in ("pending", "running") or time.perf_counter() - start > 300:
+            break
+        time.sleep(0.05)
+    ready_seconds = time.perf_counter() - start
+heavy = ("torch", "sentence_transformers", "langchain_huggingface", "langchain_community",
+         "unstructured", "pandas", "pptx", "pytesseract", "weaviate", "langchain_ollama", "faiss")
+print(json.dumps({
+    "import_seconds": imported,
+    "live_seconds": started,
+    "ready_seconds": ready_seconds,
+    "live_status": live,
+    "ready_status": ready,
+    "modules": len(sys.modules),
+    "heavy_modules": [name for name in heavy if name in sys.modules],
+    "prewarm": prewarm,
+}))
+"""
+
+
+def bench_startup(repeats: int, verbose: bool) -> List[dict]:
+    """Démarrage à froid de l'API, sans puis avec préchargement (`STARTUP_PREWARM`)."""
+    api_dir = os.path.dirname(os.path.abspath(__file__))
+    results = []
+    for prewarm in (False, True):
+        env = {**os.environ, "STARTUP_PREWARM": "1" if prewarm else "0"}
+        runs = []
+        for _ in range(repeats):
+            proc = subprocess.run([sys.executable, "-c", _STARTUP_PROBE], cwd=api_dir, env=env,
+                                  capture_output=True, text=True)
+            if verbose or proc.returncode != 0:
+                print(proc.stdout + proc.stderr)
+            if proc.returncode != 0:
+                raise RuntimeError("Échec du démarrage de l'API (voir la trace ci-dessus)")
+            runs.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+        entry = {
+            "prewarm": prewarm,
+            "runs": repeats,
+            **{key: round(float(np.median([run[key] for run in runs])), 3)
+               for key in ("import_seconds", "live_seconds", "ready_seconds")},
+            "ready_status": runs[-1]["ready_status"],
+            "modules": runs[-1]["modules"],
+            "heavy_modules": runs[-1]["heavy_modules"],
+            "prewarm_components": runs[-1]["prewarm"]["components"],
+        }
+        print(f"🚀 démarrage prewarm={prewarm} : import {entry['import_seconds']}s, "
+              f"live {entry['live_seconds']}s, ready {entry['ready_seconds']}s")
+        results.append(entry)
+    return results
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(item) for item in value.split(",") if item.strip()]
+
+
+def main(argv=None) -> dict:
+    parser = argparse.ArgumentParser(description="Benchmark hors ligne de l'ingestion et des requêtes.")
+    parser.add_argument("-o", "--output", default="bench_results.json", help="Fichier JSON de résultats")
+    parser.add_argument("--quick", action="store_true", help="Tailles réduites (vérification rapide)")
+    parser.add_argument("--embeddings", choices=("real", "fake"), default="real",
+                        help="Modèle réel ou embeddings de hachage déterministes")
+    parser.add_argument("--embedding-cache", action="store_true", help="Active le cache d'embeddings")
+    parser.add_argument("--faiss-index", default="hnsw", choices=("flat", "ivf", "hnsw"))
+    parser.add_argument("--retrieval-mode", default="hybrid", choices=("dense", "hybrid"))
+    parser.add_argument("--formats", default="pdf,pptx", help="Formats ingérés (pdf,pptx)")
+    parser.add_argument("--doc-sizes", default="1,5,20,50", help="Pages/slides par document")
+    parser.add_argument("--corpus-sizes", default="100,1000,10000", help="Chunks dans la collection")
+    parser.add_argument("--concurrency", default="1,4,8", help="Requêtes simultanées")
+    parser.add_argument("--queries", type=int, default=50, help="Requêtes par mesure")
+    parser.add_argument("--model", default="llama3.2")
+    parser.add_argument("--ollama-url", help="Ollama réel à utiliser à la place du faux serveur")
+    parser.add_argument("--ollama-tokens", type=int, default=64, help="Tokens par réponse (faux serveur)")
+    parser.add_argument("--ollama-token-ms", type=float, default=5.0, help="ms par token (faux serveur)")
+    parser.add_argument("--startup-runs", type=int, default=3, help="Démarrages mesurés par configuration")
+    parser.add_argument("--skip-startup", action="store_true")
+    parser.add_argument("--skip-ingestion", action="store_true")
+    parser.add_argument("--skip-queries", action="store_true")
+    parser.add_argument("--verbose", action="store_true", help="Affiche les traces des modules")
+    args = parser.parse_args(argv)
+
+    if args.quick:
+        args.doc_sizes, args.corpus_sizes, args.concurrency, args.queries = "1,5", "100,500", "1,4", 10
+
+    server = None
+    if not args.ollama_url:
+        server = FakeOllamaServer(tokens=args.ollama_tokens, token_ms=args.ollama_token_ms).start()
+    workdir = tempfile.mkdtemp(prefix="qwanza_bench_")
+    configure_environment(workdir, args.ollama_url or server.url, args)
+
+    results = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "settings": {
+                "embeddings": args.embeddings,
+                "embedding_cache": args.embedding_cache,
+                "vector_backend": "faiss",
+                "faiss_index": args.faiss_index,
+                "retrieval_mode": args.retrieval_mode,
+                "ollama": args.ollama_url or {"fake": True, "tokens": args.ollama_tokens,
+                                              "token_ms": args.ollama_token_ms},
+            },
+        },
+    }
+    try:
+        if not args.skip_startup:
+            # Processus neufs : le démarrage mesuré ne profite d'aucun import du benchmark
+            results["startup"] = bench_startup(1 if args.quick else args.startup_runs, args.verbose)
+        with PeakMemory() as total_memory:
+            if not args.skip_ingestion:
+                results["ingestion"] = bench_ingestion(
+                    workdir, _int_list(args.doc_sizes), [f for f in args.formats.split(",") if f], args.verbose
+                )
+            if not args.skip_queries:
+                results["queries"] = bench_queries(
+                    _int_list(args.corpus_sizes), _int_list(args.concurrency), args.queries,
+                    args.model, args.verbose
+                )
+        results["memory"] = total_memory.to_dict()
+    finally:
+        if server is not None:
+            server.stop()
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"✅ Résultats écrits dans {args.output} (données temporaires : {workdir})")
+    return results
+
+
+if __name__ == "__main__":
+    main()
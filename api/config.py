@@ -0,0 +1,199 @@
+"""Configuration centrale de l'API RAG Qwanza.
+
+Chaque paramètre peut être surchargé par une variable d'environnement
+(ou par le fichier `.env` à la racine du projet si python-dotenv est installé).
+"""
+import os
+
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except ImportError:
+    pass
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else default
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value not in (None, "") else default
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value in (None, ""):
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# Embeddings
+EMBEDDING_MODEL_NAME = os.getenv(
+    "EMBEDDING_MODEL_NAME",
+    "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+)
+EMBEDDING_DEVICE = os.getenv("EMBEDDING_DEVICE", "cpu")
+
+# Cache d'embeddings persistant
+EMBEDDING_CACHE_ENABLED = _env_bool("EMBEDDING_CACHE_ENABLED", True)
+EMBEDDING_CACHE_PATH = os.getenv(
+    "EMBEDDING_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "embeddings.sqlite")
+)
+EMBEDDING_CACHE_MAX_ENTRIES = _env_int("EMBEDDING_CACHE_MAX_ENTRIES", 200_000)
+
+# File d'indexation en arrière-plan
+INDEX_MAX_WORKERS = _env_int("INDEX_MAX_WORKERS", 2)
+INDEX_MAX_PENDING_JOBS = _env_int("INDEX_MAX_PENDING_JOBS", 20)
+INDEX_JOB_HISTORY = _env_int("INDEX_JOB_HISTORY", 200)
+
+# Pipeline d'ingestion par lots
+PIPELINE_QUEUE_SIZE = _env_int("PIPELINE_QUEUE_SIZE", 4)
+PIPELINE_EMBED_BATCH_SIZE = _env_int("PIPELINE_EMBED_BATCH_SIZE", 64)
+
+# Réception des fichiers (uploads.py)
+UPLOAD_SPOOL_MAX_MEMORY = _env_int("UPLOAD_SPOOL_MAX_MEMORY", 32 * 1024 * 1024)
+UPLOAD_MAX_BYTES = _env_int("UPLOAD_MAX_BYTES", 500 * 1024 * 1024)
+UPLOAD_CHUNK_SIZE = _env_int("UPLOAD_CHUNK_SIZE", 1024 * 1024)
+
+# Extraction des PDF page par page (pdf_loader.py)
+PDF_LOADER = os.getenv("PDF_LOADER", "pages").lower()   # "pages" ou "unstructured"
+PDF_WORKERS = _env_int("PDF_WORKERS", max(1, (os.cpu_count() or 2) - 1))
+PDF_PAGES_PER_TASK = _env_int("PDF_PAGES_PER_TASK", 4)
+# Fichier reçu extrait en parallèle : envoyé tel quel aux processus jusqu'à cette taille,
+# recopié sur disque au-delà (les autres extractions lisent directement le tampon reçu)
+PDF_INLINE_MAX_BYTES = _env_int("PDF_INLINE_MAX_BYTES", 4 * 1024 * 1024)
+# OCR Tesseract des pages sans couche texte (moins de PDF_OCR_MIN_CHARS caractères)
+PDF_OCR_ENABLED = _env_bool("PDF_OCR_ENABLED", True)
+PDF_OCR_MIN_CHARS = _env_int("PDF_OCR_MIN_CHARS", 20)
+PDF_OCR_DPI = _env_int("PDF_OCR_DPI", 200)
+PDF_OCR_LANG = os.getenv("PDF_OCR_LANG", "fra")
+
+# Découpage sémantique (semantic_chunker.py)
+CHUNK_MIN_CHARS = _env_int("CHUNK_MIN_CHARS", 200)
+CHUNK_MAX_CHARS = _env_int("CHUNK_MAX_CHARS", 2000)
+CHUNK_BREAKPOINT_PERCENTILE = _env_float("CHUNK_BREAKPOINT_PERCENTILE", 95.0)
+CHUNK_BUFFER_SIZE = _env_int("CHUNK_BUFFER_SIZE", 1)
+# Phrases encodées par appel pendant le découpage au fil des pages
+CHUNK_EMBED_BATCH = _env_int("CHUNK_EMBED_BATCH", 256)
+
+# Traces de débogage de l'indexation (chunks et objets relus après écriture)
+INDEX_DEBUG_DUMPS = _env_bool("INDEX_DEBUG_DUMPS", False)
+
+# Questions par lots (/predict_batch et batch_qa.py)
+PREDICT_BATCH_MAX_QUESTIONS = _env_int("PREDICT_BATCH_MAX_QUESTIONS", 1000)
+PREDICT_BATCH_RETRIEVAL_WORKERS = _env_int("PREDICT_BATCH_RETRIEVAL_WORKERS", 8)
+# Générations du lot en cours à la fois (bornées en plus par GENERATION_CONCURRENCY par modèle)
+PREDICT_BATCH_GENERATION_WORKERS = _env_int("PREDICT_BATCH_GENERATION_WORKERS", 2)
+
+# Manifeste d'indexation incrémentale (empreintes des documents et des chunks)
+INDEX_MANIFEST_PATH = os.getenv(
+    "INDEX_MANIFEST_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "qwanza_docs.manifest.json")
+)
+
+# OCR des images PowerPoint
+PPT_OCR_WORKERS = _env_int("PPT_OCR_WORKERS", max(1, (os.cpu_count() or 2) - 1))
+PPT_OCR_MIN_PIXELS = _env_int("PPT_OCR_MIN_PIXELS", 100 * 100)
+PPT_OCR_CACHE_SIZE = _env_int("PPT_OCR_CACHE_SIZE", 2048)
+
+# Cache des réponses de /predict
+ANSWER_CACHE_ENABLED = _env_bool("ANSWER_CACHE_ENABLED", True)
+ANSWER_CACHE_MAX_ENTRIES = _env_int("ANSWER_CACHE_MAX_ENTRIES", 512)
+ANSWER_CACHE_TTL_SECONDS = _env_float("ANSWER_CACHE_TTL_SECONDS", 3600)
+ANSWER_CACHE_SEMANTIC_MAX_ENTRIES = _env_int("ANSWER_CACHE_SEMANTIC_MAX_ENTRIES", 512)
+ANSWER_CACHE_SEMANTIC_TTL_SECONDS = _env_float("ANSWER_CACHE_SEMANTIC_TTL_SECONDS", 1800)
+ANSWER_CACHE_SEMANTIC_THRESHOLD = _env_float("ANSWER_CACHE_SEMANTIC_THRESHOLD", 0.95)
+
+# Recherche et routage des questions
+RAG_TOP_K = _env_int("RAG_TOP_K", 3)
+# Similarité cosinus minimale du meilleur chunk pour répondre à partir du contexte
+RAG_MIN_RELEVANCE = _env_float("RAG_MIN_RELEVANCE", 0.4)
+
+# Clients Ollama
+OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+OLLAMA_DEFAULT_MODEL = os.getenv("OLLAMA_DEFAULT_MODEL", "llama3.2")
+# Durée pendant laquelle Ollama garde un modèle chargé après une requête
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+OLLAMA_MAX_CONNECTIONS = _env_int("OLLAMA_MAX_CONNECTIONS", 8)
+OLLAMA_TIMEOUT_SECONDS = _env_float("OLLAMA_TIMEOUT_SECONDS", 300)
+# Modèles préchargés au démarrage (liste séparée par des virgules, vide = aucun)
+OLLAMA_WARMUP_MODELS = [
+    name.strip() for name in os.getenv("OLLAMA_WARMUP_MODELS", "").split(",") if name.strip()
+]
+
+# Démarrage de l'API : chargement anticipé (en arrière-plan) du modèle
+# d'embeddings, de la base vectorielle et de l'index BM25. Sinon, tout est
+# chargé à la première requête.
+STARTUP_PREWARM = _env_bool("STARTUP_PREWARM", False)
+
+# Admission des générations (chemin asynchrone /predict et /predict_stream)
+GENERATION_CONCURRENCY = _env_int("GENERATION_CONCURRENCY", 2)       # par modèle
+GENERATION_MAX_WAITING = _env_int("GENERATION_MAX_WAITING", 16)      # file d'attente par modèle
+GENERATION_QUEUE_TIMEOUT_SECONDS = _env_float("GENERATION_QUEUE_TIMEOUT_SECONDS", 30)
+# Fusion des questions identiques en cours de traitement
+PREDICT_COALESCE = _env_bool("PREDICT_COALESCE", True)
+
+# Base vectorielle : "weaviate" (serveur) ou "faiss" (index local, en processus)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "weaviate").lower()
+COLLECTION_NAME = os.getenv("COLLECTION_NAME", "qwanza_docs")
+WEAVIATE_HOST = os.getenv("WEAVIATE_HOST", "localhost")
+WEAVIATE_PORT = _env_int("WEAVIATE_PORT", 8080)
+WEAVIATE_GRPC_PORT = _env_int("WEAVIATE_GRPC_PORT", 50051)
+# Écritures par lots : "fixed" (taille et concurrence fixes) ou "dynamic" (ajustées par le client)
+WEAVIATE_BATCH_MODE = os.getenv("WEAVIATE_BATCH_MODE", "fixed").lower()
+WEAVIATE_BATCH_SIZE = _env_int("WEAVIATE_BATCH_SIZE", 200)
+WEAVIATE_BATCH_CONCURRENCY = _env_int("WEAVIATE_BATCH_CONCURRENCY", 2)
+WEAVIATE_BATCH_RETRIES = _env_int("WEAVIATE_BATCH_RETRIES", 3)
+FAISS_INDEX_DIR = os.getenv(
+    "FAISS_INDEX_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "faiss_store")
+)
+# Type d'index FAISS : "flat" (exact), "ivf" ou "hnsw"
+FAISS_INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "hnsw").lower()
+FAISS_IVF_NLIST = _env_int("FAISS_IVF_NLIST", 64)
+FAISS_IVF_NPROBE = _env_int("FAISS_IVF_NPROBE", 8)
+FAISS_HNSW_M = _env_int("FAISS_HNSW_M", 32)
+FAISS_HNSW_EF_SEARCH = _env_int("FAISS_HNSW_EF_SEARCH", 64)
+# Chargement de l'index en mémoire partagée (mmap) plutôt qu'en copie
+FAISS_MMAP = _env_bool("FAISS_MMAP", True)
+
+# Recherche hybride BM25 + vecteurs (fusion par rangs réciproques)
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid").lower()   # "dense" ou "hybrid"
+BM25_INDEX_PATH = os.getenv(
+    "BM25_INDEX_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "qwanza_docs.bm25.json")
+)
+BM25_K1 = _env_float("BM25_K1", 1.5)
+BM25_B = _env_float("BM25_B", 0.75)
+HYBRID_FETCH_K = _env_int("HYBRID_FETCH_K", 20)
+HYBRID_RRF_K = _env_int("HYBRID_RRF_K", 60)
+HYBRID_DENSE_WEIGHT = _env_float("HYBRID_DENSE_WEIGHT", 1.0)
+HYBRID_SPARSE_WEIGHT = _env_float("HYBRID_SPARSE_WEIGHT", 1.0)
+
+# Reranking par cross-encoder (optionnel)
+RERANK_ENABLED = _env_bool("RERANK_ENABLED", False)
+RERANK_MODEL_NAME = os.getenv("RERANK_MODEL_NAME", "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1")
+RERANK_DEVICE = os.getenv("RERANK_DEVICE", "cpu")
+# Nombre de candidats récupérés avant reranking
+RERANK_CANDIDATES = _env_int("RERANK_CANDIDATES", 20)
+RERANK_BATCH_SIZE = _env_int("RERANK_BATCH_SIZE", 16)
+# Budget de latence du reranking (ms) : limite le nombre de candidats rescorés
+RERANK_BUDGET_MS = _env_float("RERANK_BUDGET_MS", 400)
+# Au-delà de ce nombre de rerankings simultanés, l'étape est sautée
+RERANK_MAX_INFLIGHT = _env_int("RERANK_MAX_INFLIGHT", 2)
+RERANK_CACHE_SIZE = _env_int("RERANK_CACHE_SIZE", 10_000)
+
+# Construction du contexte du prompt
+CONTEXT_TOKEN_BUDGET = _env_int("CONTEXT_TOKEN_BUDGET", 1200)
+# Budgets par modèle, ex. "llama3.2:1500,mistral:1200,deepseek-r1:7b:1000"
+CONTEXT_TOKEN_BUDGETS = {
+    name.strip(): int(budget)
+    for name, _, budget in (
+        item.rpartition(":") for item in os.getenv("CONTEXT_TOKEN_BUDGETS", "").split(",") if item.strip()
+    )
+}
+# Similarité (Jaccard sur les trigrammes de mots) au-delà de laquelle deux chunks sont des doublons
+CONTEXT_DEDUP_THRESHOLD = _env_float("CONTEXT_DEDUP_THRESHOLD", 0.8)
@@ -0,0 +1,40 @@
+"""Environnement de test hors ligne : faux Ollama, FAISS et embeddings de hachage.
+
+La configuration est lue à l'import de `config` : l'environnement est donc
+redirigé vers un dossier temporaire avant la collecte des modules de test.
+"""
+import shutil
+import tempfile
+import types
+
+import pytest
+
+import benchmark
+from fake_ollama import FakeOllamaServer
+
+_workdir = tempfile.mkdtemp(prefix="ragv2-tests-")
+_ollama = FakeOllamaServer(tokens=8, token_ms=5).start()
+benchmark.configure_environment(_workdir, _ollama.url, types.SimpleNamespace(
+    faiss_index="flat", embedding_cache=False, retrieval_mode="hybrid", embeddings="fake"
+))
+
+
+def pytest_unconfigure(config):
+    _ollama.stop()
+    shutil.rmtree(_workdir, ignore_errors=True)
+
+
+@pytest.fixture(scope="session")
+def fake_ollama():
+    return _ollama
+
+
+@pytest.fixture(scope="session")
+def client():
+    # Le contexte garde la même boucle (et le même client Ollama) entre les requêtes
+    from fastapi.testclient import TestClient
+
+    import main
+
+    with TestClient(main.app) as test_client:
+        yield test_client
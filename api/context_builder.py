@@ -0,0 +1,147 @@
+"""Construction compacte du contexte injecté dans le prompt.
+
+Les chunks retrouvés sont dédoublonnés (quasi-doublons fréquents après
+plusieurs uploads), les chunks contigus d'une même source et d'une même
+page sont fusionnés, puis formatés avec une citation courte `[n] source, p. X`
+jusqu'à épuisement du budget de tokens du modèle. Un prompt plus court
+réduit directement le temps de prefill d'Ollama sur CPU.
+"""
+import re
+from typing import List, Tuple
+
+from langchain_core.documents import Document
+
+from config import CONTEXT_TOKEN_BUDGET, CONTEXT_TOKEN_BUDGETS, CONTEXT_DEDUP_THRESHOLD
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimation grossière du nombre de tokens (≈ 4 caractères par token)."""
+    return max(1, len(text) // 4) if text else 0
+
+
+def token_budget(model_name: str) -> int:
+    return CONTEXT_TOKEN_BUDGETS.get(model_name, CONTEXT_TOKEN_BUDGET)
+
+
+def _shingles(text: str, size: int = 3) -> set:
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def deduplicate(docs: List[Document], threshold: float = CONTEXT_DEDUP_THRESHOLD) -> List[Document]:
+    """Retire les quasi-doublons (et les chunks contenus dans un chunk déjà retenu)."""
+    kept, kept_shingles = [], []
+    for doc in docs:
+        shingles = _shingles(doc.page_content)
+        if not shingles:
+            continue
+        duplicate = False
+        for other in kept_shingles:
+            overlap = len(shingles & other)
+            if overlap / len(shingles | other) >= threshold or overlap / len(shingles) >= threshold:
+                duplicate = True
+                break
+        if not duplicate:
+            kept.append(doc)
+            kept_shingles.append(shingles)
+    return kept
+
+
+def _overlap(first: str, second: str, max_overlap: int = 300) -> int:
+    """Taille du recouvrement entre la fin de `first` et le début de `second` (0 si aucun)."""
+    for size in range(min(max_overlap, len(first), len(second)), 20, -1):
+        if first.endswith(second[:size]):
+            return size
+    return 0
+
+
+def _join(first: str, second: str) -> str:
+    """Concatène deux chunks contigus dans l'ordre du document quand leur recouvrement l'indique."""
+    size = _overlap(first, second)
+    if size:
+        return first + second[size:]
+    size = _overlap(second, first)
+    if size:
+        return second + first[size:]
+    return f"{first}\n{second}"
+
+
+def merge_same_page(docs: List[Document]) -> List[Document]:
+    """
+    Fusionne les chunks contigus d'une même source et page, au rang du premier.
+
+    Deux chunks sont contigus s'ils se suivent dans le classement ou si la
+    fin de l'un recouvre le début de l'autre. Les chunks ne portent pas leur
+    position dans la page : le recouvrement donne l'ordre du document, à
+    défaut l'ordre de pertinence est conservé. Deux passages éloignés d'une
+    même page restent des blocs distincts.
+    """
+    merged = []              # (source, page), bloc ; dans l'ordre de pertinence
+    previous = None          # bloc qui a reçu le chunk précédent du classement
+    for doc in docs:
+        key = (doc.metadata.get("source", ""), doc.metadata.get("page", 0))
+        target = next(
+            (block for block_key, block in merged
+             if block_key == key and (_overlap(block.page_content, doc.page_content)
+                                      or _overlap(doc.page_content, block.page_content))),
+            previous[1] if previous is not None and previous[0] == key else None,
+        )
+        if target is not None:
+            target.page_content = _join(target.page_content, doc.page_content)
+        else:
+            target = Document(page_content=doc.page_content, metadata=dict(doc.metadata))
+            merged.append((key, target))
+        previous = (key, target)
+    return [block for _, block in merged]
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    """Coupe un texte au budget, de préférence à une fin de phrase."""
+    limit = max_tokens * 4
+    if len(text) <= limit:
+        return text
+    cut = text[:limit]
+    sentence_end = max(cut.rfind(". "), cut.rfind(".\n"))
+    return (cut[:sentence_end + 1] if sentence_end > limit // 2 else cut).rstrip() + " […]"
+
+
+def _citation(index: int, doc: Document) -> str:
+    source = doc.metadata.get("source", "") or "document"
+    page = doc.metadata.get("page")
+    return f"[{index}] {source}, p. {page}" if page else f"[{index}] {source}"
+
+
+def build_context(docs: List[Document], model_name: str) -> Tuple[str, dict]:
+    """
+    Assemble le contexte du prompt dans le budget de tokens du modèle.
+
+    Args:
+        docs: Chunks retenus, du plus pertinent au moins pertinent.
+        model_name: Modèle de génération (détermine le budget).
+
+    Returns:
+        tuple: (texte du contexte, infos {"chunks_in", "chunks_used", "tokens", "budget"})
+    """
+    budget = token_budget(model_name)
+    unique = merge_same_page(deduplicate(docs))
+
+    blocks, used_tokens = [], 0
+    for doc in unique:
+        header = _citation(len(blocks) + 1, doc)
+        remaining = budget - used_tokens - estimate_tokens(header) - 1
+        if remaining < 32:
+            break
+        text = _truncate(doc.page_content.strip(), remaining)
+        block = f"{header}\n{text}"
+        blocks.append(block)
+        used_tokens += estimate_tokens(block) + 1
+
+    context = "\n\n".join(blocks)
+    return context, {
+        "chunks_in": len(docs),
+        "chunks_used": len(blocks),
+        "tokens": estimate_tokens(context),
+        "budget": budget,
+    }
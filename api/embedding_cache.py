@@ -0,0 +1,150 @@
+"""Cache d'embeddings persistant, adressé par le contenu.
+
+Chaque vecteur est indexé par le nom du modèle et un hash SHA-256 du texte
+normalisé, et stocké dans une base SQLite locale. Le nombre d'entrées est
+borné : au-delà, les vecteurs les moins récemment utilisés sont évincés.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+def normalize_text(text: str) -> str:
+    """Normalise un texte avant hachage (Unicode NFC, espaces compactés)."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def embedding_key(model_name: str, text: str) -> str:
+    digest = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+    return f"{model_name}:{digest}"
+
+
+class EmbeddingCache:
+    """Stockage SQLite des vecteurs avec éviction LRU."""
+
+    def __init__(self, path: str, max_entries: int = 200_000):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY,"
+            " vector BLOB NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_last_access ON embeddings(last_access)"
+        )
+        self._conn.commit()
+
+    def get_many(self, keys: List[str]) -> dict:
+        """Retourne {clé: vecteur} pour les clés présentes dans le cache."""
+        found = {}
+        if not keys:
+            return found
+        with self._lock:
+            unique_keys = list(dict.fromkeys(keys))
+            # SQLite limite le nombre de paramètres par requête
+            for start in range(0, len(unique_keys), 500):
+                batch = unique_keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                    batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_access = ? WHERE key = ?",
+                    [(now, key) for key in found]
+                )
+                self._conn.commit()
+            self.hits += sum(1 for key in keys if key in found)
+            self.misses += sum(1 for key in keys if key not in found)
+        return found
+
+    def put_many(self, items: dict) -> None:
+        """Enregistre {clé: vecteur} puis évince les entrées les plus anciennes."""
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_access) VALUES (?, ?, ?)",
+                [
+                    (key, np.asarray(vector, dtype=np.float32).tobytes(), now)
+                    for key, vector in items.items()
+                ]
+            )
+            count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN ("
+                    " SELECT key FROM embeddings ORDER BY last_access ASC LIMIT ?)",
+                    (count - self.max_entries,)
+                )
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            "path": self.path,
+            "entries": size,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else None,
+        }
+
+
+class CachedEmbeddings(Embeddings):
+    """Enveloppe un modèle d'embeddings LangChain avec un `EmbeddingCache`."""
+
+    def __init__(self, underlying: Embeddings, cache: EmbeddingCache, model_name: str):
+        self.underlying = underlying
+        self.cache = cache
+        self.model_name = model_name
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [embedding_key(self.model_name, text) for text in texts]
+        cached = self.cache.get_many(keys)
+
+        # Textes absents du cache, dédoublonnés pour ne les encoder qu'une fois
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+
+        if missing:
+            vectors = self.underlying.embed_documents(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            self.cache.put_many(computed)
+            cached.update(computed)
+
+        return [list(cached[key]) for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        key = embedding_key(self.model_name, text)
+        cached = self.cache.get_many([key])
+        if key in cached:
+            return list(cached[key])
+        vector = self.underlying.embed_query(text)
+        self.cache.put_many({key: vector})
+        return vector
@@ -0,0 +1,100 @@
+"""Service d'embeddings partagé à l'échelle du processus.
+
+Le modèle sentence-transformers est chargé une seule fois par worker, au
+premier appel de `get_embeddings()`, puis réutilisé par `rag.py`, le
+découpeur sémantique et le `WeaviateVectorStore`. Si le cache est activé, le
+modèle est enveloppé dans un `CachedEmbeddings` persistant sur disque.
+"""
+import threading
+import time
+
+from config import (
+    EMBEDDING_MODEL_NAME,
+    EMBEDDING_DEVICE,
+    EMBEDDING_CACHE_ENABLED,
+    EMBEDDING_CACHE_PATH,
+    EMBEDDING_CACHE_MAX_ENTRIES,
+)
+
+_lock = threading.RLock()
+_embeddings = None
+_cache = None
+_stats = {
+    "model_name": EMBEDDING_MODEL_NAME,
+    "device": EMBEDDING_DEVICE,
+    "loaded": False,
+    "load_seconds": None,
+    "rss_before_mb": None,
+    "rss_after_mb": None,
+    "rss_delta_mb": None,
+}
+
+
+def _rss_mb():
+    """Retourne la mémoire résidente du processus en Mo (None si psutil est absent)."""
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return round(psutil.Process().memory_info().rss / (1024 * 1024), 1)
+
+
+def _load_embeddings():
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    print(f"🧠 Chargement du modèle d'embeddings : {EMBEDDING_MODEL_NAME}")
+    rss_before = _rss_mb()
+    start = time.perf_counter()
+    embeddings = HuggingFaceEmbeddings(
+        model_name=EMBEDDING_MODEL_NAME,
+        model_kwargs={"device": EMBEDDING_DEVICE},
+        encode_kwargs={"normalize_embeddings": True}
+    )
+    elapsed = time.perf_counter() - start
+    rss_after = _rss_mb()
+
+    _stats.update({
+        "loaded": True,
+        "load_seconds": round(elapsed, 3),
+        "rss_before_mb": rss_before,
+        "rss_after_mb": rss_after,
+        "rss_delta_mb": round(rss_after - rss_before, 1) if rss_before is not None else None,
+    })
+    print(f"✅ Modèle d'embeddings chargé en {elapsed:.2f}s (RSS : {rss_after} Mo)")
+
+    if EMBEDDING_CACHE_ENABLED:
+        from embedding_cache import CachedEmbeddings
+
+        embeddings = CachedEmbeddings(embeddings, get_embedding_cache(), EMBEDDING_MODEL_NAME)
+    return embeddings
+
+
+def get_embedding_cache():
+    """Retourne le cache d'embeddings partagé (None s'il est désactivé)."""
+    global _cache
+    if not EMBEDDING_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _lock:
+            if _cache is None:
+                from embedding_cache import EmbeddingCache
+
+                _cache = EmbeddingCache(EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MAX_ENTRIES)
+    return _cache
+
+
+def get_embeddings():
+    """Retourne l'instance d'embeddings partagée, en la chargeant au besoin."""
+    global _embeddings
+    if _embeddings is None:
+        with _lock:
+            if _embeddings is None:
+                _embeddings = _load_embeddings()
+    return _embeddings
+
+
+def get_embedding_stats() -> dict:
+    """Retourne le temps de chargement, l'empreinte mémoire et l'état du cache."""
+    stats = dict(_stats)
+    stats["cache"] = _cache.stats() if _cache is not None else None
+    return stats
@@ -0,0 +1,157 @@
+"""Faux serveur Ollama déterministe, pour les benchmarks et les essais hors ligne.
+
+Il implémente le sous-ensemble de l'API utilisé par `langchain_ollama`
+(/api/generate et /api/chat, en flux NDJSON ou non, /api/tags) et simule
+la latence d'un vrai modèle : un temps de prefill proportionnel à la
+longueur du prompt, puis un délai fixe par token généré. La réponse ne
+dépend que du prompt, ce qui rend les mesures comparables d'un commit à l'autre.
+
+Usage en ligne de commande :
+    python fake_ollama.py --port 11435 --tokens 64 --token-ms 5
+"""
+import argparse
+import hashlib
+import json
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterator, Optional
+
+_WORDS = (
+    "le document indique que la solution repose sur une plateforme de support "
+    "les équipes assurent le suivi des demandes et la qualité du service client "
+    "selon le contexte fourni cette offre permet de réduire les délais de traitement"
+).split()
+
+
+def fake_completion(prompt: str, tokens: int) -> list:
+    """Tokens de réponse déterministes, dérivés de l'empreinte du prompt."""
+    seed = hashlib.sha256(prompt.encode("utf-8")).digest()
+    return [
+        ("" if i == 0 else " ") + _WORDS[seed[i % len(seed)] * (i + 1) % len(_WORDS)]
+        for i in range(tokens)
+    ]
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "FakeOllama/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload: dict, status: int = 200) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._send_json({"models": [{"name": name, "model": name} for name in sorted(self.server.models_seen)]})
+        elif self.path in ("/", "/api/version"):
+            self._send_json({"version": "0.0.0-fake"})
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+    def do_POST(self):
+        if self.path not in ("/api/generate", "/api/chat"):
+            self._send_json({"error": "not found"}, status=404)
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        model = request.get("model", "")
+        self.server.models_seen.add(model)
+        chat = self.path == "/api/chat"
+        prompt = (
+            "\n".join(m.get("content", "") for m in request.get("messages", []))
+            if chat else request.get("prompt", "")
+        )
+        with self.server.stats_lock:
+            self.server.requests += 1
+
+        # Un prompt vide (préchargement du modèle) ne génère rien
+        tokens = fake_completion(prompt, self.server.tokens) if prompt else []
+        prompt_tokens = max(1, len(prompt) // 4) if prompt else 0
+        time.sleep(prompt_tokens * self.server.prefill_ms_per_token / 1000)
+
+        if request.get("stream", True):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for part in self._parts(model, tokens, prompt_tokens, chat):
+                line = (json.dumps(part) + "\n").encode("utf-8")
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+                self.wfile.flush()
+            self.wfile.write(b"0\r\n\r\n")
+        else:
+            time.sleep(len(tokens) * self.server.token_ms / 1000)
+            final = self._message(model, "".join(tokens), chat, done=True, prompt_tokens=prompt_tokens,
+                                  eval_tokens=len(tokens))
+            self._send_json(final)
+
+    def _parts(self, model: str, tokens: list, prompt_tokens: int, chat: bool) -> Iterator[dict]:
+        for token in tokens:
+            time.sleep(self.server.token_ms / 1000)
+            yield self._message(model, token, chat)
+        yield self._message(model, "", chat, done=True, prompt_tokens=prompt_tokens, eval_tokens=len(tokens))
+
+    @staticmethod
+    def _message(model: str, text: str, chat: bool, done: bool = False,
+                 prompt_tokens: int = 0, eval_tokens: int = 0) -> dict:
+        message = {"model": model, "created_at": datetime.now(timezone.utc).isoformat(), "done": done}
+        if chat:
+            message["message"] = {"role": "assistant", "content": text}
+        else:
+            message["response"] = text
+        if done:
+            message.update({"done_reason": "stop", "prompt_eval_count": prompt_tokens, "eval_count": eval_tokens})
+        return message
+
+
+class FakeOllamaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, tokens: int = 64,
+                 token_ms: float = 5.0, prefill_ms_per_token: float = 0.05):
+        super().__init__((host, port), FakeOllamaHandler)
+        self.tokens = tokens
+        self.token_ms = token_ms
+        self.prefill_ms_per_token = prefill_ms_per_token
+        self.models_seen = set()
+        self.requests = 0
+        self.stats_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeOllamaServer":
+        """Démarre le serveur dans un thread d'arrière-plan."""
+        self._thread = threading.Thread(target=self.serve_forever, name="fake-ollama", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Faux serveur Ollama déterministe.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--tokens", type=int, default=64, help="Tokens générés par réponse")
+    parser.add_argument("--token-ms", type=float, default=5.0, help="Délai par token généré (ms)")
+    parser.add_argument("--prefill-ms", type=float, default=0.05, help="Délai par token de prompt (ms)")
+    args = parser.parse_args()
+
+    server = FakeOllamaServer(args.host, args.port, args.tokens, args.token_ms, args.prefill_ms)
+    print(f"🤖 Faux Ollama en écoute sur {server.url}")
+    server.serve_forever()
@@ -1,166 +1,319 @@
-from langchain_community.document_loaders import UnstructuredPDFLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import FAISS
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_experimental.text_splitter import SemanticChunker
+# Les chargeurs (pypdfium2, unstructured, python-pptx, pytesseract, pandas) sont
+# importés dans `_loader()` : l'API démarre sans les charger.
+from semantic_chunker import FastSemanticChunker
 import os
-from ppt_loader import PowerPointLoader
+from embeddings_service import get_embeddings
+from langchain_core.documents import Document
+from answer_cache import answer_cache
+from vector_store import VectorBackend, get_vector_backend
+from lexical_index import get_lexical_index
+from index_manifest import get_manifest, file_sha256, chunk_hash, chunk_uuid
+from metrics import span, observe_stage, INDEXED_CHUNKS
+from config import PIPELINE_EMBED_BATCH_SIZE, INDEX_DEBUG_DUMPS, PDF_LOADER
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+import time
 
-import os
-from traceback import print_list
-import pandas as pd
-from langchain_weaviate import WeaviateVectorStore
-from langchain_ollama import OllamaLLM
-from langchain.prompts import PromptTemplate
-from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnablePassthrough
-from ppt_loader import PowerPointLoader
-
-def index_document(pdf_path: str, index_path: str = "faiss_index") -> FAISS:
-    """
-    Charge un fichier PDF, le découpe, l'encode et l'indexe dans FAISS.
-    
-    Args:
-        pdf_path (str): Chemin vers le fichier PDF à indexer.
-        index_path (str): Dossier où sauvegarder l'index FAISS.
+@dataclass
+class IndexPlan:
+    """Différence entre les chunks d'un document et ceux déjà indexés."""
+    source: str
+    file_hash: str
+    chunk_ids: Dict[str, str]                     # hash du chunk -> UUID de l'objet
+    new_chunks: List[Document] = field(default_factory=list)
+    new_uuids: List[str] = field(default_factory=list)
+    removed_uuids: List[str] = field(default_factory=list)
+    known_source: bool = False
 
-    Returns:
-        FAISS: L'objet FAISS vectorstore généré.
-    """
-    print(f"📥 Chargement du document : {pdf_path}")
 
-    # Initialiser les embeddings
-    embeddings = HuggingFaceEmbeddings(
-        model_name="sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2",
-        model_kwargs={"device": "cpu"},
-        encode_kwargs={"normalize_embeddings": True}
-    )
+def _report(progress: Optional[Callable[..., None]], stage: str, **counters) -> None:
+    """Transmet l'étape courante et les compteurs au suivi de tâche, s'il existe."""
+    if progress is not None:
+        progress(stage=stage, **counters)
 
-    # Traiter les fichiers PDF
-    if pdf_path.lower().endswith('.pdf'):
-        print(f"Chargement du PDF: {pdf_path}")
-        loader = UnstructuredPDFLoader(pdf_path, mode="elements")
-        try:
-            documents = loader.load()
-        except Exception as e:
-            print(f"❌ Erreur lors du chargement de {pdf_path}: {str(e)}")
-            
-    # Traiter les fichiers PowerPoint
-    elif pdf_path.lower().endswith(('.ppt', '.pptx')):
-        print(f"Chargement du PowerPoint: {pdf_path}")
-        loader = PowerPointLoader(pdf_path)
-        try:
-            documents = loader.load()
-        except Exception as e:
-            print(f"❌ Erreur lors du chargement de {pdf_path}: {str(e)}")
 
-    #✅ SEMANTIC CHUNKING
-    print("\n🧠 Découpage sémantique intelligent...")
-    embeddings = HuggingFaceEmbeddings(
-        model_name="sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2",
-        model_kwargs={"device": "cpu"},
-        encode_kwargs={"normalize_embeddings": True}
-    )
+def _page_key(doc: Document):
+    return doc.metadata.get("page_number", doc.metadata.get("slide_number"))
 
-    text_splitter = SemanticChunker(
-        embeddings,
-        breakpoint_threshold_type="percentile"
-    )
 
-    # Ne pas découper les documents PowerPoint qui sont déjà découpés par slide
-    chunks = []
-    for doc in documents:
-        if doc.metadata.get('type') == 'powerpoint':
-            chunks.append(doc)
-        else:
-            chunks.extend(text_splitter.split_documents([doc]))
+def _loader(file_path: str, content=None):
+    """Chargeur adapté au format du fichier (déduit du contenu reçu ou de l'extension)."""
+    file_format = content.format if content is not None else os.path.splitext(file_path)[1].lower().lstrip(".")
 
-    print(f"✅ {len(chunks)} chunks créés.")
+    # Traiter les fichiers PDF
+    if file_format == "pdf":
+        print(f"Chargement du PDF: {file_path}")
+        if PDF_LOADER == "unstructured":
+            from langchain_community.document_loaders import UnstructuredPDFLoader, UnstructuredFileIOLoader
+
+            if content is not None:
+                return UnstructuredFileIOLoader(content.file, mode="elements", content_type="application/pdf")
+            return UnstructuredPDFLoader(file_path, mode="elements")
+        from pdf_loader import PDFLoader
+
+        return PDFLoader(file_path, file=content.file if content is not None else None)
+    # Traiter les fichiers PowerPoint
+    if file_format in ("ppt", "pptx"):
+        from ppt_loader import PowerPointLoader
+
+        print(f"Chargement du PowerPoint: {file_path}")
+        return PowerPointLoader(file_path, file=content.file if content is not None else None)
+    raise ValueError(f"Format de fichier non supporté : {file_path}")
 
-    # ✅ CRÉATION DU VECTOR STORE AVEC WEAVIATE
-    print("\n💾 Enregistrement dans Weaviate...")
-    import weaviate
-    import weaviate.classes.config as wvcc
-    # client = weaviate.Client("http://localhost:8080")  # Assurez-vous que Weaviate tourne
-    print(weaviate.__version__)
 
-    # ✅ CONNEXION WEAVIATE V4
-    print("\n💾 Connexion à Weaviate...")
-    client = weaviate.connect_to_local(skip_init_checks=True)
+def load_documents(file_path: str, content=None) -> List[Document]:
+    """
+    Charge un fichier PDF ou PowerPoint sous forme de Documents LangChain.
 
-    # ✅ CRÉATION DE L'INDEX AVEC SYNTAXE V4
+    Args:
+        file_path (str): Chemin du fichier (ou son nom si `content` est fourni).
+        content (SpooledUpload, optional): Fichier reçu par l'API, lu directement
+            depuis son tampon ; son format vient de ses premiers octets.
+    """
+    loader = _loader(file_path, content)
     try:
-        if not client.collections.exists("qwanza_docs"):
-            collection = client.collections.create(
-                name="qwanza_docs",
-                properties=[
-                    wvcc.Property(
-                        name="content",
-                        data_type=wvcc.DataType.TEXT
-                    ),
-                    wvcc.Property(
-                        name="source",
-                        data_type=wvcc.DataType.TEXT
-                    ),
-                    wvcc.Property(
-                        name="page",
-                        data_type=wvcc.DataType.NUMBER
-                    )
-                ]
-            )
-        print("✅ Collection Weaviate prête")
+        with span("index", "load"):
+            return loader.load()
     except Exception as e:
-        print(f"❌ Erreur création collection: {str(e)}")
-        client.close()
-        exit(1)
+        print(f"❌ Erreur lors du chargement de {file_path}: {str(e)}")
+        raise
+
+
+def iter_documents(file_path: str, content=None) -> Iterable[Document]:
+    """
+    Comme `load_documents()`, mais les pages d'un PDF sont produites au fil
+    de leur extraction (voir `pdf_loader.PDFLoader.lazy_load()`).
+    """
+    loader = _loader(file_path, content)
+    if hasattr(loader, "lazy_load") and PDF_LOADER != "unstructured":
+        return loader.lazy_load()
+    return load_documents(file_path, content)
+
+
+def chunk_documents(documents: Iterable[Document], embeddings=None,
+                    progress: Optional[Callable[..., None]] = None,
+                    source: Optional[str] = None) -> List[Document]:
+    """
+    Découpe sémantiquement les documents (les slides PowerPoint sont conservées telles quelles).
+
+    `documents` peut être un flux (`iter_documents()`) : les pages sont
+    découpées et encodées à mesure qu'elles arrivent.
+    """
+    text_splitter = FastSemanticChunker(embeddings or get_embeddings())
+    slides = []
+    pages_done = set()
+
+    def elements() -> Iterator[Document]:
+        # Ne pas découper les documents PowerPoint qui sont déjà découpés par slide
+        for doc in documents:
+            page = _page_key(doc)
+            if page not in pages_done:
+                pages_done.add(page)
+                _report(progress, "chunking", pages_done=len(pages_done),
+                        pages_total=doc.metadata.get("total_pages"))
+            if doc.metadata.get('type') == 'powerpoint':
+                slides.append(doc)
+            else:
+                yield doc
+
+    with span("index", "chunk"):
+        # Les éléments PDF sont regroupés par page et encodés par lots
+        pdf_chunks = text_splitter.split_documents(elements())
+        chunks = slides + pdf_chunks
+        _report(progress, "chunking", pages_done=len(pages_done), chunks_done=len(chunks))
 
     # Nettoyage des métadonnées des chunks
     for chunk in chunks:
         # On ne garde que les métadonnées essentielles
         cleaned_metadata = {
-            "source": chunk.metadata.get("source", ""),
-            "page": chunk.metadata.get("page", 0)
+            "source": source or chunk.metadata.get("source", ""),
+            "page": chunk.metadata.get("page", chunk.metadata.get("slide_number", 0))
         }
         chunk.metadata = cleaned_metadata
+    return chunks
+
 
-    # UTILISATION AVEC LANGCHAIN
-    vectorstore = WeaviateVectorStore(
-        client=client,
-        index_name="qwanza_docs",
-        text_key="content",
-        embedding=embeddings,
-        attributes=["source", "page"]  # Spécifier les attributs à stocker
+def plan_update(source: str, file_hash: str, chunks: List[Document]) -> IndexPlan:
+    """Calcule les chunks à ajouter et les objets à supprimer pour une source."""
+    manifest = get_manifest()
+    chunk_ids = {}
+    unique_chunks = {}
+    for chunk in chunks:
+        content_hash = chunk_hash(chunk.page_content)
+        # Les chunks identiques d'un même document ne sont indexés qu'une fois
+        if content_hash not in chunk_ids:
+            chunk_ids[content_hash] = chunk_uuid(source, content_hash)
+            unique_chunks[content_hash] = chunk
+
+    added, removed = manifest.diff(source, chunk_ids)
+    return IndexPlan(
+        source=source,
+        file_hash=file_hash,
+        chunk_ids=chunk_ids,
+        new_chunks=[unique_chunks[h] for h in added],
+        new_uuids=[chunk_ids[h] for h in added],
+        removed_uuids=removed,
+        known_source=manifest.get(source) is not None,
     )
 
-    try:
-        print("\n💾 Ajout des documents dans Weaviate...")
-        vectorstore.add_documents(chunks)
-        print(f"✅ {len(chunks)} chunks ajoutés avec succès!")
-    except Exception as e:
-        print(f"❌ Erreur lors de l'ajout des documents : {str(e)}")
-        client.close()
-        exit(1)
 
-    # print(f"📊 Nombre d'objets dans la collection : {client.collections.get('qwanza_docs').count_objects()}")
-    for i, chunk in enumerate(chunks):
-        print(f"Chunk {i}:")
-        print(chunk.page_content)
-        print("="*40)
+def apply_deletions(backend: VectorBackend, plan: IndexPlan) -> int:
+    """Supprime les chunks disparus (ou, pour une source absente du manifeste, ses anciens objets)."""
+    with span("index", "delete"):
+        if not plan.known_source:
+            # Objets indexés avant le manifeste (UUID aléatoires) : on repart de zéro
+            get_lexical_index().delete_source(plan.source)
+            removed = backend.delete_source(plan.source)
+        elif not plan.removed_uuids:
+            return 0
+        else:
+            get_lexical_index().delete(plan.removed_uuids)
+            removed = backend.delete(plan.removed_uuids)
+    INDEXED_CHUNKS.inc(removed, operation="removed")
+    return removed
+
+
+def commit_plan(backend: VectorBackend, plan: IndexPlan) -> None:
+    """Enregistre l'état indexé d'une source une fois les écritures réussies."""
+    # Les écritures sont persistées avant que le manifeste ne les considère faites
+    backend.flush()
+    get_lexical_index().flush()
+    get_manifest().update(plan.source, plan.file_hash, plan.chunk_ids)
+    # La collection a changé : les réponses en cache ne sont plus fiables
+    answer_cache.invalidate()
+
+
+def embed_chunks(chunks: List[Document], embeddings=None) -> List[List[float]]:
+    """Calcule les vecteurs des chunks en un seul appel (via le cache d'embeddings)."""
+    embeddings = embeddings or get_embeddings()
+    with span("index", "embed"):
+        return embeddings.embed_documents([chunk.page_content for chunk in chunks])
+
+
+def write_chunks(backend: VectorBackend, chunks: List[Document], vectors: List[List[float]],
+                 uuids: List[str]) -> int:
+    """Insère (ou remplace) les chunks dans la base vectorielle et dans l'index BM25."""
+    with span("index", "insert"):
+        written = backend.upsert(uuids, chunks, vectors)
+        get_lexical_index().add(uuids, chunks)
+    INDEXED_CHUNKS.inc(written, operation="added")
+    return written
+
 
-    # print("✅ Index Weaviate créé.")
+def embed_and_write(backend: VectorBackend, chunks: List[Document], uuids: List[str],
+                    embeddings=None, batch_size: int = PIPELINE_EMBED_BATCH_SIZE,
+                    progress: Optional[Callable[..., None]] = None) -> dict:
+    """
+    Encode et écrit les chunks par lots, au rythme des écritures.
+
+    Les vecteurs sont calculés à la demande par un générateur consommé par
+    `backend.upsert_stream()` : quand la base vectorielle ralentit, l'encodage
+    attend au lieu d'accumuler tous les vecteurs en mémoire.
+
+    Returns:
+        dict: {"inserted", "seconds", "inserted_per_s"}
+    """
+    embeddings = embeddings or get_embeddings()
+    embed_seconds = 0.0
 
-    collection = client.collections.get("qwanza_docs")
-    results = collection.query.fetch_objects(limit=10)
+    def objects():
+        nonlocal embed_seconds
+        for i in range(0, len(chunks), batch_size):
+            batch = chunks[i:i + batch_size]
+            start = time.perf_counter()
+            vectors = embed_chunks(batch, embeddings)
+            embed_seconds += time.perf_counter() - start
+            yield from zip(uuids[i:i + batch_size], batch, vectors)
+            _report(progress, "writing", chunks_done=min(i + batch_size, len(chunks)))
 
-    for i, obj in enumerate(results.objects):
-        print(f"Objet {i}:")
-        print(obj.properties)
+    start = time.perf_counter()
+    written = backend.upsert_stream(objects())
+    get_lexical_index().add(uuids, chunks)
+    elapsed = time.perf_counter() - start
+    # Durée d'écriture seule (l'encodage a sa propre mesure "embed")
+    observe_stage("index", "insert", max(0.0, elapsed - embed_seconds))
+    INDEXED_CHUNKS.inc(written, operation="added")
+    return {
+        "inserted": written,
+        "seconds": round(elapsed, 3),
+        "inserted_per_s": round(written / elapsed, 1) if elapsed else None,
+    }
+
+
+def index_document(pdf_path: str, index_path: str = "faiss_index",
+                   progress: Optional[Callable[..., None]] = None,
+                   source_name: Optional[str] = None, content=None) -> dict:
+    """
+    Charge un fichier PDF ou PowerPoint, le découpe, l'encode et l'indexe
+    dans la base vectorielle configurée (Weaviate ou FAISS).
+
+    L'indexation est incrémentale : un fichier déjà indexé à l'identique est
+    ignoré, et pour un fichier modifié seuls les chunks nouveaux sont encodés
+    et insérés, les chunks disparus étant supprimés.
+    
+    Args:
+        pdf_path (str): Chemin vers le fichier à indexer.
+        index_path (str): Dossier où sauvegarder l'index FAISS.
+        progress (callable, optional): Callback `progress(stage=..., **compteurs)`
+            appelé à chaque étape (voir `jobs.Job.update`).
+        source_name (str, optional): Nom de la source (par défaut, le nom du fichier).
+        content (SpooledUpload, optional): Fichier reçu par l'API (voir `uploads.py`),
+            indexé depuis son tampon sans passer par un fichier temporaire.
+
+    Returns:
+        dict: Bilan de l'indexation (chunks ajoutés, conservés et supprimés).
+    """
+    print(f"📥 Chargement du document : {pdf_path}")
+    _report(progress, "loading")
+    source = source_name or os.path.basename(pdf_path)
+
+    # Un fichier identique à la dernière indexation ne change rien
+    file_hash = content.sha256 if content is not None else file_sha256(pdf_path)
+    if get_manifest().is_unchanged(source, file_hash):
+        print(f"⏭️ Document inchangé, rien à réindexer : {source}")
+        return {"source": source, "status": "unchanged", "added": 0, "removed": 0}
+
+    # Embeddings partagés (chargés une seule fois par processus)
+    embeddings = get_embeddings()
+
+    # Pages extraites et découpées au fil de l'eau (PDF), ou slides (PowerPoint)
+    documents = iter_documents(pdf_path, content=content)
+    _report(progress, "chunking", pages_done=0)
+
+    #✅ SEMANTIC CHUNKING
+    print("\n🧠 Découpage sémantique intelligent...")
+    chunks = chunk_documents(documents, embeddings, progress=progress, source=source)
+    print(f"✅ {len(chunks)} chunks créés.")
+
+    # Seuls les chunks absents du manifeste sont encodés
+    plan = plan_update(source, file_hash, chunks)
+    print(f"🔁 {len(plan.new_chunks)} chunk(s) à ajouter, {len(plan.removed_uuids)} à supprimer")
+
+    # ✅ ENCODAGE ET ENREGISTREMENT PAR LOTS DANS LA BASE VECTORIELLE (Weaviate ou FAISS)
+    backend = get_vector_backend()
+    print(f"\n💾 Enregistrement dans {backend.name}...")
+    _report(progress, "writing", chunks_total=len(plan.new_chunks), chunks_done=0)
+
+    try:
+        removed = apply_deletions(backend, plan)
+        write_stats = embed_and_write(backend, plan.new_chunks, plan.new_uuids, embeddings,
+                                      progress=progress)
+        commit_plan(backend, plan)
+        print(f"✅ {len(plan.new_chunks)} chunks ajoutés avec succès! "
+              f"({write_stats['inserted_per_s']} objets/s)")
+    except Exception as e:
+        print(f"❌ Erreur lors de l'ajout des documents : {str(e)}")
+        raise
 
+    if INDEX_DEBUG_DUMPS:
+        for i, chunk in enumerate(chunks):
+            print(f"Chunk {i}:")
+            print(chunk.page_content)
+            print("="*40)
 
-    print(vars(chunks[0]))
-    print(chunks[0].page_content)
-    print(chunks[0].metadata)
-    print("walouuu")
+        for i, properties in enumerate(backend.sample(limit=10)):
+            print(f"Objet {i}:")
+            print(properties)
 
     # if os.path.exists(index_path):
     #     print(f"📂 Chargement de l'index existant depuis : {index_path}")
@@ -174,4 +327,11 @@ def index_document(pdf_path: str, index_path: str = "faiss_index") -> FAISS:
     # vectorstore.save_local(index_path)
     # print(f"✅ Index mis à jour dans : {index_path}")
 
-    return vectorstore
\ No newline at end of file
+    return {
+        "source": source,
+        "status": "updated",
+        "added": len(plan.new_chunks),
+        "kept": len(plan.chunk_ids) - len(plan.new_chunks),
+        "removed": removed,
+        "inserted_per_s": write_stats["inserted_per_s"],
+    }
\ No newline at end of file
@@ -0,0 +1,116 @@
+"""Manifeste des documents indexés, pour la réindexation incrémentale.
+
+Pour chaque source, le manifeste garde le hash du fichier et le hash de
+chacun de ses chunks, associé à l'UUID déterministe de l'objet Weaviate.
+Un fichier inchangé n'est donc pas retraité, et un fichier modifié ne
+provoque l'encodage que des chunks nouveaux ou modifiés.
+"""
+import hashlib
+import json
+import os
+import threading
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+from config import INDEX_MANIFEST_PATH
+from embedding_cache import normalize_text
+
+# Espace de noms des UUID v5 des chunks
+CHUNK_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "qwanza_docs")
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_hash(text: str) -> str:
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def chunk_uuid(source: str, content_hash: str) -> str:
+    """UUID déterministe d'un chunk : réinsérer le même chunk écrase l'objet existant."""
+    return str(uuid.uuid5(CHUNK_NAMESPACE, f"{source}:{content_hash}"))
+
+
+class IndexManifest:
+    """Manifeste JSON {source: {"file_hash": ..., "chunks": {hash: uuid}}}."""
+
+    def __init__(self, path: str = INDEX_MANIFEST_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._data = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self._data = json.load(f)
+
+    def get(self, source: str) -> Optional[dict]:
+        with self._lock:
+            return self._data.get(source)
+
+    def sources(self) -> List[str]:
+        with self._lock:
+            return list(self._data)
+
+    def is_unchanged(self, source: str, file_hash: str) -> bool:
+        entry = self.get(source)
+        return entry is not None and entry["file_hash"] == file_hash
+
+    def diff(self, source: str, chunk_ids: Dict[str, str]) -> Tuple[List[str], List[str]]:
+        """
+        Compare les chunks courants d'une source à ceux du manifeste.
+
+        Returns:
+            tuple: (hashes des chunks à ajouter, UUID des objets à supprimer)
+        """
+        previous = (self.get(source) or {}).get("chunks", {})
+        added = [h for h in chunk_ids if h not in previous]
+        removed = [u for h, u in previous.items() if h not in chunk_ids]
+        return added, removed
+
+    def update(self, source: str, file_hash: str, chunk_ids: Dict[str, str]) -> None:
+        with self._lock:
+            self._data[source] = {"file_hash": file_hash, "chunks": dict(chunk_ids)}
+            self._save()
+
+    def remove(self, source: str) -> None:
+        with self._lock:
+            if self._data.pop(source, None) is not None:
+                self._save()
+
+    def snapshot(self) -> dict:
+        """Copie complète du manifeste (sauvegarde de la collection)."""
+        with self._lock:
+            return json.loads(json.dumps(self._data))
+
+    def restore(self, data: dict, merge: bool = True) -> None:
+        """Recharge des entrées sauvegardées (fusionnées ou en remplacement)."""
+        with self._lock:
+            if not merge:
+                self._data = {}
+            self._data.update(data)
+            self._save()
+
+    def _save(self) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+
+_manifest = None
+_manifest_lock = threading.Lock()
+
+
+def get_manifest() -> IndexManifest:
+    """Retourne le manifeste partagé par le processus."""
+    global _manifest
+    if _manifest is None:
+        with _manifest_lock:
+            if _manifest is None:
+                _manifest = IndexManifest()
+    return _manifest
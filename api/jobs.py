@@ -0,0 +1,139 @@
+"""File de tâches d'indexation exécutées en arrière-plan.
+
+Les uploads sont placés dans une file et traités par un pool de threads
+borné, pour ne pas bloquer la boucle d'événements de FastAPI. Chaque tâche
+expose son étape courante, sa progression (pages/chunks traités) et ses
+temps d'exécution via `GET /jobs/{id}`.
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+from config import INDEX_MAX_WORKERS, INDEX_MAX_PENDING_JOBS, INDEX_JOB_HISTORY
+
+
+class QueueFullError(Exception):
+    """Levée quand trop de tâches sont déjà en attente."""
+
+
+@dataclass
+class Job:
+    id: str
+    filename: str
+    status: str = "queued"          # queued | running | done | error
+    stage: str = "queued"
+    pages_done: int = 0
+    pages_total: Optional[int] = None
+    chunks_done: int = 0
+    chunks_total: Optional[int] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    stage_timings: dict = field(default_factory=dict)
+    error: Optional[str] = None
+    result: Optional[dict] = None
+    _stage_started_at: Optional[float] = field(default=None, repr=False)
+
+    def update(self, stage: Optional[str] = None, **counters) -> None:
+        """Callback de progression passé à `index_document()`."""
+        now = time.time()
+        if stage and stage != self.stage:
+            if self._stage_started_at is not None:
+                self.stage_timings[self.stage] = round(now - self._stage_started_at, 3)
+            self.stage = stage
+            self._stage_started_at = now
+        for name, value in counters.items():
+            if hasattr(self, name):
+                setattr(self, name, value)
+
+    def to_dict(self) -> dict:
+        now = time.time()
+        end = self.finished_at or now
+        return {
+            "id": self.id,
+            "filename": self.filename,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": {
+                "pages_done": self.pages_done,
+                "pages_total": self.pages_total,
+                "chunks_done": self.chunks_done,
+                "chunks_total": self.chunks_total,
+            },
+            "timing": {
+                "queued_seconds": round((self.started_at or now) - self.created_at, 3),
+                "running_seconds": round(end - self.started_at, 3) if self.started_at else None,
+                "stages": self.stage_timings,
+            },
+            "error": self.error,
+            "result": self.result,
+        }
+
+
+class JobManager:
+    """Pool borné de workers d'indexation avec historique des tâches."""
+
+    def __init__(self, max_workers: int = INDEX_MAX_WORKERS,
+                 max_pending: int = INDEX_MAX_PENDING_JOBS,
+                 history: int = INDEX_JOB_HISTORY):
+        self.max_pending = max_pending
+        self.history = history
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="indexer")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if job.status in ("queued", "running"))
+
+    def submit(self, filename: str, fn: Callable, *args, **kwargs) -> Job:
+        """Place `fn(*args, progress=job.update, **kwargs)` dans la file."""
+        with self._lock:
+            pending = sum(1 for job in self._jobs.values() if job.status in ("queued", "running"))
+            if pending >= self.max_pending:
+                raise QueueFullError(f"{pending} tâches d'indexation déjà en attente")
+            job = Job(id=uuid.uuid4().hex, filename=filename)
+            self._jobs[job.id] = job
+            self._trim()
+
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self) -> list:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def _run(self, job: Job, fn: Callable, args, kwargs) -> None:
+        job.started_at = time.time()
+        job.status = "running"
+        job.update(stage="starting")
+        try:
+            result = fn(*args, progress=job.update, **kwargs)
+            if isinstance(result, dict):
+                job.result = result
+            job.update(stage="done")
+            job.status = "done"
+        except Exception as e:
+            job.error = str(e)
+            job.update(stage="error")
+            job.status = "error"
+            print(f"❌ Échec de l'indexation de {job.filename}: {job.error}")
+        finally:
+            job.finished_at = time.time()
+
+    def _trim(self) -> None:
+        # Ne conserve que les tâches terminées les plus récentes
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in ("done", "error")]
+        for job_id in finished[:max(0, len(self._jobs) - self.history)]:
+            del self._jobs[job_id]
+
+
+job_manager = JobManager()
@@ -0,0 +1,279 @@
+"""Index lexical BM25 tenu à jour à côté de la base vectorielle.
+
+La recherche dense rate souvent les correspondances exactes (acronymes,
+noms de produits, termes du dictionnaire Qwanza). Cet index BM25, avec une
+tokenisation adaptée au français (élisions, accents, mots vides, pluriels),
+est fusionné avec les résultats vectoriels par Reciprocal Rank Fusion.
+
+Usage en ligne de commande (reconstruction depuis la base vectorielle) :
+    python lexical_index.py --rebuild
+"""
+import json
+import math
+import os
+import re
+import threading
+import unicodedata
+from collections import Counter, defaultdict
+from typing import Dict, List, Tuple
+
+from langchain_core.documents import Document
+
+from config import BM25_INDEX_PATH, BM25_K1, BM25_B
+
+FRENCH_STOPWORDS = set("""
+a au aux avec ce ces cet cette dans de des du elle en et eux il ils je la le les leur
+leurs lui ma mais me meme mes moi mon ne nos notre nous on ou par pas pour qu que qui
+sa se ses son sur ta te tes toi ton tu un une vos votre vous c d j l m n s t y est sont
+ete etre avoir ont a as avez etait sera quel quelle quels quelles comment pourquoi quoi
+dont ou plus tres aussi comme tout tous toute toutes fait faire peut
+""".split())
+
+_ELISION = re.compile(r"\b(?:[cdjlmnst]|qu|jusqu|lorsqu|puisqu)['’]", re.IGNORECASE)
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def _strip_accents(text: str) -> str:
+    return "".join(
+        c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c)
+    )
+
+
+# Pluriels en -aux dont le singulier est en -al (liste fermée : "bureaux",
+# "travaux" ou "eaux" ne suivent pas cette règle)
+_AL_PLURALS = set("""
+animaux annuaux canaux capitaux centraux fiscaux generaux hopitaux horizontaux
+internationaux journaux legaux locaux materiaux minimaux maximaux nationaux
+normaux originaux principaux regionaux signaux sociaux totaux verticaux
+""".split())
+_IRREGULAR_PLURALS = {"travaux": "travail", "vitraux": "vitrail", "emaux": "email"}
+
+
+def _stem(token: str) -> str:
+    # Racinisation légère : seuls les pluriels sont ramenés au singulier
+    if token in _IRREGULAR_PLURALS:
+        return _IRREGULAR_PLURALS[token]
+    if token in _AL_PLURALS:
+        return token[:-3] + "al"
+    if len(token) > 3 and token[-1] in "sx" and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    """Tokenisation française : élisions retirées, sans accents, sans mots vides."""
+    text = _ELISION.sub(" ", text.lower())
+    text = _strip_accents(text)
+    return [
+        _stem(token) for token in _TOKEN.findall(text)
+        if token not in FRENCH_STOPWORDS
+    ]
+
+
+class BM25Index:
+    """
+    Index inversé BM25 persistant (JSON), indexé par UUID de chunk.
+
+    `add()` et `delete()` ne modifient que la mémoire : le fichier, réécrit
+    en entier, n'est sauvegardé que par `flush()` (une fois par document
+    indexé, voir `index_document.commit_plan`) ou par `replace_all()`.
+    """
+
+    def __init__(self, path: str = BM25_INDEX_PATH, k1: float = BM25_K1, b: float = BM25_B):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._docs: Dict[str, dict] = {}                      # uuid -> {content, source, page, length}
+        self._postings: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self._total_length = 0
+        self._mtime = None
+        self._dirty = False
+        self._load()
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._maybe_reload()
+            return len(self._docs)
+
+    # --- Persistance -----------------------------------------------------
+
+    def _load(self) -> None:
+        self._docs = {}
+        self._postings = defaultdict(dict)
+        self._total_length = 0
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as f:
+            docs = json.load(f)["docs"]
+        for doc_id, doc in docs.items():
+            self._index_doc(doc_id, doc["content"], doc["source"], doc["page"])
+        self._mtime = os.stat(self.path).st_mtime_ns
+
+    def _maybe_reload(self) -> None:
+        # Un autre worker a pu modifier l'index sur disque (sauf modifications locales en attente)
+        if not self._dirty and os.path.exists(self.path) and os.stat(self.path).st_mtime_ns != self._mtime:
+            self._load()
+
+    def _save(self) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"docs": {
+                doc_id: {key: doc[key] for key in ("content", "source", "page")}
+                for doc_id, doc in self._docs.items()
+            }}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+        self._mtime = os.stat(self.path).st_mtime_ns
+        self._dirty = False
+
+    def flush(self) -> None:
+        """Écrit les modifications en attente sur disque."""
+        with self._lock:
+            if self._dirty:
+                self._save()
+
+    # --- Mise à jour -----------------------------------------------------
+
+    def _index_doc(self, doc_id: str, content: str, source: str, page) -> None:
+        self._unindex_doc(doc_id)
+        terms = Counter(tokenize(content))
+        for term, tf in terms.items():
+            self._postings[term][doc_id] = tf
+        length = sum(terms.values())
+        self._docs[doc_id] = {"content": content, "source": source, "page": page,
+                              "length": length, "terms": list(terms)}
+        self._total_length += length
+
+    def _unindex_doc(self, doc_id: str) -> bool:
+        doc = self._docs.pop(doc_id, None)
+        if doc is None:
+            return False
+        for term in doc["terms"]:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self._postings[term]
+        self._total_length -= doc["length"]
+        return True
+
+    def add(self, ids: List[str], documents: List[Document]) -> None:
+        with self._lock:
+            self._maybe_reload()
+            for doc_id, doc in zip(ids, documents):
+                self._index_doc(doc_id, doc.page_content,
+                                doc.metadata.get("source", ""), doc.metadata.get("page", 0))
+            self._dirty = self._dirty or bool(ids)
+
+    def delete(self, ids: List[str]) -> int:
+        with self._lock:
+            self._maybe_reload()
+            deleted = sum(1 for doc_id in ids if self._unindex_doc(doc_id))
+            self._dirty = self._dirty or bool(deleted)
+            return deleted
+
+    def delete_source(self, source: str) -> int:
+        with self._lock:
+            self._maybe_reload()
+            ids = [doc_id for doc_id, doc in self._docs.items() if doc["source"] == source]
+        return self.delete(ids)
+
+    def replace_all(self, ids: List[str], documents: List[Document]) -> None:
+        """Remplace tout le contenu de l'index et le sauvegarde."""
+        with self._lock:
+            self._docs = {}
+            self._postings = defaultdict(dict)
+            self._total_length = 0
+            for doc_id, doc in zip(ids, documents):
+                self._index_doc(doc_id, doc.page_content,
+                                doc.metadata.get("source", ""), doc.metadata.get("page", 0))
+            self._save()
+
+    # --- Recherche -------------------------------------------------------
+
+    def search(self, query: str, k: int) -> List[Tuple[Document, float]]:
+        """Retourne les k chunks de meilleur score BM25."""
+        with self._lock:
+            self._maybe_reload()
+            n_docs = len(self._docs)
+            if not n_docs:
+                return []
+            avgdl = self._total_length / n_docs
+            scores = defaultdict(float)
+            for term in set(tokenize(query)):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf in postings.items():
+                    length = self._docs[doc_id]["length"]
+                    scores[doc_id] += idf * tf * (self.k1 + 1) / (
+                        tf + self.k1 * (1 - self.b + self.b * length / avgdl)
+                    )
+            best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+            return [
+                (
+                    Document(
+                        page_content=self._docs[doc_id]["content"],
+                        metadata={"id": doc_id, "source": self._docs[doc_id]["source"],
+                                  "page": self._docs[doc_id]["page"]}
+                    ),
+                    score
+                )
+                for doc_id, score in best
+            ]
+
+
+def reciprocal_rank_fusion(rankings: List[List[Document]], weights: List[float],
+                           rrf_k: int) -> List[Tuple[Document, float]]:
+    """Fusionne plusieurs classements : score = Σ poids / (rrf_k + rang)."""
+    fused = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, doc in enumerate(ranking, 1):
+            doc_id = doc.metadata["id"]
+            doc_entry = fused.setdefault(doc_id, [doc, 0.0])
+            doc_entry[1] += weight / (rrf_k + rank)
+    return sorted((tuple(entry) for entry in fused.values()), key=lambda item: item[1], reverse=True)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_lexical_index() -> BM25Index:
+    """Retourne l'index BM25 partagé par le processus."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = BM25Index()
+    return _index
+
+
+def rebuild_from_backend(backend=None) -> int:
+    """Reconstruit l'index BM25 à partir des objets de la base vectorielle."""
+    from vector_store import get_vector_backend
+
+    backend = backend or get_vector_backend()
+    ids, documents = [], []
+    for object_id, doc, _ in backend.iterate():
+        ids.append(object_id)
+        documents.append(doc)
+    get_lexical_index().replace_all(ids, documents)
+    print(f"✅ Index BM25 reconstruit ({len(ids)} chunks)")
+    return len(ids)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Maintenance de l'index lexical BM25.")
+    parser.add_argument("--rebuild", action="store_true", help="Reconstruire depuis la base vectorielle")
+    args = parser.parse_args()
+    if args.rebuild:
+        rebuild_from_backend()
+    print(f"📊 {len(get_lexical_index())} chunks dans l'index BM25")
@@ -0,0 +1,81 @@
+"""Registre des clients Ollama, un par modèle.
+
+Chaque `OllamaLLM` garde son propre client HTTP (pool de connexions
+keep-alive) : le réutiliser évite de reconstruire le client et de rouvrir
+les connexions à chaque question. Les modèles proposés dans l'interface
+peuvent être préchargés dans Ollama au démarrage (`warm_up`).
+"""
+import threading
+import time
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+import httpx
+
+if TYPE_CHECKING:
+    from langchain_ollama import OllamaLLM
+
+from config import (
+    OLLAMA_BASE_URL,
+    OLLAMA_KEEP_ALIVE,
+    OLLAMA_MAX_CONNECTIONS,
+    OLLAMA_TIMEOUT_SECONDS,
+    OLLAMA_WARMUP_MODELS,
+)
+
+_lock = threading.Lock()
+_llms: Dict[str, "OllamaLLM"] = {}
+
+
+def _build_llm(model_name: str) -> "OllamaLLM":
+    # Import différé : langchain_ollama n'est chargé qu'à la première question
+    from langchain_ollama import OllamaLLM
+
+    return OllamaLLM(
+        model=model_name,
+        base_url=OLLAMA_BASE_URL,
+        keep_alive=OLLAMA_KEEP_ALIVE,
+        client_kwargs={
+            "timeout": OLLAMA_TIMEOUT_SECONDS,
+            "limits": httpx.Limits(
+                max_connections=OLLAMA_MAX_CONNECTIONS,
+                max_keepalive_connections=OLLAMA_MAX_CONNECTIONS,
+            ),
+        },
+    )
+
+
+def get_llm(model_name: str) -> "OllamaLLM":
+    """Retourne le client Ollama du modèle, créé au premier appel."""
+    llm = _llms.get(model_name)
+    if llm is None:
+        with _lock:
+            llm = _llms.get(model_name)
+            if llm is None:
+                llm = _build_llm(model_name)
+                _llms[model_name] = llm
+    return llm
+
+
+def warm_up(models: Optional[List[str]] = None) -> Dict[str, Optional[float]]:
+    """
+    Charge les modèles dans Ollama à l'avance (une requête vide suffit).
+
+    Returns:
+        dict: Durée de chargement par modèle en secondes (None en cas d'échec).
+    """
+    timings = {}
+    for model_name in models if models is not None else OLLAMA_WARMUP_MODELS:
+        start = time.perf_counter()
+        try:
+            get_llm(model_name).invoke("")
+            timings[model_name] = round(time.perf_counter() - start, 3)
+            print(f"🔥 Modèle {model_name} préchargé en {timings[model_name]:.2f}s")
+        except Exception as e:
+            timings[model_name] = None
+            print(f"⚠️ Préchargement de {model_name} impossible : {str(e)}")
+    return timings
+
+
+def loaded_models() -> List[str]:
+    with _lock:
+        return list(_llms)
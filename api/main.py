@@ -1,48 +1,223 @@
-from fastapi import FastAPI, UploadFile, File
+from fastapi import FastAPI, Request, UploadFile, File, Form, HTTPException
 from pydantic import BaseModel
-from rag import query_documents
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from rag import aanswer_question, astream_documents
 from index_document import index_document  # si tu la mets dans un autre fichier
-import tempfile
-import shutil
+from embeddings_service import get_embedding_stats
+from answer_cache import answer_cache, normalize_question
+from admission import OverloadedError, admission_stats, coalescer
+from jobs import job_manager, QueueFullError
+from llm_registry import warm_up, loaded_models
+from config import OLLAMA_WARMUP_MODELS, VECTOR_BACKEND, PREDICT_BATCH_MAX_QUESTIONS, PREDICT_COALESCE
+from batch_indexer import run_pipeline
+from batch_qa import parse_questions, aanswer_batch
+from uploads import (
+    SpooledUpload,
+    UnsupportedFormatError,
+    UploadTooLargeError,
+    spool_async_stream,
+    spool_upload_file,
+)
+from metrics import HTTP_SECONDS, render as render_metrics, trace
+from startup import start_prewarm, liveness, readiness, shutdown
+from contextlib import asynccontextmanager
+from typing import List
+import json
+import os
+import time
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Préchargement en arrière-plan pour ne pas retarder le démarrage de l'API
+    start_prewarm()
+    yield
+    shutdown()
+
 
-app = FastAPI()
 app = FastAPI(
     title="Qwanza RAG API",
     description="API pour poser des questions à partir de documents vectorisés.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
 )
+
+
+@app.middleware("http")
+async def record_request_duration(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Le modèle de route (/jobs/{job_id}) évite une série par identifiant
+        route = request.scope.get("route")
+        HTTP_SECONDS.observe(time.perf_counter() - start, method=request.method,
+                             path=getattr(route, "path", "unmatched"), status=status)
+
+
 # Define a request model
 class InputData(BaseModel):
     text: str
     model: str = "llama3.2"  # par défaut
+    debug: bool = False  # renvoie la trace détaillée des étapes
 
 # Health check endpoint
 @app.get("/health")
 def health_check():
-    return {"status": "API is running"}
+    return {
+        "status": "API is running",
+        "embeddings": get_embedding_stats(),
+        "answer_cache": answer_cache.stats(),
+        "llm_clients": loaded_models(),
+        "generation": admission_stats(),
+        "vector_backend": VECTOR_BACKEND,
+    }
+
+
+@app.get("/health/live")
+def health_live():
+    """Sonde de vie : le processus répond, sans toucher aux dépendances."""
+    return liveness()
+
+
+@app.get("/health/ready")
+def health_ready():
+    """Sonde de disponibilité : 503 tant que la base vectorielle ou le préchargement ne sont pas prêts."""
+    status = readiness()
+    if not status["ready"]:
+        return JSONResponse(status_code=503, content=status)
+    return status
+
+
+class WarmupRequest(BaseModel):
+    models: List[str] = OLLAMA_WARMUP_MODELS or ["llama3.2", "mistral", "deepseek-r1:7b"]
 
 
-@app.post("/index_pdf")
+@app.post("/warmup")
+def warmup_models(request: WarmupRequest):
+    """Précharge les modèles dans Ollama et retourne leur temps de chargement."""
+    return {"timings": warm_up(request.models)}
+
+
+def _index_upload(upload: SpooledUpload, progress=None) -> dict:
+    """Indexe un fichier reçu depuis son tampon, puis libère ce dernier."""
+    try:
+        return index_document(upload.name, progress=progress, source_name=upload.name, content=upload)
+    finally:
+        upload.close()
+
+
+def _upload_error(e: Exception) -> HTTPException:
+    status = 413 if isinstance(e, UploadTooLargeError) else 415
+    return HTTPException(status_code=status, detail=str(e))
+
+
+def _queue_upload(upload: SpooledUpload) -> dict:
+    try:
+        job = job_manager.submit(upload.name, _index_upload, upload)
+    except QueueFullError as e:
+        upload.close()
+        raise HTTPException(status_code=429, detail=str(e))
+    return {"status": "queued", "job_id": job.id, "source": upload.name}
+
+
+@app.post("/index_pdf", status_code=202)
 async def index_uploaded_pdf(pdf_file: UploadFile = File(...)):
+    """Indexe un PDF ou un PowerPoint envoyé en multipart (format détecté sur le contenu)."""
     try:
-        # Sauvegarder temporairement
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-            shutil.copyfileobj(pdf_file.file, tmp)
-            pdf_path = tmp.name
+        # Reçu par blocs, en mémoire (ou sur disque au-delà de UPLOAD_SPOOL_MAX_MEMORY)
+        try:
+            upload = await spool_upload_file(pdf_file)
+        except (UnsupportedFormatError, UploadTooLargeError) as e:
+            raise _upload_error(e)
 
-        # Indexer
-        vectorstore = index_document(pdf_path)
+        # Indexer en arrière-plan
+        return _queue_upload(upload)
 
-        if vectorstore is None:
-            return {"status": "error", "message": "Échec de l'indexation"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+
+@app.post("/index_stream", status_code=202)
+async def index_streamed_file(request: Request, filename: str = "document"):
+    """
+    Indexe un fichier envoyé tel quel dans le corps de la requête (éventuellement
+    en transfert chunked), sans encodage multipart :
+        curl -T deck.pptx "http://localhost:8000/index_stream?filename=deck.pptx"
+    """
+    try:
+        upload = await spool_async_stream(filename, request.stream())
+    except (UnsupportedFormatError, UploadTooLargeError) as e:
+        raise _upload_error(e)
+    return _queue_upload(upload)
 
-        return {"status": "indexed"}
 
+@app.post("/index_batch", status_code=202)
+async def index_uploaded_batch(files: List[UploadFile] = File(...)):
+    try:
+        uploads = []
+        try:
+            for upload_file in files:
+                uploads.append(await spool_upload_file(upload_file))
+        except (UnsupportedFormatError, UploadTooLargeError) as e:
+            for upload in uploads:
+                upload.close()
+            raise HTTPException(status_code=_upload_error(e).status_code,
+                                detail=f"{upload_file.filename} : {e}")
+
+        # Le nom du fichier est la source indexée : deux homonymes s'écraseraient
+        names = [upload.name for upload in uploads]
+        duplicates = sorted({name for name in names if names.count(name) > 1})
+        if duplicates:
+            for upload in uploads:
+                upload.close()
+            raise HTTPException(status_code=400,
+                                detail=f"Fichiers en double dans le lot : {', '.join(duplicates)}")
+
+        # Un seul job pour tout le lot ; le pipeline libère chaque tampon après chargement
+        try:
+            job = job_manager.submit(f"{len(uploads)} fichier(s)", run_pipeline, uploads)
+        except QueueFullError as e:
+            for upload in uploads:
+                upload.close()
+            raise HTTPException(status_code=429, detail=str(e))
+        return {"status": "queued", "job_id": job.id, "files": len(uploads), "sources": names}
+
+    except HTTPException:
+        raise
     except Exception as e:
         return {"status": "error", "message": str(e)}
+
+
+@app.get("/jobs")
+def list_jobs():
+    return {"jobs": [job.to_dict() for job in job_manager.list()]}
+
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Tâche inconnue : {job_id}")
+    return job.to_dict()
     
+@app.get("/metrics")
+def metrics():
+    """Mesures au format texte Prometheus (durées par étape, tokens, TTFT, HTTP)."""
+    return Response(content=render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def _overloaded(e: OverloadedError) -> HTTPException:
+    return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+
 @app.post("/predict")
-def predict(input_data: InputData):
+async def predict(input_data: InputData):
     question = input_data.text.strip()
     model = input_data.model
 
@@ -50,8 +225,87 @@ def predict(input_data: InputData):
         return {"result": "⚠️ Aucune question fournie."}
 
     try:
-        # 🔍 Appel de la fonction RAG
-        response = query_documents(question, model_name=model)
-        return {"result": response}
+        # 🔍 Appel de la fonction RAG (route choisie avant la génération)
+        with trace() as spans:
+            if PREDICT_COALESCE and not input_data.debug:
+                # Les questions identiques déjà en cours partagent la même génération
+                response = await coalescer.run(
+                    (model, normalize_question(question)),
+                    lambda: aanswer_question(question, model_name=model),
+                )
+            else:
+                response = await aanswer_question(question, model_name=model)
+        result = {
+            "result": response["answer"],
+            "route": response["route"],
+            "sources": response["sources"],
+            "cached": response["cached"],
+            "timings": response["timings"],
+        }
+        if input_data.debug:
+            result["trace"] = spans
+        return result
+    except OverloadedError as e:
+        raise _overloaded(e)
     except Exception as e:
-        return {"result": f" Erreur lors de la génération de la réponse : {str(e)}"}
\ No newline at end of file
+        return {"result": f" Erreur lors de la génération de la réponse : {str(e)}"}
+
+
+@app.post("/predict_stream")
+async def predict_stream(input_data: InputData):
+    """Réponse en Server-Sent Events : sources, puis tokens, puis statistiques de latence."""
+    question = input_data.text.strip()
+    model = input_data.model
+
+    if not question:
+        async def empty():
+            yield _sse("error", "⚠️ Aucune question fournie.")
+        return StreamingResponse(empty(), media_type="text/event-stream")
+
+    # Premier événement lu avant de répondre : un modèle saturé donne un 503, pas un flux vide
+    events = astream_documents(question, model_name=model)
+    try:
+        first = await events.__anext__()
+    except OverloadedError as e:
+        raise _overloaded(e)
+
+    async def event_stream():
+        try:
+            yield _sse(first["event"], first["data"])
+            async for event in events:
+                yield _sse(event["event"], event["data"])
+        finally:
+            await events.aclose()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/predict_batch")
+async def predict_batch(questions: UploadFile = File(...), model: str = Form("llama3.2")):
+    """
+    Répond à un fichier JSONL de questions ; renvoie une ligne JSON par question.
+
+    Les générations passent par le limiteur du modèle, comme /predict : une
+    question refusée faute de place est renvoyée avec un champ "error".
+    """
+    try:
+        items = parse_questions((await questions.read()).decode("utf-8").splitlines(), default_model=model)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if len(items) > PREDICT_BATCH_MAX_QUESTIONS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Trop de questions ({len(items)} > {PREDICT_BATCH_MAX_QUESTIONS})",
+        )
+
+    results = await aanswer_batch(items)
+    body = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in results)
+    return Response(content=body, media_type="application/x-ndjson")
+
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
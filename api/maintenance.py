@@ -0,0 +1,357 @@
+"""Outils de maintenance de la collection (remplace check_weaviat.py).
+
+Fonctionne avec le moteur configuré (`VECTOR_BACKEND`, Weaviate ou FAISS).
+
+Usage en ligne de commande :
+    python maintenance.py stats                     # total et objets par source
+    python maintenance.py stats --source deck.pptx  # objets par page d'une source
+    python maintenance.py sample -n 5               # aperçu de quelques objets
+    python maintenance.py export backup/            # sauvegarde (métadonnées + vecteurs .npy)
+    python maintenance.py import backup/ --replace  # restauration sans recalcul des embeddings
+    python maintenance.py duplicates --near 0.98    # chunks en double (exacts et quasi identiques)
+
+Les comptes utilisent des agrégations côté serveur, et l'export parcourt la
+collection par curseur : la mémoire utilisée ne dépend pas de sa taille.
+Le format d'export est un dossier contenant :
+    export.json        description (nombre d'objets, dimension, modèle, sources)
+    objects.parquet    uuid, source, page, content (objects.jsonl sans pyarrow)
+    vectors.npy        vecteurs float32, dans l'ordre des objets
+    index_manifest.json  manifeste d'indexation incrémentale
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from answer_cache import answer_cache
+from config import COLLECTION_NAME, EMBEDDING_MODEL_NAME, WEAVIATE_BATCH_SIZE
+from index_manifest import get_manifest, chunk_hash
+from lexical_index import rebuild_from_backend
+from vector_store import VectorBackend, get_vector_backend
+
+EXPORT_BATCH_SIZE = 5000
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+
+# ---------------------------------------------------------------------------
+# Statistiques
+# ---------------------------------------------------------------------------
+
+def collection_stats(backend: VectorBackend, source: Optional[str] = None) -> dict:
+    """Total et répartition par source (ou, pour une source, par page)."""
+    if source is None:
+        by_source = backend.count_by("source")
+        return {"total": backend.count(), "sources": len(by_source),
+                "by_source": dict(sorted(by_source.items(), key=lambda item: -item[1]))}
+    by_page = backend.count_by("page", source=source)
+    return {"source": source, "total": sum(by_page.values()),
+            "by_page": {_page_label(page): count for page, count in sorted(by_page.items(), key=lambda i: i[0] or 0)}}
+
+
+def _page_label(page) -> str:
+    # Weaviate stocke la page en NUMBER (3.0)
+    return str(int(page)) if isinstance(page, float) and page.is_integer() else str(page)
+
+
+# ---------------------------------------------------------------------------
+# Export / import
+# ---------------------------------------------------------------------------
+
+class _ObjectWriter:
+    """Métadonnées des objets en Parquet (par groupes de lignes) ou en JSONL."""
+
+    def __init__(self, directory: str):
+        self.format = "parquet" if pq is not None else "jsonl"
+        self.path = os.path.join(directory, f"objects.{self.format}")
+        self._rows: List[dict] = []
+        self._writer = None
+        self._file = open(self.path, "w", encoding="utf-8") if self.format == "jsonl" else None
+
+    def add(self, row: dict) -> None:
+        if self._file is not None:
+            self._file.write(json.dumps(row, ensure_ascii=False) + "\n")
+            return
+        self._rows.append(row)
+        if len(self._rows) >= EXPORT_BATCH_SIZE:
+            self._flush()
+
+    def _flush(self) -> None:
+        if not self._rows:
+            return
+        table = pa.Table.from_pylist(self._rows, schema=pa.schema([
+            ("uuid", pa.string()), ("source", pa.string()), ("page", pa.float64()), ("content", pa.string()),
+        ]))
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.path, table.schema, compression="zstd")
+        self._writer.write_table(table)
+        self._rows = []
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            return
+        self._flush()
+        if self._writer is not None:
+            self._writer.close()
+
+
+def _write_npy(raw_path: str, npy_path: str, count: int, dimension: int) -> None:
+    """Transforme un fichier float32 brut en .npy, sans le charger en mémoire."""
+    with open(npy_path, "wb") as out, open(raw_path, "rb") as raw:
+        np.lib.format.write_array_header_1_0(
+            out, {"descr": "<f4", "fortran_order": False, "shape": (count, dimension)}
+        )
+        shutil.copyfileobj(raw, out, length=16 * 1024 * 1024)
+    os.remove(raw_path)
+
+
+def export_collection(backend: VectorBackend, directory: str) -> dict:
+    """
+    Sauvegarde tous les objets (propriétés et vecteurs) par itération de curseur.
+
+    Returns:
+        dict: Contenu de `export.json`.
+    """
+    os.makedirs(directory, exist_ok=True)
+    start = time.perf_counter()
+    objects = _ObjectWriter(directory)
+    raw_path = os.path.join(directory, "vectors.f32.tmp")
+    count, dimension, sources = 0, None, set()
+    with open(raw_path, "wb") as raw:
+        for object_id, doc, vector in backend.iterate(include_vectors=True):
+            if vector is None:
+                raise RuntimeError(f"Objet sans vecteur : {object_id}")
+            vector = np.asarray(vector, dtype="<f4")
+            if dimension is None:
+                dimension = vector.shape[0]
+            raw.write(vector.tobytes())
+            source = doc.metadata.get("source", "")
+            sources.add(source)
+            objects.add({"uuid": object_id, "source": source,
+                         "page": float(doc.metadata.get("page") or 0), "content": doc.page_content})
+            count += 1
+            if count % EXPORT_BATCH_SIZE == 0:
+                print(f"📦 {count} objets exportés...")
+    objects.close()
+    _write_npy(raw_path, os.path.join(directory, "vectors.npy"), count, dimension or 0)
+
+    with open(os.path.join(directory, "index_manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(get_manifest().snapshot(), f, ensure_ascii=False)
+
+    description = {
+        "collection": COLLECTION_NAME,
+        "backend": backend.name,
+        "count": count,
+        "dimension": dimension,
+        "embedding_model": EMBEDDING_MODEL_NAME,
+        "objects_format": objects.format,
+        "sources": sorted(sources),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "seconds": round(time.perf_counter() - start, 2),
+    }
+    with open(os.path.join(directory, "export.json"), "w", encoding="utf-8") as f:
+        json.dump(description, f, indent=2, ensure_ascii=False)
+    return description
+
+
+def _read_objects(directory: str, objects_format: str) -> Iterator[dict]:
+    path = os.path.join(directory, f"objects.{objects_format}")
+    if objects_format == "parquet":
+        if pq is None:
+            raise RuntimeError("pyarrow est nécessaire pour relire un export Parquet")
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=EXPORT_BATCH_SIZE):
+            yield from batch.to_pylist()
+    else:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def import_collection(backend: VectorBackend, directory: str, replace: bool = False,
+                      batch_size: int = WEAVIATE_BATCH_SIZE) -> dict:
+    """
+    Recharge un export dans la base vectorielle, sans recalculer les embeddings.
+
+    Args:
+        replace: Supprime d'abord les objets existants des sources exportées.
+
+    Raises:
+        ValueError: Si l'export a été produit avec un autre modèle d'embeddings.
+    """
+    with open(os.path.join(directory, "export.json"), encoding="utf-8") as f:
+        description = json.load(f)
+    if description.get("embedding_model") != EMBEDDING_MODEL_NAME:
+        raise ValueError(f"Export produit avec {description.get('embedding_model')}, "
+                         f"modèle configuré : {EMBEDDING_MODEL_NAME}")
+
+    start = time.perf_counter()
+    deleted = 0
+    if replace:
+        for source in description.get("sources", []):
+            deleted += backend.delete_source(source)
+
+    vectors = np.load(os.path.join(directory, "vectors.npy"), mmap_mode="r")
+
+    def objects() -> Iterator[Tuple[str, Document, List[float]]]:
+        for row, vector in zip(_read_objects(directory, description["objects_format"]), vectors):
+            page = row.get("page") or 0
+            yield row["uuid"], Document(
+                page_content=row["content"],
+                metadata={"source": row["source"], "page": int(page) if float(page).is_integer() else page},
+            ), vector.tolist()
+
+    inserted = backend.upsert_stream(objects(), batch_size=batch_size)
+
+    manifest_path = os.path.join(directory, "index_manifest.json")
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding="utf-8") as f:
+            get_manifest().restore(json.load(f))
+    # L'index BM25 et le cache de réponses suivent le nouveau contenu
+    rebuild_from_backend(backend)
+    answer_cache.invalidate()
+
+    elapsed = time.perf_counter() - start
+    return {"inserted": inserted, "deleted": deleted, "seconds": round(elapsed, 2),
+            "inserted_per_s": round(inserted / elapsed, 1) if elapsed else None}
+
+
+# ---------------------------------------------------------------------------
+# Doublons
+# ---------------------------------------------------------------------------
+
+def _location(object_id: str, doc: Document) -> dict:
+    return {"uuid": object_id, "source": doc.metadata.get("source", ""),
+            "page": _page_label(doc.metadata.get("page"))}
+
+
+def find_duplicates(backend: VectorBackend, near_threshold: Optional[float] = None,
+                    limit: int = 50, block_size: int = 1024) -> dict:
+    """
+    Chunks en double : contenus identiques (après normalisation) et, si
+    `near_threshold` est fourni, paires de vecteurs de similarité cosinus
+    supérieure ou égale au seuil.
+    """
+    groups: Dict[str, List[dict]] = {}
+    ids, vectors, locations = [], [], []
+    for object_id, doc, vector in backend.iterate(include_vectors=near_threshold is not None):
+        location = _location(object_id, doc)
+        groups.setdefault(chunk_hash(doc.page_content), []).append(location)
+        if near_threshold is not None and vector is not None:
+            ids.append(object_id)
+            vectors.append(np.asarray(vector, dtype=np.float32))
+            locations.append(location)
+
+    exact = sorted((g for g in groups.values() if len(g) > 1), key=len, reverse=True)
+    result = {
+        "objects": sum(len(g) for g in groups.values()),
+        "exact_groups": len(exact),
+        "exact_redundant_objects": sum(len(g) - 1 for g in exact),
+        "exact": exact[:limit],
+    }
+
+    if near_threshold is not None and vectors:
+        matrix = np.vstack(vectors)
+        matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        pairs = []
+        # Produit matriciel par blocs : seule la moitié supérieure est examinée
+        for start in range(0, len(matrix), block_size):
+            block = matrix[start:start + block_size] @ matrix.T
+            rows, cols = np.nonzero(block >= near_threshold)
+            for row, col in zip(rows.tolist(), cols.tolist()):
+                i = start + row
+                if col > i:
+                    pairs.append((float(block[row, col]), i, col))
+        pairs.sort(reverse=True)
+        result["near_pairs"] = len(pairs)
+        result["near"] = [
+            {"similarity": round(similarity, 4), "a": locations[i], "b": locations[j]}
+            for similarity, i, j in pairs[:limit]
+        ]
+    return result
+
+
+# ---------------------------------------------------------------------------
+# CLI
+# ---------------------------------------------------------------------------
+
+def _print_stats(stats: dict) -> None:
+    if "by_source" in stats:
+        print(f"\n📊 {stats['total']} objet(s), {stats['sources']} source(s)")
+        for source, count in stats["by_source"].items():
+            print(f"  {count:>7}  {source}")
+    else:
+        print(f"\n📊 {stats['source']} : {stats['total']} objet(s)")
+        for page, count in stats["by_page"].items():
+            print(f"  page {page:>4} : {count}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Maintenance de la collection de documents.")
+    parser.add_argument("--json", action="store_true", help="Sortie JSON")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    stats_parser = commands.add_parser("stats", help="Nombre d'objets par source (ou par page)")
+    stats_parser.add_argument("--source", help="Détail par page pour cette source")
+
+    sample_parser = commands.add_parser("sample", help="Aperçu de quelques objets")
+    sample_parser.add_argument("-n", type=int, default=5)
+
+    export_parser = commands.add_parser("export", help="Sauvegarde de la collection")
+    export_parser.add_argument("directory")
+
+    import_parser = commands.add_parser("import", help="Restauration d'une sauvegarde")
+    import_parser.add_argument("directory")
+    import_parser.add_argument("--replace", action="store_true",
+                               help="Supprime d'abord les objets des sources sauvegardées")
+
+    duplicates_parser = commands.add_parser("duplicates", help="Recherche des chunks en double")
+    duplicates_parser.add_argument("--near", type=float, metavar="SEUIL",
+                                   help="Inclut les quasi-doublons (similarité cosinus ≥ SEUIL)")
+    duplicates_parser.add_argument("--limit", type=int, default=20)
+
+    args = parser.parse_args(argv)
+    backend = get_vector_backend()
+    try:
+        if args.command == "stats":
+            result = collection_stats(backend, args.source)
+            if not args.json:
+                _print_stats(result)
+                return 0
+        elif args.command == "sample":
+            result = backend.sample(limit=args.n)
+            if not args.json:
+                for i, properties in enumerate(result, 1):
+                    print(f"\nObjet {i}:")
+                    print(f"Content: {properties.get('content', '')[:200]}...")
+                    print(f"Source: {properties.get('source', 'Non spécifié')}")
+                    print("-" * 80)
+                return 0
+        elif args.command == "export":
+            result = export_collection(backend, args.directory)
+        elif args.command == "import":
+            result = import_collection(backend, args.directory, replace=args.replace)
+        else:
+            result = find_duplicates(backend, args.near, args.limit)
+        print(json.dumps(result, indent=2, ensure_ascii=False, default=str))
+        return 0
+    except Exception as e:
+        print(f"Erreur : {str(e)}", file=sys.stderr)
+        return 1
+    finally:
+        backend.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
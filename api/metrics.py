@@ -0,0 +1,204 @@
+"""Mesures de latence par étape et export au format Prometheus.
+
+Un petit registre en mémoire (compteurs et histogrammes avec labels)
+suffit ici et évite une dépendance supplémentaire : `render()` produit le
+format texte attendu par Prometheus sur `/metrics`.
+
+Les étapes sont mesurées avec `span()` :
+
+    with span("query", "retrieve", timings):
+        ...
+
+ce qui alimente l'histogramme `qwanza_stage_duration_seconds`, la durée
+`timings["retrieve_ms"]` et, si une trace est ouverte avec `trace()`, la
+liste détaillée des étapes renvoyée en mode debug.
+"""
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {value:g}" for key, value in items
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # clé de labels -> [compteurs par bucket, somme, nombre]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, (list(s[0]), s[1], s[2])) for key, s in self._series.items())
+        lines = self.header()
+        for key, (counts, total, count) in items:
+            for bound, bucket_count in zip(self.buckets, counts):
+                labels = _format_labels(self.labelnames, key, f'le="{bound:g}"')
+                lines.append(f"{self.name}_bucket{labels} {bucket_count}")
+            inf_labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{inf_labels} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total:g}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "qwanza_stage_duration_seconds",
+    "Durée de chaque étape des pipelines de requête et d'indexation.",
+    ["pipeline", "stage"],
+))
+QUERIES = REGISTRY.register(Counter(
+    "qwanza_queries_total", "Questions traitées, par route et niveau de cache.", ["model", "route", "cached"],
+))
+QUERY_ERRORS = REGISTRY.register(Counter(
+    "qwanza_query_errors_total", "Questions en erreur.", ["model"],
+))
+TOKENS = REGISTRY.register(Counter(
+    "qwanza_tokens_total", "Tokens envoyés (prompt) et générés (completion), estimés.", ["model", "kind"],
+))
+TIME_TO_FIRST_TOKEN = REGISTRY.register(Histogram(
+    "qwanza_time_to_first_token_seconds", "Temps jusqu'au premier token généré.", ["model"],
+))
+INDEXED_CHUNKS = REGISTRY.register(Counter(
+    "qwanza_indexed_chunks_total", "Chunks ajoutés ou supprimés de la base vectorielle.", ["operation"],
+))
+OCR_IMAGES = REGISTRY.register(Counter(
+    "qwanza_ocr_images_total", "Images rencontrées par l'OCR PowerPoint, par issue.", ["outcome"],
+))
+PDF_PAGES = REGISTRY.register(Counter(
+    "qwanza_pdf_pages_total", "Pages PDF extraites, par méthode (text, ocr, empty, error).", ["method"],
+))
+HTTP_SECONDS = REGISTRY.register(Histogram(
+    "qwanza_http_request_duration_seconds", "Durée des requêtes HTTP.", ["method", "path", "status"],
+))
+
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar("qwanza_trace", default=None)
+
+
+@contextmanager
+def trace():
+    """Ouvre une trace : les `span()` exécutés dans ce contexte y sont listés."""
+    spans = []
+    token = _current_trace.set((time.perf_counter(), spans))
+    try:
+        yield spans
+    finally:
+        _current_trace.reset(token)
+
+
+def observe_stage(pipeline: str, stage: str, seconds: float, timings: Optional[dict] = None,
+                  started_at: Optional[float] = None) -> None:
+    """Enregistre une durée déjà mesurée (histogramme, `timings` et trace courante)."""
+    STAGE_SECONDS.observe(seconds, pipeline=pipeline, stage=stage)
+    if timings is not None:
+        timings[f"{stage}_ms"] = round(seconds * 1000, 1)
+    current = _current_trace.get()
+    if current is not None:
+        origin, spans = current
+        start = started_at if started_at is not None else time.perf_counter() - seconds
+        spans.append({
+            "pipeline": pipeline,
+            "stage": stage,
+            "start_ms": round((start - origin) * 1000, 1),
+            "ms": round(seconds * 1000, 1),
+        })
+
+
+@contextmanager
+def span(pipeline: str, stage: str, timings: Optional[dict] = None):
+    """Mesure la durée d'une étape (voir `observe_stage`)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(pipeline, stage, time.perf_counter() - start, timings, started_at=start)
+
+
+def render() -> str:
+    """Toutes les mesures au format texte Prometheus."""
+    return REGISTRY.render()
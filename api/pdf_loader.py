@@ -0,0 +1,265 @@
+"""Extraction des PDF page par page, en parallèle, avec OCR de repli.
+
+`UnstructuredPDFLoader` analysait tout le document dans un seul processus
+avant de rendre la main. Ici, les pages sont réparties par petits lots
+sur un pool de processus :
+
+- la couche texte est lue avec pypdfium2 (ou pypdf s'il est absent) ;
+- seules les pages sans texte (moins de `PDF_OCR_MIN_CHARS` caractères,
+  typiquement des scans) sont rendues en image et passées à Tesseract ;
+- `lazy_load()` produit les pages dans l'ordre dès que leur lot est
+  terminé, pour que le découpage commence sans attendre la fin du document.
+
+Un fichier reçu par l'API (`SpooledUpload`) est lu directement dans son
+tampon. Seule l'extraction en parallèle d'un gros fichier reçu le recopie
+dans un fichier temporaire : le tampon n'a pas de chemin que les
+processus du pool puissent ouvrir, et au-delà de `PDF_INLINE_MAX_BYTES`
+l'envoyer à chaque tâche coûterait plus cher que la copie.
+
+Chaque page devient un Document portant son numéro (à partir de 1) dans
+`page`, la clé lue par `chunk_documents()`.
+"""
+import io
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import BinaryIO, Callable, Iterator, List, Optional, Tuple, Union
+
+from langchain_core.documents import Document
+
+from config import (
+    PDF_WORKERS,
+    PDF_PAGES_PER_TASK,
+    PDF_INLINE_MAX_BYTES,
+    PDF_OCR_ENABLED,
+    PDF_OCR_MIN_CHARS,
+    PDF_OCR_DPI,
+    PDF_OCR_LANG,
+)
+from metrics import observe_stage, PDF_PAGES
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+# Chemin, contenu, ou fichier ouvert (extraction dans le processus courant uniquement)
+PdfSource = Union[str, bytes, BinaryIO]
+
+
+def _get_pool(max_workers: int) -> ProcessPoolExecutor:
+    """
+    Pool de processus d'extraction réutilisé d'un document à l'autre.
+
+    Les processus sont lancés en "spawn" : un fork depuis l'API, qui a des
+    threads (serveur, pipeline d'indexation, clients HTTP), peut hériter
+    d'un verrou tenu et bloquer l'enfant.
+    """
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != max_workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(max_workers=max_workers,
+                                        mp_context=multiprocessing.get_context("spawn"))
+            _pool_workers = max_workers
+        return _pool
+
+
+def _ocr(render: Callable[[], list], lang: str, page_number: int) -> str:
+    """OCR Tesseract des images d'une page (produites par `render`) ; chaîne vide en cas d'échec."""
+    try:
+        import pytesseract
+
+        texts = (pytesseract.image_to_string(image, lang=lang).strip() for image in render())
+        return "\n".join(text for text in texts if text)
+    except Exception as e:
+        print(f"Note: Impossible de faire l'OCR de la page {page_number}: {str(e)}")
+        return ""
+
+
+def _extract_with_pdfium(source: PdfSource, first: int, last: int, ocr: bool, min_chars: int,
+                         dpi: int, lang: str) -> List[Tuple[int, str, str]]:
+    import pypdfium2 as pdfium
+
+    results = []
+    pdf = pdfium.PdfDocument(source)
+    try:
+        for index in range(first, last):
+            page = pdf[index]
+            try:
+                textpage = page.get_textpage()
+                text = textpage.get_text_range().replace("\r\n", "\n").strip()
+                textpage.close()
+                method = "text" if text else "empty"
+                if ocr and len(text) < min_chars:
+                    # Page scannée : rendu puis OCR
+                    ocr_text = _ocr(lambda: [page.render(scale=dpi / 72).to_pil()], lang, index + 1)
+                    if len(ocr_text) > len(text):
+                        text, method = ocr_text, "ocr"
+            except Exception as e:
+                print(f"Note: Impossible d'extraire la page {index + 1}: {str(e)}")
+                text, method = "", "error"
+            finally:
+                page.close()
+            results.append((index + 1, text, method))
+    finally:
+        pdf.close()
+    return results
+
+
+def _extract_with_pypdf(source: PdfSource, first: int, last: int, ocr: bool, min_chars: int,
+                        lang: str) -> List[Tuple[int, str, str]]:
+    from pypdf import PdfReader
+    from PIL import Image
+
+    results = []
+    reader = PdfReader(io.BytesIO(source) if isinstance(source, bytes) else source)
+    for index in range(first, last):
+        try:
+            page = reader.pages[index]
+            text = (page.extract_text() or "").strip()
+            method = "text" if text else "empty"
+            if ocr and len(text) < min_chars:
+                # Sans moteur de rendu, on lit les images de la page (un scan en contient une)
+                ocr_text = _ocr(lambda: [Image.open(io.BytesIO(image.data)) for image in page.images],
+                                lang, index + 1)
+                if len(ocr_text) > len(text):
+                    text, method = ocr_text, "ocr"
+        except Exception as e:
+            print(f"Note: Impossible d'extraire la page {index + 1}: {str(e)}")
+            text, method = "", "error"
+        results.append((index + 1, text, method))
+    return results
+
+
+def _extract_pages(source: PdfSource, first: int, last: int, ocr: bool = PDF_OCR_ENABLED,
+                   min_chars: int = PDF_OCR_MIN_CHARS, dpi: int = PDF_OCR_DPI,
+                   lang: str = PDF_OCR_LANG) -> List[Tuple[int, str, str]]:
+    """
+    Extrait les pages [first, last) (exécuté dans un processus du pool).
+
+    Returns:
+        list: (numéro de page à partir de 1, texte, méthode "text" | "ocr" | "empty" | "error").
+    """
+    try:
+        import pypdfium2  # noqa: F401
+    except ImportError:
+        return _extract_with_pypdf(source, first, last, ocr, min_chars, lang)
+    return _extract_with_pdfium(source, first, last, ocr, min_chars, dpi, lang)
+
+
+def count_pages(source: PdfSource) -> int:
+    try:
+        import pypdfium2 as pdfium
+    except ImportError:
+        from pypdf import PdfReader
+
+        return len(PdfReader(io.BytesIO(source) if isinstance(source, bytes) else source).pages)
+    pdf = pdfium.PdfDocument(source)
+    try:
+        return len(pdf)
+    finally:
+        pdf.close()
+
+
+class PDFLoader:
+    def __init__(self, file_path: str, file=None, workers: Optional[int] = None,
+                 pages_per_task: int = PDF_PAGES_PER_TASK, ocr: bool = PDF_OCR_ENABLED):
+        """
+        Initialise le loader avec le chemin du fichier PDF.
+
+        Args:
+            file_path (str): Chemin du fichier PDF (ou, avec `file`, son nom).
+            file (file-like, optional): Contenu déjà en mémoire ou en tampon,
+                lu à la place de `file_path`.
+            workers (int, optional): Nombre de processus d'extraction ; 1 pour
+                une extraction séquentielle dans le processus courant (défaut : PDF_WORKERS).
+            pages_per_task (int): Pages extraites par tâche envoyée au pool.
+            ocr (bool): OCR Tesseract des pages sans couche texte.
+        """
+        self.file_path = file_path
+        self.file = file
+        self.workers = PDF_WORKERS if workers is None else workers
+        self.pages_per_task = max(1, pages_per_task)
+        self.ocr = ocr
+        self.page_count = None
+        self.stats = {"text": 0, "ocr": 0, "empty": 0, "error": 0}
+
+    def _tasks(self, page_count: int) -> List[Tuple[int, int]]:
+        # Lots assez petits pour occuper tous les processus, même sur un document court
+        size = min(self.pages_per_task, max(1, -(-page_count // max(1, self.workers))))
+        return [(first, min(first + size, page_count)) for first in range(0, page_count, size)]
+
+    def _pages(self) -> Iterator[Tuple[int, str, str]]:
+        local = self.file if self.file is not None else self.file_path
+        self.page_count = count_pages(local)
+        tasks = self._tasks(self.page_count)
+        if self.workers > 1 and len(tasks) > 1:
+            source, temp_dir = self._shared_source()
+            pool = _get_pool(self.workers)
+            futures = [pool.submit(_extract_pages, source, first, last, self.ocr) for first, last in tasks]
+            try:
+                # Ordre des pages conservé ; chaque lot est rendu dès qu'il est prêt
+                for future in futures:
+                    yield from future.result()
+            finally:
+                for future in futures:
+                    future.cancel()
+                if temp_dir is not None:
+                    temp_dir.cleanup()
+        else:
+            for first, last in tasks:
+                yield from _extract_pages(local, first, last, self.ocr)
+
+    def lazy_load(self) -> Iterator[Document]:
+        """Produit un Document par page non vide, dans l'ordre, au fil de l'extraction."""
+        start = time.perf_counter()
+        try:
+            for page_number, text, method in self._pages():
+                self.stats[method] += 1
+                PDF_PAGES.inc(method=method)
+                if not text:
+                    continue
+                yield Document(
+                    page_content=text,
+                    metadata={
+                        "source": os.path.basename(self.file_path),
+                        "page": page_number,
+                        "page_number": page_number,
+                        "total_pages": self.page_count,
+                        "extraction": method,
+                        "type": "pdf",
+                    }
+                )
+        finally:
+            if self.file is not None:
+                self.file.seek(0)
+            # Durée de l'extraction, découpage des pages déjà reçues compris en mode flux
+            elapsed = time.perf_counter() - start
+            observe_stage("index", "extract", elapsed)
+            print(f"📄 {self.page_count or 0} page(s) en {elapsed:.2f}s : {self.stats['text']} texte, "
+                  f"{self.stats['ocr']} OCR, {self.stats['empty']} vide(s), {self.stats['error']} en erreur")
+
+    def load(self) -> List[Document]:
+        return list(self.lazy_load())
+
+    def _shared_source(self) -> Tuple[PdfSource, Optional[tempfile.TemporaryDirectory]]:
+        """Chemin ou octets du PDF à transmettre aux processus d'extraction."""
+        if self.file is None:
+            return self.file_path, None
+        size = self.file.seek(0, os.SEEK_END)
+        self.file.seek(0)
+        if size <= PDF_INLINE_MAX_BYTES:
+            data = self.file.read()
+            self.file.seek(0)
+            return data, None
+        temp_dir = tempfile.TemporaryDirectory(prefix="qwanza_pdf_")
+        path = os.path.join(temp_dir.name, "document.pdf")
+        with open(path, "wb") as out:
+            shutil.copyfileobj(self.file, out)
+        self.file.seek(0)
+        return path, temp_dir
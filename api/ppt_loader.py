@@ -1,17 +1,77 @@
-from typing import List
+from typing import List, Optional
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import multiprocessing
 import os
+import threading
 from pptx import Presentation
 from PIL import Image
 import pytesseract
 import io
 from langchain_core.documents import Document
 import pandas as pd
+from config import PPT_OCR_WORKERS, PPT_OCR_MIN_PIXELS, PPT_OCR_CACHE_SIZE
+from metrics import span, OCR_IMAGES
+
+# Cache OCR partagé par le processus : hash du blob image -> texte extrait
+_ocr_cache = OrderedDict()
+_ocr_cache_lock = threading.Lock()
+_ocr_pool = None
+_ocr_pool_workers = 0
+_ocr_pool_lock = threading.Lock()
+
+
+def _ocr_image_blob(blob: bytes) -> Optional[str]:
+    """Extrait le texte d'une image (exécuté dans un processus du pool OCR), None en cas d'échec."""
+    try:
+        img = Image.open(io.BytesIO(blob))
+        return pytesseract.image_to_string(img, lang='fra').strip()
+    except Exception as e:
+        print(f"Note: Impossible d'extraire le texte de l'image: {str(e)}")
+        return None
+
+
+def _get_ocr_pool(max_workers: int) -> ProcessPoolExecutor:
+    """Pool de processus OCR réutilisé d'un chargement à l'autre (lancé en "spawn", voir pdf_loader)."""
+    global _ocr_pool, _ocr_pool_workers
+    with _ocr_pool_lock:
+        if _ocr_pool is None or _ocr_pool_workers != max_workers:
+            if _ocr_pool is not None:
+                _ocr_pool.shutdown(wait=False)
+            _ocr_pool = ProcessPoolExecutor(max_workers=max_workers,
+                                            mp_context=multiprocessing.get_context("spawn"))
+            _ocr_pool_workers = max_workers
+        return _ocr_pool
+
+
+class _PendingImage:
+    """Emplacement d'une image dans le contenu d'une slide, remplacé après l'OCR."""
+
+    def __init__(self, digest: str):
+        self.digest = digest
+
 
 class PowerPointLoader:
-    def __init__(self, file_path: str):
-        """Initialise le loader avec le chemin du fichier PowerPoint."""
+    def __init__(self, file_path: str, ocr_workers: Optional[int] = None,
+                 min_image_pixels: Optional[int] = None, file=None):
+        """
+        Initialise le loader avec le chemin du fichier PowerPoint.
+
+        Args:
+            file_path (str): Chemin du fichier PowerPoint (ou, avec `file`, son nom).
+            ocr_workers (int, optional): Nombre de processus OCR ; 1 pour un OCR
+                séquentiel dans le processus courant (défaut : PPT_OCR_WORKERS).
+            min_image_pixels (int, optional): Surface minimale (en pixels) d'une
+                image pour qu'elle passe à l'OCR (défaut : PPT_OCR_MIN_PIXELS).
+            file (file-like, optional): Contenu déjà en mémoire ou en tampon,
+                lu à la place de `file_path`.
+        """
         self.file_path = file_path
-        self.presentation = Presentation(file_path)
+        self.presentation = Presentation(file if file is not None else file_path)
+        self.ocr_workers = PPT_OCR_WORKERS if ocr_workers is None else ocr_workers
+        self.min_image_pixels = PPT_OCR_MIN_PIXELS if min_image_pixels is None else min_image_pixels
+        self.ocr_stats = {"images": 0, "skipped_small": 0, "cache_hits": 0, "ocr_runs": 0}
 
     def _extract_table_content(self, shape) -> str:
         """Extrait le contenu d'un tableau."""
@@ -36,29 +96,30 @@ class PowerPointLoader:
             print(f"Note: Impossible d'extraire le tableau: {str(e)}")
             return ""
 
-    def _extract_image_text(self, shape) -> str:
-        """Extrait le texte d'une image en utilisant OCR."""
+    def _extract_image(self, shape) -> Optional[_PendingImage]:
+        """Repère une image à passer à l'OCR (les images trop petites sont ignorées)."""
         try:
             if not hasattr(shape, "image"):
-                return ""
-                
-            image_stream = io.BytesIO()
+                return None
+
             image = shape.image
-            image.save(image_stream)
-            image_stream.seek(0)
-            
-            # Ouvrir l'image avec Pillow
-            img = Image.open(image_stream)
-            
-            # Extraire le texte avec Tesseract
-            text = pytesseract.image_to_string(img, lang='fra')
-            return f"Texte extrait de l'image:\n{text.strip()}" if text.strip() else ""
+            width, height = image.size
+            self.ocr_stats["images"] += 1
+            if width * height < self.min_image_pixels:
+                # Logos, puces et images décoratives : pas de texte utile
+                self.ocr_stats["skipped_small"] += 1
+                return None
+
+            blob = image.blob
+            pending = _PendingImage(hashlib.sha256(blob).hexdigest())
+            self._image_blobs.setdefault(pending.digest, blob)
+            return pending
         except Exception as e:
             print(f"Note: Impossible d'extraire le texte de l'image: {str(e)}")
-            return ""
+            return None
 
-    def _process_shape(self, shape) -> str:
-        """Traite un shape et retourne son contenu."""
+    def _process_shape(self, shape) -> list:
+        """Traite un shape et retourne ses contenus (texte ou image en attente d'OCR)."""
         content = []
         
         # Extraire le texte si disponible
@@ -70,16 +131,70 @@ class PowerPointLoader:
         if table_content:
             content.append(table_content)
             
-        # Extraire le texte de l'image si disponible
-        image_content = self._extract_image_text(shape)
+        # Repérer l'image à passer à l'OCR si disponible
+        image_content = self._extract_image(shape)
         if image_content:
             content.append(image_content)
             
-        return "\n".join(content)
+        return content
+
+    def _run_ocr(self) -> dict:
+        """OCR des images uniques de la présentation, en parallèle et via le cache."""
+        results = {}
+        to_process = []
+        with _ocr_cache_lock:
+            for digest in self._image_blobs:
+                if digest in _ocr_cache:
+                    _ocr_cache.move_to_end(digest)
+                    results[digest] = _ocr_cache[digest]
+                    self.ocr_stats["cache_hits"] += 1
+                else:
+                    to_process.append(digest)
+
+        blobs = [self._image_blobs[digest] for digest in to_process]
+        if self.ocr_workers > 1 and len(blobs) > 1:
+            texts = list(_get_ocr_pool(self.ocr_workers).map(_ocr_image_blob, blobs))
+        else:
+            texts = [_ocr_image_blob(blob) for blob in blobs]
+        self.ocr_stats["ocr_runs"] += len(blobs)
+
+        with _ocr_cache_lock:
+            for digest, text in zip(to_process, texts):
+                results[digest] = text or ""
+                if text is None:
+                    continue  # échec : on retentera au prochain chargement
+                _ocr_cache[digest] = text
+                while len(_ocr_cache) > PPT_OCR_CACHE_SIZE:
+                    _ocr_cache.popitem(last=False)
+        return results
+
+    def _render_contents(self, contents: list, ocr_results: dict) -> List[str]:
+        rendered = []
+        for content in contents:
+            parts = []
+            for part in content:
+                if isinstance(part, _PendingImage):
+                    text = ocr_results.get(part.digest, "")
+                    if text:
+                        parts.append(f"Texte extrait de l'image:\n{text}")
+                else:
+                    parts.append(part)
+            if parts:
+                rendered.append("\n".join(parts))
+        return rendered
 
     def load(self) -> List[Document]:
-        """Charge la présentation et retourne une liste de Documents."""
-        documents = []
+        """
+        Charge la présentation et retourne une liste de Documents.
+
+        Seul l'OCR est parallélisé. Le parcours des slides et des shapes reste
+        séquentiel : python-pptx est du Python pur (le GIL empêche un gain en
+        threads) et la présentation ne se partage pas entre processus sans
+        la relire dans chacun. Ce parcours coûte environ 2 ms par slide,
+        contre environ une seconde par image pour Tesseract.
+        """
+        self._image_blobs = {}
+        slides = []
         
         for slide_number, slide in enumerate(self.presentation.slides, 1):
             # Extraire le titre de la slide
@@ -99,11 +214,26 @@ class PowerPointLoader:
                 if content:
                     contents.append(content)
 
+            slides.append((slide_number, title, contents))
+
+        # OCR de toutes les images de la présentation en une seule passe
+        with span("index", "ocr"):
+            ocr_results = self._run_ocr()
+        OCR_IMAGES.inc(self.ocr_stats["ocr_runs"], outcome="ocr")
+        OCR_IMAGES.inc(self.ocr_stats["cache_hits"], outcome="cache_hit")
+        OCR_IMAGES.inc(self.ocr_stats["skipped_small"], outcome="skipped_small")
+        if self.ocr_stats["images"]:
+            print(f"🖼️ {self.ocr_stats['images']} image(s) : {self.ocr_stats['ocr_runs']} OCR, "
+                  f"{self.ocr_stats['cache_hits']} en cache, "
+                  f"{self.ocr_stats['skipped_small']} ignorée(s) car trop petite(s)")
+
+        documents = []
+        for slide_number, title, contents in slides:
             # Construire le contenu structuré
             content_parts = [
                 f"Numéro de slide: {slide_number}",
                 f"Titre: {title}" if title else "Titre: Non défini",
-                *contents
+                *self._render_contents(contents, ocr_results)
             ]
 
             # Créer le document avec les métadonnées
@@ -118,4 +248,4 @@ class PowerPointLoader:
             )
             documents.append(doc)
 
-        return documents 
\ No newline at end of file
+        return documents
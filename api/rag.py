@@ -1,55 +1,48 @@
-from langchain_community.vectorstores import FAISS
-from langchain_ollama import OllamaLLM
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain.prompts import PromptTemplate
-from langchain_core.runnables import RunnablePassthrough
+from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from langchain_weaviate import WeaviateVectorStore
-
-# Recharger l’index FAISS depuis le disque
-embeddings = HuggingFaceEmbeddings(
-    model_name="sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2",
-    model_kwargs={"device": "cpu"},
-    encode_kwargs={"normalize_embeddings": True}
+from embeddings_service import get_embeddings
+from llm_registry import get_llm
+from answer_cache import answer_cache
+from langchain_core.documents import Document
+from vector_store import get_vector_backend
+from reranker import get_reranker
+from context_builder import build_context, estimate_tokens
+from metrics import span, observe_stage, QUERIES, QUERY_ERRORS, TOKENS, TIME_TO_FIRST_TOKEN
+from admission import get_limiter
+from lexical_index import get_lexical_index, rebuild_from_backend, reciprocal_rank_fusion
+from config import (
+    ANSWER_CACHE_ENABLED,
+    RAG_TOP_K,
+    RAG_MIN_RELEVANCE,
+    RETRIEVAL_MODE,
+    RERANK_ENABLED,
+    RERANK_CANDIDATES,
+    HYBRID_FETCH_K,
+    HYBRID_RRF_K,
+    HYBRID_DENSE_WEIGHT,
+    HYBRID_SPARSE_WEIGHT,
 )
+from typing import AsyncIterator, List, Optional, Tuple
+import asyncio
+import threading
+import time
+import numpy as np
 
-import weaviate
-import weaviate.classes.config as wvcc
-# client = weaviate.Client("http://localhost:8080")  # Assurez-vous que Weaviate tourne
-print(weaviate.__version__)
-# ✅ CONNEXION WEAVIATE V4
-print("\n💾 Connexion à Weaviate...")
-client = weaviate.connect_to_local(skip_init_checks=True)
-
-# 2. Connecter le client à Weaviate
-client = weaviate.connect_to_local(
-    host="localhost",
-    port=8080,
-    skip_init_checks=True
-)
-
-# 3. Charger le vectorstore existant
-vectorstore = WeaviateVectorStore(
-    client=client,
-    index_name="qwanza_docs",
-    text_key="content",
-    embedding=embeddings,
-    attributes=["source", "page"]
-)
-# vectorstore = FAISS.load_local("faiss_index", embeddings, allow_dangerous_deserialization=True)
+# Le modèle d'embeddings (partagé avec l'indexation) et la base vectorielle
+# sont obtenus au premier usage via get_embeddings() / get_vector_backend() :
+# importer ce module ne charge aucun modèle et n'ouvre aucune connexion.
+_lexical_ready = False
 
 # Init LLM
 # llm = OllamaLLM(model="mistral")
-
-def get_llm(model_name: str = "llama3.2"):
-    return OllamaLLM(model=model_name)
-
-llm = OllamaLLM(model="llama3.2")
+# Les clients Ollama sont créés une fois par modèle (voir llm_registry)
 
 # Prompt
 template = """Réponds à la question suivante en te basant uniquement sur le contexte fourni. 
+Chaque extrait du contexte est précédé de sa référence [n] source, p. X.
 
-Context: {context}
+Context:
+{context}
 
 Question: {question}
 
@@ -59,41 +52,330 @@ Réponse:"""
 
 prompt = PromptTemplate(template=template, input_variables=["context", "question"])
 
-# Chaîne RAG
-retriever = vectorstore.as_retriever(search_kwargs={"k": 3})
+# Chaînes RAG compilées, par (modèle, route)
+_chains = {}
+_chains_lock = threading.Lock()
+
+
+def get_chain(model_name: str, route: str):
+    """Retourne la chaîne de génération d'un modèle, construite une seule fois."""
+    key = (model_name, route)
+    chain = _chains.get(key)
+    if chain is None:
+        with _chains_lock:
+            chain = _chains.get(key)
+            if chain is None:
+                llm = get_llm(model_name)
+                if route == "grounded":
+                    chain = prompt | llm | StrOutputParser()
+                else:
+                    chain = llm | StrOutputParser()
+                _chains[key] = chain
+    return chain
+
+def _lexical_index():
+    """Index BM25, reconstruit une fois depuis la base vectorielle s'il n'existe pas encore."""
+    global _lexical_ready
+    index = get_lexical_index()
+    if not _lexical_ready:
+        vector_backend = get_vector_backend()
+        if not index.exists() and vector_backend.count() > 0:
+            rebuild_from_backend(vector_backend)
+        _lexical_ready = True
+    return index
+
+
+def retrieve(question: str, k: int = RAG_TOP_K,
+             query_vector: Optional[List[float]] = None) -> List[Tuple[Document, float]]:
+    """
+    Recherche des k chunks les plus pertinents, avec leur similarité cosinus.
+
+    En mode "hybrid", les classements vectoriel et BM25 sont fusionnés par
+    Reciprocal Rank Fusion ; l'ordre suit la fusion, et le score retourné
+    reste la similarité cosinus (utilisée par le routage).
+    """
+    embeddings = get_embeddings()
+    vector_backend = get_vector_backend()
+    vector = query_vector if query_vector is not None else embeddings.embed_query(question)
+    if RETRIEVAL_MODE != "hybrid":
+        return vector_backend.search(vector, k)
+
+    dense = vector_backend.search(vector, max(k, HYBRID_FETCH_K))
+    sparse = _lexical_index().search(question, max(k, HYBRID_FETCH_K))
+    fused = reciprocal_rank_fusion(
+        [[doc for doc, _ in dense], [doc for doc, _ in sparse]],
+        [HYBRID_DENSE_WEIGHT, HYBRID_SPARSE_WEIGHT],
+        HYBRID_RRF_K
+    )[:k]
+
+    # Similarité cosinus des chunks trouvés uniquement par BM25 (vecteurs en cache)
+    similarities = {doc.metadata["id"]: score for doc, score in dense}
+    missing = [doc for doc, _ in fused if doc.metadata["id"] not in similarities]
+    if missing:
+        query = np.asarray(vector, dtype=np.float32)
+        for doc, doc_vector in zip(missing, embeddings.embed_documents([d.page_content for d in missing])):
+            doc_vector = np.asarray(doc_vector, dtype=np.float32)
+            similarities[doc.metadata["id"]] = float(
+                query @ doc_vector / ((np.linalg.norm(query) * np.linalg.norm(doc_vector)) or 1.0)
+            )
+    return [(doc, similarities[doc.metadata["id"]]) for doc, _ in fused]
+
+
+def route_question(scored_docs: List[Tuple[Document, float]]) -> str:
+    """
+    Décide, avant toute génération, si le contexte retrouvé est assez pertinent.
+
+    Returns:
+        str: "grounded" (réponse à partir du contexte) ou "ungrounded"
+            (réponse du LLM sans contexte).
+    """
+    if scored_docs and max(score for _, score in scored_docs) >= RAG_MIN_RELEVANCE:
+        return "grounded"
+    return "ungrounded"
+
+
+def _format_sources(scored_docs) -> list:
+    return [
+        {"source": doc.metadata.get("source", ""), "page": doc.metadata.get("page", 0),
+         "score": round(score, 4)}
+        for doc, score in scored_docs
+    ]
+
+
+def _elapsed_ms(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 1)
+
+
+def _prepare(question: str, query_vector: Optional[List[float]] = None,
+             timings: Optional[dict] = None):
+    """
+    Recherche (+ reranking) + routage.
+
+    Returns:
+        tuple: (route, chunks retenus, sources, vecteur de la question) ;
+            les durées de chaque étape sont ajoutées à `timings`.
+    """
+    timings = timings if timings is not None else {}
+    if query_vector is None:
+        with span("query", "embed", timings):
+            query_vector = get_embeddings().embed_query(question)
+
+    # Sur-échantillonnage des candidats quand le reranking est actif
+    k = max(RERANK_CANDIDATES, RAG_TOP_K) if RERANK_ENABLED else RAG_TOP_K
+    with span("query", "retrieve", timings):
+        scored_docs = retrieve(question, k=k, query_vector=query_vector)
+
+    if RERANK_ENABLED:
+        with span("query", "rerank", timings):
+            scored_docs, rerank_info = get_reranker().rerank(question, scored_docs, RAG_TOP_K)
+        timings["rerank"] = rerank_info
+
+    route = route_question(scored_docs)
+    docs = [doc for doc, _ in scored_docs] if route == "grounded" else []
+    return route, docs, _format_sources(scored_docs), query_vector
+
+
+def _generation_chain(route: str, model_name: str, docs: List[Document], question: str,
+                      timings: Optional[dict] = None):
+    """Chaîne de génération et son entrée : une seule génération, avec ou sans contexte."""
+    chain = get_chain(model_name, route)
+    if route == "grounded":
+        # Contexte dédoublonné, cité et borné au budget de tokens du modèle
+        with span("query", "context", timings):
+            context, info = build_context(docs, model_name)
+        if timings is not None:
+            timings["context_tokens"] = info["tokens"]
+            timings["context_chunks"] = info["chunks_used"]
+        TOKENS.inc(estimate_tokens(template) + info["tokens"] + estimate_tokens(question),
+                   model=model_name, kind="prompt")
+        return chain, {"context": context, "question": question}
+    TOKENS.inc(estimate_tokens(question), model=model_name, kind="prompt")
+    return chain, question
+
+
+def _cached_answer(question: str, model_name: str, timings: dict):
+    """Embedding de la question et recherche dans le cache : (réponse en cache ou None, vecteur)."""
+    if not ANSWER_CACHE_ENABLED:
+        return None, None
+    with span("query", "embed", timings):
+        query_vector = get_embeddings().embed_query(question)
+    with span("query", "cache_lookup", timings):
+        return answer_cache.get(question, model_name, query_vector), query_vector
+
+
+def _serve_cached(cached: dict, model_name: str, total_start: float, timings: dict) -> dict:
+    """Mesures d'une réponse servie depuis le cache ; retourne le résultat mis en cache."""
+    result = cached["result"]
+    observe_stage("query", "total", time.perf_counter() - total_start, timings)
+    QUERIES.inc(model=model_name, route=result["route"], cached=cached["tier"])
+    return result
+
+
+def _finish(question: str, model_name: str, route: str, sources: list, answer: str,
+            completion_tokens: int, query_vector, total_start: float, timings: dict) -> dict:
+    """Mesures et mise en cache d'une réponse générée ; retourne {"answer", "route", "sources"}."""
+    TOKENS.inc(completion_tokens, model=model_name, kind="completion")
+    result = {"answer": answer, "route": route, "sources": sources}
+    if ANSWER_CACHE_ENABLED:
+        answer_cache.put(question, model_name, result, query_vector)
+    observe_stage("query", "total", time.perf_counter() - total_start, timings)
+    QUERIES.inc(model=model_name, route=route, cached="none")
+    return result
+
+
+def answer_question(question: str, model_name: str = "llama3.2") -> dict:
+    """
+    Répond à une question et indique le chemin suivi.
+
+    Returns:
+        dict: {"answer", "route" ("grounded" | "ungrounded"), "sources", "cached",
+            "timings" (durée de chaque étape en ms)}
+    """
+    total_start = time.perf_counter()
+    timings = {}
+    try:
+        # 0. Réponse déjà en cache (question identique ou très proche)
+        cached, query_vector = _cached_answer(question, model_name, timings)
+        if cached is not None:
+            result = _serve_cached(cached, model_name, total_start, timings)
+            return {**result, "cached": cached["tier"], "timings": timings}
+
+        # 1. Recherche et routage avant la génération
+        route, docs, sources, query_vector = _prepare(question, query_vector, timings)
+
+        # 2. Une seule génération, avec ou sans contexte selon la route
+        chain, generation_input = _generation_chain(route, model_name, docs, question, timings)
+        with span("query", "generate", timings):
+            answer = chain.invoke(generation_input).strip()
+    except Exception:
+        QUERY_ERRORS.inc(model=model_name)
+        raise
+
+    result = _finish(question, model_name, route, sources, answer, estimate_tokens(answer),
+                     query_vector, total_start, timings)
+    return {**result, "cached": None, "timings": timings}
+
+
+async def aanswer_question(question: str, model_name: str = "llama3.2") -> dict:
+    """
+    Variante asynchrone de `answer_question()` pour les routes FastAPI.
+
+    L'embedding, la recherche (Weaviate / FAISS / BM25) et le reranking sont
+    exécutés dans le pool de threads pour ne pas bloquer la boucle
+    d'événements ; la génération passe par `ainvoke` derrière le limiteur
+    du modèle.
+
+    Raises:
+        OverloadedError: Si la file d'attente du modèle est pleine.
+    """
+    total_start = time.perf_counter()
+    timings = {}
+    try:
+        # 0. Réponse déjà en cache (question identique ou très proche)
+        cached, query_vector = await asyncio.to_thread(_cached_answer, question, model_name, timings)
+        if cached is not None:
+            result = _serve_cached(cached, model_name, total_start, timings)
+            return {**result, "cached": cached["tier"], "timings": timings}
+
+        # 1. Recherche et routage avant la génération
+        route, docs, sources, query_vector = await asyncio.to_thread(_prepare, question, query_vector, timings)
+
+        # 2. Une seule génération, bornée par le limiteur du modèle
+        chain, generation_input = _generation_chain(route, model_name, docs, question, timings)
+        async with get_limiter(model_name).slot():
+            with span("query", "generate", timings):
+                answer = (await chain.ainvoke(generation_input)).strip()
+    except Exception:
+        QUERY_ERRORS.inc(model=model_name)
+        raise
+
+    result = _finish(question, model_name, route, sources, answer, estimate_tokens(answer),
+                     query_vector, total_start, timings)
+    return {**result, "cached": None, "timings": timings}
 
-rag_chain = (
-    {"context": retriever, "question": RunnablePassthrough()}
-    | prompt 
-    | llm 
-    | StrOutputParser()
-)
 
 def query_documents(question: str, model_name: str = "llama3.2") -> str:
     try:
-        llm = get_llm(model_name)
-        rag_chain = (
-            {"context": retriever, "question": RunnablePassthrough()}
-            | prompt 
-            | llm 
-            | StrOutputParser()
-        )
-
-        # return rag_chain.invoke(question)
-    
-         # 1. RAG avec contexte
-        rag_response = rag_chain.invoke(question).strip()
-        
-        # 2. Vérifie si le modèle dit qu’il ne peut pas répondre
-        if "Je ne peux pas répondre à cette question avec les informations disponibles." in rag_response:
-            # Fallback vers LLM sans contexte
-            return llm.invoke(question).strip()
-        
-        return rag_response
-    
+        return answer_question(question, model_name)["answer"]
     except Exception as e:
         return f"Erreur lors de la génération : {str(e)}"
-    
+
+
+def _error_event(e: Exception, model_name: str) -> dict:
+    QUERY_ERRORS.inc(model=model_name)
+    return {"event": "error", "data": f"Erreur lors de la génération : {str(e)}"}
+
+
+async def astream_documents(question: str, model_name: str = "llama3.2") -> AsyncIterator[dict]:
+    """
+    Variante de `aanswer_question()` qui produit la réponse au fil de l'eau.
+
+    Yields:
+        dict: Événements `{"event": ..., "data": ...}` dans l'ordre :
+            "sources" (documents retrouvés et route choisie), "token"
+            (fragments de réponse), puis "done" (temps jusqu'au premier
+            token et durée totale) ou "error".
+
+    La place de génération est réservée avant l'événement "sources" : si
+    la file du modèle est pleine, `OverloadedError` est levée au premier
+    `__anext__()`, avant tout envoi, pour que l'API puisse répondre 503.
+    """
+    start = time.perf_counter()
+    ttft = None
+    timings = {}
+    try:
+        cached, query_vector = await asyncio.to_thread(_cached_answer, question, model_name, timings)
+    except Exception as e:
+        yield _error_event(e, model_name)
+        return
+    if cached is not None:
+        result = _serve_cached(cached, model_name, start, timings)
+        yield {"event": "sources", "data": {
+            "sources": result["sources"], "route": result["route"], "cached": cached["tier"]
+        }}
+        yield {"event": "token", "data": result["answer"]}
+        elapsed_ms = _elapsed_ms(start)
+        yield {"event": "done", "data": {"ttft_ms": elapsed_ms, "total_ms": elapsed_ms}}
+        return
+
+    # 1. Recherche et routage
+    try:
+        route, docs, sources, query_vector = await asyncio.to_thread(_prepare, question, query_vector, timings)
+        chain, generation_input = _generation_chain(route, model_name, docs, question, timings)
+    except Exception as e:
+        yield _error_event(e, model_name)
+        return
+
+    # OverloadedError n'est pas convertie en événement "error" : elle remonte à l'appelant
+    async with get_limiter(model_name).slot():
+        yield {"event": "sources", "data": {
+            "sources": sources, "route": route, "cached": None, "timings": timings
+        }}
+
+        # 2. Une seule génération, token par token
+        try:
+            parts = []
+            generate_start = time.perf_counter()
+            async for token in chain.astream(generation_input):
+                if ttft is None:
+                    ttft = time.perf_counter() - start
+                    TIME_TO_FIRST_TOKEN.observe(ttft, model=model_name)
+                parts.append(token)
+                yield {"event": "token", "data": token}
+            observe_stage("query", "generate", time.perf_counter() - generate_start, timings)
+        except Exception as e:
+            yield _error_event(e, model_name)
+            return
+
+    # Ollama envoie un fragment par token
+    _finish(question, model_name, route, sources, "".join(parts).strip(),
+            sum(1 for part in parts if part), query_vector, start, timings)
+    total_ms = _elapsed_ms(start)
+    yield {"event": "done", "data": {
+        "ttft_ms": round(ttft * 1000, 1) if ttft is not None else total_ms,
+        "total_ms": total_ms,
+    }}
+
 # if __name__ == "__main__":
 #     print("\nSystème RAG initialisé. Vous pouvez poser des questions sur les expertises du cabinet QWANZA, ses missions, ou ses domaines d'intervention.")
 #     print("Tapez 'quit' pour quitter.")
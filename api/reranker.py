@@ -0,0 +1,170 @@
+"""Reranking des candidats par un petit cross-encoder multilingue sur CPU.
+
+La recherche sur-échantillonne N candidats, le cross-encoder les rescore
+par lots et seuls les k meilleurs vont dans le prompt. Le nombre de
+candidats rescorés est plafonné par un budget de latence (estimé d'après
+le coût moyen observé par paire, chargement du modèle exclu), l'étape est sautée quand trop de
+rerankings tournent déjà en parallèle, et les scores sont mis en cache
+par couple (question, chunk).
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Tuple
+
+from langchain_core.documents import Document
+
+from config import (
+    RERANK_MODEL_NAME,
+    RERANK_DEVICE,
+    RERANK_BATCH_SIZE,
+    RERANK_BUDGET_MS,
+    RERANK_MAX_INFLIGHT,
+    RERANK_CACHE_SIZE,
+)
+from answer_cache import normalize_question
+
+# Quand le budget fait sauter l'étape, un appel sur N rescore quand même k
+# candidats pour remettre à jour le coût par paire (sinon il ne baisse jamais)
+_BUDGET_PROBE_EVERY = 20
+
+
+class Reranker:
+    def __init__(self, model_name: str = RERANK_MODEL_NAME, device: str = RERANK_DEVICE,
+                 batch_size: int = RERANK_BATCH_SIZE, budget_ms: float = RERANK_BUDGET_MS,
+                 max_inflight: int = RERANK_MAX_INFLIGHT, cache_size: int = RERANK_CACHE_SIZE):
+        self.model_name = model_name
+        self.device = device
+        self.batch_size = batch_size
+        self.budget_ms = budget_ms
+        self.max_inflight = max_inflight
+        self.cache_size = cache_size
+        self._model = None
+        self._lock = threading.Lock()
+        self._inflight = 0
+        self._cache = OrderedDict()        # (hash question, id chunk) -> score
+        self._ms_per_pair = None           # moyenne glissante du coût d'une paire
+        self._budget_skips = 0
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    from sentence_transformers import CrossEncoder
+
+                    start = time.perf_counter()
+                    self._model = CrossEncoder(self.model_name, device=self.device)
+                    print(f"✅ Cross-encoder {self.model_name} chargé en {time.perf_counter() - start:.2f}s")
+        return self._model
+
+    def _budget_candidates(self, n: int) -> int:
+        """Nombre de candidats rescorables dans le budget de latence."""
+        if self._ms_per_pair is None or not self.budget_ms:
+            return n
+        return max(0, min(n, int(self.budget_ms / self._ms_per_pair)))
+
+    def rerank(self, question: str, candidates: List[Tuple[Document, float]],
+               k: int) -> Tuple[List[Tuple[Document, float]], dict]:
+        """
+        Réordonne les candidats et garde les k meilleurs.
+
+        Args:
+            candidates: (document, similarité cosinus) dans l'ordre de la recherche.
+
+        Returns:
+            tuple: (k meilleurs candidats, infos {"reranked", "candidates", "scored",
+                "cache_hits", "skipped", "ms"})
+        """
+        start = time.perf_counter()
+        info = {"reranked": False, "candidates": len(candidates), "scored": 0,
+                "cache_hits": 0, "skipped": None, "ms": 0.0}
+        if len(candidates) <= 1:
+            info["skipped"] = "too_few_candidates"
+            return candidates[:k], info
+
+        with self._lock:
+            if self._inflight >= self.max_inflight:
+                info["skipped"] = "load"
+                return candidates[:k], info
+            self._inflight += 1
+
+        try:
+            n = self._budget_candidates(len(candidates))
+            probe = False
+            if n < k:
+                with self._lock:
+                    self._budget_skips += 1
+                    probe = self._budget_skips % _BUDGET_PROBE_EVERY == 0
+                if not probe:
+                    info["skipped"] = "budget"
+                    return candidates[:k], info
+                n = min(k, len(candidates))
+            pool = candidates[:n]
+
+            query_key = hashlib.sha1(normalize_question(question).encode("utf-8")).hexdigest()
+            scores = {}
+            to_score = []
+            with self._lock:
+                for doc, _ in pool:
+                    key = (query_key, doc.metadata.get("id") or doc.page_content)
+                    if key in self._cache:
+                        self._cache.move_to_end(key)
+                        scores[key] = self._cache[key]
+                    else:
+                        to_score.append((key, doc))
+            info["cache_hits"] = len(scores)
+
+            if to_score:
+                # Chargement hors mesure : il fausserait durablement le coût par paire
+                model = self.model
+                scored_start = time.perf_counter()
+                values = model.predict(
+                    [(question, doc.page_content) for _, doc in to_score],
+                    batch_size=self.batch_size,
+                    show_progress_bar=False
+                )
+                ms_per_pair = (time.perf_counter() - scored_start) * 1000 / len(to_score)
+                with self._lock:
+                    # Une mesure de contrôle remplace l'estimation qui bloquait l'étape
+                    self._ms_per_pair = (
+                        ms_per_pair if self._ms_per_pair is None or probe
+                        else 0.8 * self._ms_per_pair + 0.2 * ms_per_pair
+                    )
+                    for (key, _), value in zip(to_score, values):
+                        scores[key] = float(value)
+                        self._cache[key] = float(value)
+                    while len(self._cache) > self.cache_size:
+                        self._cache.popitem(last=False)
+            info["scored"] = len(to_score)
+
+            ranked = sorted(
+                pool,
+                key=lambda item: scores[(query_key, item[0].metadata.get("id") or item[0].page_content)],
+                reverse=True
+            )
+            info["reranked"] = True
+            return ranked[:k], info
+        finally:
+            with self._lock:
+                self._inflight -= 1
+            info["ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+
+    def warm_up(self) -> None:
+        """Charge le modèle et fait une première prédiction (préchargement de l'API)."""
+        self.model.predict([("préchargement", "préchargement")], show_progress_bar=False)
+
+
+_reranker = None
+_reranker_lock = threading.Lock()
+
+
+def get_reranker() -> Reranker:
+    global _reranker
+    if _reranker is None:
+        with _reranker_lock:
+            if _reranker is None:
+                _reranker = Reranker()
+    return _reranker
@@ -0,0 +1,201 @@
+"""Découpage sémantique avec des embeddings calculés par lots, au fil des pages.
+
+Remplace le `SemanticChunker` de langchain_experimental, qui était appelé
+sur chaque élément renvoyé par `UnstructuredPDFLoader` (mode="elements") :
+des centaines de petits appels d'embeddings et de calculs de percentile
+sur des fragments trop courts pour être découpés.
+
+Ici, les éléments sont d'abord regroupés par page, puis les phrases (avec
+leurs voisines, comme `buffer_size` dans langchain) sont encodées par lots
+de `CHUNK_EMBED_BATCH`, au fil des pages : avec un chargeur qui produit les
+pages à mesure de leur extraction (`PDFLoader.lazy_load()`), l'encodage
+avance pendant que le reste du document est extrait. Les distances cosinus
+entre phrases consécutives sont calculées en NumPy, et une coupure est
+faite là où la distance dépasse le percentile choisi, calculé sur
+l'ensemble du document. Les chunks ne franchissent jamais une frontière
+de page et respectent une taille minimale et maximale (en caractères).
+"""
+import re
+from typing import Iterable, Iterator, List
+
+import numpy as np
+from langchain_core.documents import Document
+
+from config import (
+    CHUNK_MIN_CHARS,
+    CHUNK_MAX_CHARS,
+    CHUNK_BREAKPOINT_PERCENTILE,
+    CHUNK_BUFFER_SIZE,
+    CHUNK_EMBED_BATCH,
+)
+
+# Même règle de découpage en phrases que le SemanticChunker, plus les sauts de paragraphe
+_SENTENCE_SPLIT = re.compile(r"(?<=[.?!])\s+|\n\s*\n")
+
+
+def split_sentences(text: str) -> List[str]:
+    return [sentence.strip() for sentence in _SENTENCE_SPLIT.split(text) if sentence and sentence.strip()]
+
+
+def iter_pages(documents: Iterable[Document]) -> Iterator[Document]:
+    """
+    Regroupe les éléments consécutifs d'une même source et d'une même page.
+
+    Les éléments Unstructured arrivent dans l'ordre des pages : chaque page
+    est rendue dès que l'élément suivant appartient à une autre page.
+    """
+    key, texts, metadata = None, [], None
+    for doc in documents:
+        page = doc.metadata.get("page_number", doc.metadata.get("page", 0))
+        doc_key = (doc.metadata.get("source", ""), page)
+        if doc_key != key:
+            if texts:
+                yield Document(page_content="\n".join(texts), metadata=metadata)
+            key, texts, metadata = doc_key, [], {**doc.metadata, "page": page}
+        if doc.page_content.strip():
+            texts.append(doc.page_content.strip())
+    if texts:
+        yield Document(page_content="\n".join(texts), metadata=metadata)
+
+
+def merge_elements(documents: Iterable[Document]) -> List[Document]:
+    """Regroupe les éléments Unstructured d'une même source et d'une même page."""
+    return list(iter_pages(documents))
+
+
+def _hard_split(sentence: str, max_chars: int) -> List[str]:
+    """Coupe une phrase trop longue aux espaces (ou brutalement à défaut)."""
+    parts, current = [], ""
+    for word in sentence.split(" "):
+        while len(word) > max_chars:
+            if current:
+                parts.append(current)
+                current = ""
+            parts.append(word[:max_chars])
+            word = word[max_chars:]
+        candidate = f"{current} {word}" if current else word
+        if len(candidate) > max_chars:
+            parts.append(current)
+            current = word
+        else:
+            current = candidate
+    if current:
+        parts.append(current)
+    return parts
+
+
+class FastSemanticChunker:
+    """
+    Découpeur sémantique compatible avec `split_documents()` de LangChain.
+
+    Args:
+        embeddings: Objet exposant `embed_documents(textes)`.
+        breakpoint_percentile: Percentile des distances au-delà duquel on coupe.
+        buffer_size: Nombre de phrases voisines ajoutées de chaque côté avant l'encodage.
+        min_chunk_chars: Taille minimale d'un chunk (les plus petits sont fusionnés).
+        max_chunk_chars: Taille maximale d'un chunk (les plus grands sont redécoupés).
+        embed_batch: Nombre minimal de phrases encodées par appel d'embeddings.
+    """
+
+    def __init__(self, embeddings, breakpoint_percentile: float = CHUNK_BREAKPOINT_PERCENTILE,
+                 buffer_size: int = CHUNK_BUFFER_SIZE, min_chunk_chars: int = CHUNK_MIN_CHARS,
+                 max_chunk_chars: int = CHUNK_MAX_CHARS, embed_batch: int = CHUNK_EMBED_BATCH):
+        self.embeddings = embeddings
+        self.breakpoint_percentile = breakpoint_percentile
+        self.buffer_size = buffer_size
+        self.min_chunk_chars = min_chunk_chars
+        self.max_chunk_chars = max_chunk_chars
+        self.embed_batch = embed_batch
+
+    def _windows(self, sentences: List[str]) -> List[str]:
+        """Chaque phrase entourée de ses voisines (comme `combine_sentences` de langchain)."""
+        size = self.buffer_size
+        return [" ".join(sentences[max(0, i - size):i + size + 1]) for i in range(len(sentences))]
+
+    def _distances(self, pages: List[List[str]]) -> List[np.ndarray]:
+        """Distances cosinus entre phrases consécutives de chaque page (un appel d'embeddings)."""
+        windows = [window for sentences in pages for window in self._windows(sentences)]
+        if not windows:
+            return [np.zeros(0) for _ in pages]
+
+        vectors = np.asarray(self.embeddings.embed_documents(windows), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.where(norms == 0, 1.0, norms)
+
+        distances, offset = [], 0
+        for sentences in pages:
+            page_vectors = vectors[offset:offset + len(sentences)]
+            offset += len(sentences)
+            distances.append(1.0 - np.einsum("ij,ij->i", page_vectors[:-1], page_vectors[1:]))
+        return distances
+
+    def _threshold(self, distances: List[np.ndarray]) -> float:
+        """Seuil de coupure : percentile des distances de tout le document."""
+        all_distances = np.concatenate(distances) if distances else np.zeros(0)
+        return float(np.percentile(all_distances, self.breakpoint_percentile)) if all_distances.size else 0.0
+
+    def _group(self, sentences: List[str], distances: np.ndarray, threshold: float) -> List[str]:
+        """Regroupe les phrases d'une page entre les coupures, dans les bornes de taille."""
+        breakpoints = set(np.flatnonzero(distances > threshold).tolist())
+        groups, current = [], []
+        for i, sentence in enumerate(sentences):
+            current.append(sentence)
+            if i in breakpoints:
+                groups.append(current)
+                current = []
+        if current:
+            groups.append(current)
+
+        # Taille maximale : redécoupage aux frontières de phrases
+        chunks = []
+        for group in groups:
+            text = ""
+            for sentence in group:
+                pieces = _hard_split(sentence, self.max_chunk_chars) if len(sentence) > self.max_chunk_chars else [sentence]
+                for piece in pieces:
+                    if text and len(text) + 1 + len(piece) > self.max_chunk_chars:
+                        chunks.append(text)
+                        text = piece
+                    else:
+                        text = f"{text} {piece}" if text else piece
+            if text:
+                chunks.append(text)
+
+        # Taille minimale : fusion avec le chunk précédent (ou suivant pour le premier)
+        merged = []
+        for chunk in chunks:
+            if merged and (len(merged[-1]) < self.min_chunk_chars or len(chunk) < self.min_chunk_chars) \
+                    and len(merged[-1]) + 1 + len(chunk) <= self.max_chunk_chars:
+                merged[-1] = f"{merged[-1]} {chunk}"
+            else:
+                merged.append(chunk)
+        return merged
+
+    def split_documents(self, documents: Iterable[Document]) -> List[Document]:
+        """
+        Découpe un document (liste ou flux de pages ou d'éléments) en chunks sémantiques.
+
+        Le flux est consommé au fur et à mesure : les phrases sont encodées
+        dès que `embed_batch` phrases sont disponibles.
+
+        Returns:
+            list: Chunks avec les métadonnées de leur page d'origine.
+        """
+        pages, sentences, distances = [], [], []
+        pending = 0
+        for page in iter_pages(documents):
+            pages.append(page)
+            sentences.append(split_sentences(page.page_content))
+            pending += len(sentences[-1])
+            if pending >= self.embed_batch:
+                distances.extend(self._distances(sentences[len(distances):]))
+                pending = 0
+        if len(distances) < len(pages):
+            distances.extend(self._distances(sentences[len(distances):]))
+        threshold = self._threshold(distances)
+
+        chunks = []
+        for page, page_sentences, page_distances in zip(pages, sentences, distances):
+            for text in self._group(page_sentences, page_distances, threshold):
+                chunks.append(Document(page_content=text, metadata=dict(page.metadata)))
+        return chunks
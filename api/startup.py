@@ -0,0 +1,149 @@
+"""Initialisation de l'API : préchargement optionnel et sondes de santé.
+
+Aucune ressource lourde n'est créée à l'import des modules : le modèle
+d'embeddings, la base vectorielle (connexion Weaviate ou index FAISS),
+l'index BM25, le cross-encoder et les clients Ollama sont initialisés au premier usage.
+`prewarm()` les charge à l'avance, en arrière-plan, au démarrage de l'API
+(`STARTUP_PREWARM` et `OLLAMA_WARMUP_MODELS`).
+
+Deux sondes distinctes :
+- liveness : le processus répond (ne touche à aucune dépendance) ;
+- readiness : la base vectorielle répond et le préchargement demandé est
+  terminé sans erreur ; un échec (Weaviate arrêté par exemple) rend l'API indisponible
+  sans l'empêcher de démarrer.
+"""
+import threading
+import time
+from typing import Dict, List, Optional
+
+from config import STARTUP_PREWARM, OLLAMA_WARMUP_MODELS, RERANK_ENABLED
+
+_lock = threading.Lock()
+_started_at = time.time()
+_prewarm = {"state": "disabled", "seconds": None, "components": {}}
+
+
+def _step(name: str, func) -> None:
+    start = time.perf_counter()
+    try:
+        func()
+        _prewarm["components"][name] = {"ready": True, "seconds": round(time.perf_counter() - start, 3)}
+    except Exception as e:
+        _prewarm["components"][name] = {"ready": False, "error": str(e)}
+        print(f"⚠️ Préchargement ({name}) impossible : {str(e)}")
+
+
+def _load_embeddings() -> None:
+    from embeddings_service import get_embeddings
+
+    get_embeddings().embed_query("préchargement")
+
+
+def _load_vector_backend() -> None:
+    from vector_store import get_vector_backend
+
+    if not get_vector_backend().is_ready():
+        raise RuntimeError("base vectorielle injoignable")
+
+
+def _load_lexical_index() -> None:
+    from rag import _lexical_index
+
+    _lexical_index()
+
+
+def _load_reranker() -> None:
+    from reranker import get_reranker
+
+    get_reranker().warm_up()
+
+
+def prewarm(resources: bool = STARTUP_PREWARM, models: Optional[List[str]] = None) -> dict:
+    """
+    Charge à l'avance les ressources du chemin des questions.
+
+    Args:
+        resources: Charge le modèle d'embeddings, la base vectorielle, l'index BM25
+            et, si `RERANK_ENABLED`, le cross-encoder.
+        models: Modèles Ollama à précharger (par défaut `OLLAMA_WARMUP_MODELS`).
+
+    Returns:
+        dict: État du préchargement (durée et résultat par composant).
+    """
+    models = OLLAMA_WARMUP_MODELS if models is None else models
+    with _lock:
+        _prewarm.update({"state": "running", "seconds": None, "components": {}})
+        start = time.perf_counter()
+        if resources:
+            _step("embeddings", _load_embeddings)
+            _step("vector_backend", _load_vector_backend)
+            _step("lexical_index", _load_lexical_index)
+            if RERANK_ENABLED:
+                _step("reranker", _load_reranker)
+        if models:
+            from llm_registry import warm_up
+
+            timings = warm_up(models)
+            for model_name, seconds in timings.items():
+                _prewarm["components"][f"ollama:{model_name}"] = {"ready": seconds is not None, "seconds": seconds}
+        _prewarm["seconds"] = round(time.perf_counter() - start, 3)
+        _prewarm["state"] = "done"
+    print(f"✅ Préchargement terminé en {_prewarm['seconds']:.2f}s")
+    return prewarm_status()
+
+
+def start_prewarm() -> Optional[threading.Thread]:
+    """Lance `prewarm()` en arrière-plan si un préchargement est configuré."""
+    if not (STARTUP_PREWARM or OLLAMA_WARMUP_MODELS):
+        return None
+    _prewarm["state"] = "pending"
+    thread = threading.Thread(target=prewarm, name="api-prewarm", daemon=True)
+    thread.start()
+    return thread
+
+
+def prewarm_status() -> dict:
+    return {**_prewarm, "components": dict(_prewarm["components"])}
+
+
+def liveness() -> dict:
+    return {"status": "alive", "uptime_s": round(time.time() - _started_at, 1)}
+
+
+def readiness() -> Dict[str, object]:
+    """
+    État de disponibilité de l'API.
+
+    Returns:
+        dict: {"ready", "vector_backend", "prewarm"} ; `ready` est faux tant
+            que la base vectorielle ne répond pas ou que le préchargement
+            demandé n'est pas terminé (ou a échoué).
+    """
+    from vector_store import get_vector_backend
+
+    try:
+        backend_ready = get_vector_backend().is_ready()
+    except Exception as e:
+        print(f"⚠️ Base vectorielle indisponible : {str(e)}")
+        backend_ready = False
+    prewarming = _prewarm["state"] in ("pending", "running")
+    # Un modèle Ollama non préchargé n'empêche pas de répondre (il sera chargé à la
+    # première question) ; une ressource de la recherche en échec rend l'API indisponible
+    failed = [name for name, component in _prewarm["components"].items()
+              if not component["ready"] and not name.startswith("ollama:")]
+    return {
+        "ready": backend_ready and not prewarming and not failed,
+        "vector_backend": backend_ready,
+        "prewarm": prewarm_status(),
+    }
+
+
+def shutdown() -> None:
+    """Ferme les connexions ouvertes (client Weaviate) et écrit les index locaux à l'arrêt de l'API."""
+    import lexical_index
+    import vector_store
+
+    if vector_store._backend is not None:
+        vector_store._backend.close()
+    if lexical_index._index is not None:
+        lexical_index._index.flush()
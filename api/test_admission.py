@@ -0,0 +1,86 @@
+"""Contrôle d'admission des générations : file d'attente bornée, rejet 503 avec Retry-After.
+
+    cd api && python -m pytest -q test_admission.py
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import admission
+from admission import ModelLimiter, OverloadedError
+
+
+async def _hold(limiter: ModelLimiter, started: asyncio.Event, release: asyncio.Event):
+    async with limiter.slot():
+        started.set()
+        await release.wait()
+
+
+def test_limiter_rejects_beyond_waiting_queue():
+    async def scenario():
+        limiter = ModelLimiter("mistral", concurrency=1, max_waiting=1, queue_timeout=5)
+        started, release = asyncio.Event(), asyncio.Event()
+        holder = asyncio.create_task(_hold(limiter, started, release))
+        await started.wait()
+        waiter = asyncio.create_task(_hold(limiter, asyncio.Event(), release))
+        await asyncio.sleep(0)
+        assert limiter.stats()["active"] == limiter.stats()["waiting"] == 1
+
+        with pytest.raises(OverloadedError) as excinfo:
+            async with limiter.slot():
+                pass
+        assert excinfo.value.model_name == "mistral"
+        assert excinfo.value.retry_after >= 1
+
+        release.set()
+        await asyncio.gather(holder, waiter)
+        return limiter.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["rejected"] == 1
+    assert stats["active"] == stats["waiting"] == 0
+    assert stats["avg_generation_s"] is not None
+
+
+def test_limiter_rejects_after_queue_timeout():
+    async def scenario():
+        limiter = ModelLimiter("mistral", concurrency=1, max_waiting=4, queue_timeout=0.05)
+        started, release = asyncio.Event(), asyncio.Event()
+        holder = asyncio.create_task(_hold(limiter, started, release))
+        await started.wait()
+        with pytest.raises(OverloadedError):
+            async with limiter.slot():
+                pass
+        assert limiter.waiting == 0
+        release.set()
+        await holder
+
+    asyncio.run(scenario())
+
+
+def test_retry_after_grows_with_queue():
+    limiter = ModelLimiter("mistral", concurrency=2, max_waiting=8)
+    limiter._avg_seconds = 3.0
+    assert limiter.retry_after() == 2
+    limiter.waiting = 5
+    assert limiter.retry_after() == 9
+
+
+def test_predict_returns_503_with_retry_after(client, fake_ollama, monkeypatch):
+    # Une seule génération à la fois, sans file d'attente, et des réponses lentes
+    monkeypatch.setitem(admission._limiters, "llama3.2",
+                        ModelLimiter("llama3.2", concurrency=1, max_waiting=0))
+    monkeypatch.setattr(fake_ollama, "token_ms", 150)
+
+    questions = ["Quel est le délai de traitement ?", "Qui contacter en cas d'incident ?"]
+    with ThreadPoolExecutor(len(questions)) as pool:
+        responses = list(pool.map(lambda text: client.post("/predict", json={"text": text}), questions))
+
+    statuses = sorted(response.status_code for response in responses)
+    assert statuses == [200, 503]
+    accepted, rejected = sorted(responses, key=lambda response: response.status_code)
+    assert accepted.json()["route"] in ("grounded", "ungrounded")
+    assert int(rejected.headers["Retry-After"]) >= 1
+    assert "saturé" in rejected.json()["detail"]
+    assert admission._limiters["llama3.2"].stats()["rejected"] == 1
@@ -0,0 +1,109 @@
+"""Cache des réponses : niveaux exact et sémantique, expiration, invalidation à chaque réindexation.
+
+    cd api && python -m pytest -q test_answer_cache.py
+"""
+import os
+import types
+
+import numpy as np
+import pytest
+
+import answer_cache
+from answer_cache import AnswerCache, normalize_question
+
+RESULT = {"answer": "Sous 48 heures.", "route": "grounded", "sources": []}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(answer_cache, "time", types.SimpleNamespace(time=lambda: now[0]))
+    return now
+
+
+@pytest.fixture
+def manifest(tmp_path, monkeypatch):
+    path = tmp_path / "manifest.json"
+    path.write_text("{}")
+    monkeypatch.setattr(answer_cache, "INDEX_MANIFEST_PATH", str(path))
+    return path
+
+
+def _cache(**kwargs):
+    options = {"max_entries": 8, "ttl": 60, "semantic_max_entries": 8,
+               "semantic_ttl": 30, "semantic_threshold": 0.95}
+    options.update(kwargs)
+    return AnswerCache(**options)
+
+
+def _vector(*values):
+    return np.asarray(values, dtype=np.float32).tolist()
+
+
+def test_normalize_question():
+    assert normalize_question("  Quel est le  DÉLAI ?! ") == "quel est le délai"
+
+
+def test_exact_tier(clock, manifest):
+    cache = _cache()
+    assert cache.get("Quel délai ?", "mistral") is None
+    cache.put("Quel délai ?", "mistral", RESULT)
+
+    assert cache.get("quel   délai", "mistral") == {"result": RESULT, "tier": "exact", "similarity": 1.0}
+    assert cache.get("Quel délai ?", "llama3") is None   # une entrée par modèle
+    assert cache.stats()["exact_hits"] == 1
+    assert cache.stats()["misses"] == 2
+
+
+def test_exact_tier_is_bounded(clock, manifest):
+    cache = _cache(max_entries=2)
+    for question in ("a", "b", "c"):
+        cache.put(question, "mistral", RESULT)
+    assert cache.get("a", "mistral") is None
+    assert cache.get("c", "mistral")["tier"] == "exact"
+
+
+def test_semantic_tier_threshold(clock, manifest):
+    cache = _cache()
+    cache.put("Quel est le délai de traitement ?", "mistral", RESULT, _vector(1.0, 0.0, 0.0))
+
+    close = cache.get("Combien de temps pour traiter ?", "mistral", _vector(0.99, 0.1, 0.0))
+    assert close["tier"] == "semantic"
+    assert close["result"] == RESULT
+    assert close["similarity"] == pytest.approx(0.995, abs=1e-3)
+
+    assert cache.get("Qui contacter ?", "mistral", _vector(0.6, 0.8, 0.0)) is None
+    assert cache.get("Combien de temps ?", "llama3", _vector(1.0, 0.0, 0.0)) is None
+
+
+def test_entries_expire(clock, manifest):
+    cache = _cache(ttl=60, semantic_ttl=30)
+    cache.put("Quel délai ?", "mistral", RESULT, _vector(1.0, 0.0))
+
+    clock[0] += 45
+    assert cache.get("Quel délai ?", "mistral")["tier"] == "exact"
+    assert cache.get("Autre formulation", "mistral", _vector(1.0, 0.0)) is None
+
+    clock[0] += 30
+    assert cache.get("Quel délai ?", "mistral") is None
+    assert cache.stats()["exact_entries"] == 0
+
+
+def test_reindexing_invalidates_both_tiers(clock, manifest):
+    cache = _cache()
+    cache.put("Quel délai ?", "mistral", RESULT, _vector(1.0, 0.0))
+    assert cache.get("Quel délai ?", "mistral") is not None
+
+    # Toute écriture du manifeste change la version de l'index
+    stat = os.stat(manifest)
+    os.utime(manifest, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert cache.get("Quel délai ?", "mistral") is None
+    assert cache.get("Autre formulation", "mistral", _vector(1.0, 0.0)) is None
+
+
+def test_invalidate(clock, manifest):
+    cache = _cache()
+    cache.put("Quel délai ?", "mistral", RESULT, _vector(1.0, 0.0))
+    cache.invalidate()
+    assert cache.get("Quel délai ?", "mistral", _vector(1.0, 0.0)) is None
+    assert cache.stats()["exact_entries"] == cache.stats()["semantic_entries"] == 0
@@ -0,0 +1,76 @@
+"""Assemblage du contexte : doublons, fusion des chunks d'une même page, budget de tokens.
+
+    cd api && python -m pytest -q test_context_builder.py
+"""
+import random
+
+from langchain_core.documents import Document
+
+import context_builder
+from benchmark import _VOCABULARY
+from context_builder import build_context, deduplicate, estimate_tokens, merge_same_page
+
+PARAGRAPH = (
+    "Le support de niveau 1 qualifie chaque incident et lui attribue une priorité. "
+    "Les incidents critiques sont escaladés au niveau 2 dans l'heure. "
+    "Le niveau 2 informe le client toutes les quatre heures jusqu'à la résolution. "
+    "Un rapport d'incident est rédigé sous cinq jours ouvrés."
+)
+
+
+def _doc(text, source="support.pdf", page=1):
+    return Document(page_content=text, metadata={"source": source, "page": page})
+
+
+def test_deduplicate_drops_near_duplicates_and_contained_chunks():
+    first = _doc(PARAGRAPH)
+    reworded = _doc(PARAGRAPH.replace("cinq jours", "5 jours"), page=4)
+    contained = _doc(PARAGRAPH[80:200], source="autre.pdf")
+    distinct = _doc("Les factures sont envoyées chaque mois au service comptable du client.")
+    assert deduplicate([first, reworded, contained, distinct], threshold=0.8) == [first, distinct]
+    assert deduplicate([_doc("   ")]) == []
+
+
+def test_merge_same_page_restores_document_order():
+    # Deux chunks d'une page qui se recouvrent, retrouvés dans l'ordre inverse du document
+    head, tail = _doc(PARAGRAPH[:170]), _doc(PARAGRAPH[120:])
+    other = _doc("Les factures sont envoyées chaque mois.", source="facturation.pdf")
+
+    merged = merge_same_page([tail, other, head])
+    assert [doc.page_content for doc in merged] == [PARAGRAPH, other.page_content]
+    assert tail.page_content == PARAGRAPH[120:]   # les chunks d'origine ne sont pas modifiés
+
+
+def test_merge_same_page_keeps_distant_passages_apart():
+    intro = _doc("Présentation générale de l'offre de support et de ses engagements.")
+    annex = _doc("Annexe tarifaire : les interventions sur site sont facturées à la demi-journée.")
+    other = _doc("Autre document.", source="facturation.pdf")
+
+    # Consécutifs dans le classement : un seul bloc ; séparés par un autre chunk : deux blocs
+    assert len(merge_same_page([intro, annex])) == 1
+    assert [doc.page_content for doc in merge_same_page([intro, other, annex])] == \
+           [intro.page_content, other.page_content, annex.page_content]
+    # Même texte sur une autre page : jamais fusionné
+    assert len(merge_same_page([intro, _doc(intro.page_content, page=2)])) == 2
+
+
+def test_build_context_cites_sources_within_budget(monkeypatch):
+    monkeypatch.setattr(context_builder, "CONTEXT_TOKEN_BUDGETS", {"petit-modele": 200})
+    rng = random.Random(0)
+    docs = [_doc(f"Section {i}. " + ". ".join(" ".join(rng.choices(_VOCABULARY, k=8)) for _ in range(6)) + ".",
+                 source=f"doc-{i}.pdf", page=i)
+            for i in range(1, 6)]
+
+    context, info = build_context(docs, "petit-modele")
+    assert info == {"chunks_in": 5, "chunks_used": 2, "tokens": estimate_tokens(context), "budget": 200}
+    assert info["tokens"] <= 200
+    assert context.startswith("[1] doc-1.pdf, p. 1\nSection 1.")
+    # Le dernier chunk retenu est tronqué pour tenir dans le budget
+    assert "\n\n[2] doc-2.pdf, p. 2\nSection 2." in context
+    assert context.endswith(" […]")
+
+    # Budget par défaut pour les autres modèles : tout tient
+    monkeypatch.setattr(context_builder, "CONTEXT_TOKEN_BUDGET", 5000)
+    context, info = build_context(docs, "grand-modele")
+    assert info["chunks_used"] == 5
+    assert "[5] doc-5.pdf, p. 5" in context
@@ -0,0 +1,67 @@
+"""Réindexation incrémentale : différences calculées par `plan_update()` à partir du manifeste.
+
+    cd api && python -m pytest -q test_index_manifest.py
+"""
+import pytest
+from langchain_core.documents import Document
+
+import index_document
+from index_document import plan_update
+from index_manifest import IndexManifest, chunk_hash, chunk_uuid
+
+SOURCE = "guide.pdf"
+
+
+@pytest.fixture
+def manifest(tmp_path, monkeypatch):
+    manifest = IndexManifest(str(tmp_path / "manifest.json"))
+    monkeypatch.setattr(index_document, "get_manifest", lambda: manifest)
+    return manifest
+
+
+def _chunks(*texts):
+    return [Document(page_content=text, metadata={"source": SOURCE, "page": i + 1}) for i, text in enumerate(texts)]
+
+
+def test_chunk_ids_are_deterministic():
+    assert chunk_hash("Délai de  traitement") == chunk_hash("Délai de traitement")
+    assert chunk_uuid(SOURCE, chunk_hash("a")) == chunk_uuid(SOURCE, chunk_hash("a"))
+    assert chunk_uuid(SOURCE, chunk_hash("a")) != chunk_uuid("autre.pdf", chunk_hash("a"))
+
+
+def test_new_source_indexes_each_distinct_chunk_once(manifest):
+    plan = plan_update(SOURCE, "hash-v1", _chunks("Introduction.", "Tarifs.", "Introduction."))
+    assert not plan.known_source
+    assert [chunk.page_content for chunk in plan.new_chunks] == ["Introduction.", "Tarifs."]
+    assert plan.new_uuids == [plan.chunk_ids[chunk_hash(text)] for text in ("Introduction.", "Tarifs.")]
+    assert plan.removed_uuids == []
+
+
+def test_modified_source_only_touches_changed_chunks(manifest, tmp_path):
+    first = plan_update(SOURCE, "hash-v1", _chunks("Introduction.", "Tarifs 2024.", "Contacts."))
+    manifest.update(SOURCE, first.file_hash, first.chunk_ids)
+    assert manifest.is_unchanged(SOURCE, "hash-v1")
+    assert not manifest.is_unchanged(SOURCE, "hash-v2")
+
+    second = plan_update(SOURCE, "hash-v2", _chunks("Introduction.", "Tarifs 2025.", "Contacts.", "Annexe."))
+    assert second.known_source
+    assert [chunk.page_content for chunk in second.new_chunks] == ["Tarifs 2025.", "Annexe."]
+    assert second.removed_uuids == [first.chunk_ids[chunk_hash("Tarifs 2024.")]]
+    # Les chunks inchangés gardent leur UUID
+    assert second.chunk_ids[chunk_hash("Contacts.")] == first.chunk_ids[chunk_hash("Contacts.")]
+
+    # Le manifeste est relu tel quel par un autre processus
+    manifest.update(SOURCE, second.file_hash, second.chunk_ids)
+    reloaded = IndexManifest(str(tmp_path / "manifest.json"))
+    assert reloaded.is_unchanged(SOURCE, "hash-v2")
+    assert reloaded.diff(SOURCE, second.chunk_ids) == ([], [])
+
+
+def test_removed_source_is_planned_again_from_scratch(manifest):
+    plan = plan_update(SOURCE, "hash-v1", _chunks("Introduction."))
+    manifest.update(SOURCE, plan.file_hash, plan.chunk_ids)
+    manifest.remove(SOURCE)
+
+    again = plan_update(SOURCE, "hash-v1", _chunks("Introduction."))
+    assert not again.known_source
+    assert again.new_uuids == plan.new_uuids
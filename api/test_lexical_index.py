@@ -0,0 +1,133 @@
+"""Tokenisation française, classement BM25 et fusion hybride (RRF) de la recherche.
+
+    cd api && python -m pytest -q test_lexical_index.py
+"""
+import os
+
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+
+import rag
+from benchmark import HashingEmbeddings
+from lexical_index import BM25Index, reciprocal_rank_fusion, tokenize
+from vector_store import FaissBackend
+
+
+def test_tokenize_elisions_accents_and_stopwords():
+    assert tokenize("L'éligibilité d'un contrat qu'on résilie") == ["eligibilite", "contrat", "resilie"]
+
+
+def test_tokenize_singularizes_regular_plurals():
+    assert tokenize("contrats factures prix") == tokenize("contrat facture prix")
+    assert tokenize("journaux principaux") == ["journal", "principal"]
+
+
+def test_tokenize_keeps_aux_words_outside_the_al_list():
+    assert tokenize("travaux") == ["travail"]
+    assert tokenize("bureaux") == ["bureau"]
+    assert tokenize("eaux") == ["eau"]
+
+
+def _corpus():
+    return [
+        Document(page_content="Procédure d'escalade des incidents critiques vers le niveau 2.",
+                 metadata={"source": "support.pdf", "page": 1}),
+        Document(page_content="Les factures sont envoyées chaque mois au service comptable.",
+                 metadata={"source": "facturation.pdf", "page": 3}),
+        Document(page_content="Un incident mineur est traité sous 48 heures ouvrées.",
+                 metadata={"source": "support.pdf", "page": 2}),
+        Document(page_content="La migration cloud des serveurs de sauvegarde est planifiée.",
+                 metadata={"source": "projet.pdf", "page": 7}),
+    ]
+
+
+def _ids(results):
+    return [doc.metadata["id"] for doc, _ in results]
+
+
+def test_bm25_ranks_matching_chunks(tmp_path):
+    index = BM25Index(str(tmp_path / "bm25.json"))
+    index.add(["a", "b", "c", "d"], _corpus())
+
+    results = index.search("escalade d'un incident critique", 3)
+    assert _ids(results) == ["a", "c"]
+    assert results[0][1] > results[1][1] > 0
+    assert results[0][0].metadata == {"id": "a", "source": "support.pdf", "page": 1}
+    assert index.search("contrats", 3) == []
+
+
+def test_bm25_persistence_and_deletions(tmp_path):
+    path = str(tmp_path / "bm25.json")
+    index = BM25Index(path)
+    index.add(["a", "b", "c", "d"], _corpus())
+    assert not os.path.exists(path)
+    index.flush()
+
+    # Un second processus voit l'index écrit, puis ses suppressions
+    other = BM25Index(path)
+    assert len(other) == 4
+    assert index.delete(["a"]) == 1
+    assert index.delete_source("support.pdf") == 1
+    index.flush()
+    assert _ids(other.search("incident", 3)) == []
+    assert len(other) == 2
+
+    index.replace_all(["x"], [_corpus()[1]])
+    assert _ids(BM25Index(path).search("factures", 3)) == ["x"]
+
+
+def test_reciprocal_rank_fusion_weights():
+    a, b, c = (Document(page_content=name, metadata={"id": name}) for name in "abc")
+    dense = [a, b, c]
+
+    # Un chunk présent dans les deux classements passe devant
+    fused = reciprocal_rank_fusion([dense, [b]], [1.0, 1.0], rrf_k=60)
+    assert _ids(fused) == ["b", "a", "c"]
+    assert fused[0][1] == pytest.approx(1 / 62 + 1 / 61)
+
+    # Le classement lexical domine quand son poids l'emporte, disparaît à poids nul
+    assert _ids(reciprocal_rank_fusion([dense, [c]], [1.0, 3.0], rrf_k=60)) == ["c", "a", "b"]
+    assert _ids(reciprocal_rank_fusion([dense, [c]], [1.0, 0.0], rrf_k=60)) == ["a", "b", "c"]
+
+
+@pytest.fixture
+def hybrid(tmp_path, monkeypatch):
+    """Recherche hybride de `rag.retrieve()` sur un index FAISS et BM25 temporaire."""
+    pytest.importorskip("faiss")
+    embeddings = HashingEmbeddings(dimension=64)
+    backend = FaissBackend(str(tmp_path / "faiss"), index_type="flat", mmap=False)
+    lexical = BM25Index(str(tmp_path / "bm25.json"))
+    corpus = _corpus()
+    ids = [f"chunk-{i}" for i in range(len(corpus))]
+    backend.upsert_stream(zip(ids, corpus, embeddings.embed_documents([d.page_content for d in corpus])))
+    lexical.add(ids, corpus)
+
+    monkeypatch.setattr(rag, "get_embeddings", lambda: embeddings)
+    monkeypatch.setattr(rag, "get_vector_backend", lambda: backend)
+    monkeypatch.setattr(rag, "_lexical_index", lambda: lexical)
+    monkeypatch.setattr(rag, "RETRIEVAL_MODE", "hybrid")
+    monkeypatch.setattr(rag, "HYBRID_FETCH_K", 2)
+    return embeddings, backend, lexical
+
+
+def test_retrieve_follows_weighted_fusion(hybrid, monkeypatch):
+    embeddings, backend, lexical = hybrid
+    question = "incident critique"
+    vector = embeddings.embed_query(question)
+    dense_ids = _ids(backend.search(vector, 2))
+
+    monkeypatch.setattr(rag, "HYBRID_DENSE_WEIGHT", 0.0)
+    monkeypatch.setattr(rag, "HYBRID_SPARSE_WEIGHT", 1.0)
+    sparse_only = rag.retrieve(question, k=2)
+    assert _ids(sparse_only) == _ids(lexical.search(question, 2))
+    assert set(_ids(sparse_only)) - set(dense_ids)   # hors des HYBRID_FETCH_K résultats vectoriels
+
+    monkeypatch.setattr(rag, "HYBRID_DENSE_WEIGHT", 1.0)
+    monkeypatch.setattr(rag, "HYBRID_SPARSE_WEIGHT", 0.0)
+    assert _ids(rag.retrieve(question, k=2)) == dense_ids
+
+    # Le score retourné reste la similarité cosinus, y compris pour les chunks trouvés par BM25 seul
+    for doc, score in sparse_only:
+        doc_vector = np.asarray(embeddings.embed_documents([doc.page_content])[0])
+        assert score == pytest.approx(float(np.dot(vector, doc_vector)), abs=1e-5)
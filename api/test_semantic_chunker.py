@@ -0,0 +1,84 @@
+"""Découpage sémantique par page : frontières de page, bornes de taille, flux de pages.
+
+    cd api && python -m pytest -q test_semantic_chunker.py
+"""
+import random
+
+from langchain_core.documents import Document
+
+from benchmark import HashingEmbeddings, _VOCABULARY
+from semantic_chunker import FastSemanticChunker, merge_elements
+
+PAGES = 6
+
+
+def _elements():
+    """Éléments Unstructured (plusieurs par page), chaque phrase marquée de sa page."""
+    rng = random.Random(0)
+    for page in range(1, PAGES + 1):
+        for element in range(3):
+            sentences = [
+                f"P{page} " + " ".join(rng.choices(_VOCABULARY, k=rng.randint(4, 14))) + "."
+                for _ in range(rng.randint(2, 5))
+            ]
+            yield Document(page_content=" ".join(sentences),
+                           metadata={"source": "guide.pdf", "page_number": page, "element": element})
+
+
+def _chunker(**kwargs):
+    options = {"breakpoint_percentile": 80, "buffer_size": 1, "min_chunk_chars": 120,
+               "max_chunk_chars": 400, "embed_batch": 1000}
+    options.update(kwargs)
+    return FastSemanticChunker(HashingEmbeddings(dimension=64), **options)
+
+
+def test_merge_elements_groups_by_page():
+    pages = merge_elements(_elements())
+    assert [page.metadata["page"] for page in pages] == list(range(1, PAGES + 1))
+    assert all(page.metadata["source"] == "guide.pdf" for page in pages)
+
+
+def test_chunks_never_cross_a_page():
+    chunks = _chunker().split_documents(list(_elements()))
+    assert {chunk.metadata["page"] for chunk in chunks} == set(range(1, PAGES + 1))
+    for chunk in chunks:
+        page = chunk.metadata["page"]
+        markers = {word for word in chunk.page_content.split() if word.startswith("P") and word[1:].isdigit()}
+        assert markers == {f"P{page}"}
+
+    # Aucun texte perdu ni réordonné
+    for page in merge_elements(_elements()):
+        texts = [chunk.page_content for chunk in chunks if chunk.metadata["page"] == page.metadata["page"]]
+        assert " ".join(texts).split() == page.page_content.split()
+
+
+def test_chunk_size_bounds():
+    chunker = _chunker()
+    chunks = chunker.split_documents(list(_elements()))
+    assert all(len(chunk.page_content) <= chunker.max_chunk_chars for chunk in chunks)
+
+    by_page = {}
+    for chunk in chunks:
+        by_page.setdefault(chunk.metadata["page"], []).append(chunk.page_content)
+    for texts in by_page.values():
+        # Un chunk trop court n'est gardé que si la fusion avec son voisin dépasserait le maximum
+        for previous, text in zip(texts, texts[1:]):
+            if len(previous) < chunker.min_chunk_chars or len(text) < chunker.min_chunk_chars:
+                assert len(previous) + 1 + len(text) > chunker.max_chunk_chars
+
+
+def test_overlong_sentence_is_split():
+    sentence = " ".join(["migration"] * 200) + "."
+    chunks = _chunker(max_chunk_chars=300).split_documents(
+        [Document(page_content=sentence, metadata={"source": "long.pdf", "page": 1})]
+    )
+    assert len(chunks) > 1
+    assert all(len(chunk.page_content) <= 300 for chunk in chunks)
+
+
+def test_streamed_pages_match_list_input():
+    # Encodage au fil du flux (petits lots) : même résultat qu'en une seule passe
+    streamed = _chunker(embed_batch=4).split_documents(_elements())
+    whole = _chunker().split_documents(list(_elements()))
+    assert [(c.page_content, c.metadata["page"]) for c in streamed] == \
+           [(c.page_content, c.metadata["page"]) for c in whole]
@@ -0,0 +1,104 @@
+"""Réception des documents : détection du format sur le contenu, limites 413 et 415.
+
+    cd api && python -m pytest -q test_uploads.py
+"""
+import functools
+import io
+import time
+import zipfile
+
+import pytest
+
+import uploads
+from benchmark import write_pdf, write_pptx
+from uploads import SpooledUpload, UnsupportedFormatError, UploadTooLargeError, detect_format
+
+OLE_HEADER = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1" + b"\x00" * 504
+
+
+@pytest.fixture(scope="module")
+def samples(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("samples")
+    with open(write_pdf(str(directory / "doc.pdf"), 2, seed=1), "rb") as f:
+        pdf = f.read()
+    with open(write_pptx(str(directory / "deck.pptx"), 2), "rb") as f:
+        pptx = f.read()
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("word/document.xml", "<w:document/>")
+    return {"pdf": pdf, "pptx": pptx, "docx": archive.getvalue()}
+
+
+def _spool(filename, content, chunk_size=4096, **kwargs):
+    upload = SpooledUpload(filename, **kwargs)
+    for start in range(0, len(content), chunk_size):
+        upload.write(content[start:start + chunk_size])
+    return upload.finish()
+
+
+def test_detect_format_by_magic_bytes(samples):
+    assert detect_format(samples["pdf"][:1024]) == "pdf"
+    assert detect_format(b"\r\n" + samples["pdf"][:1022]) == "pdf"   # octets parasites avant l'en-tête
+    assert detect_format(samples["pptx"][:8], io.BytesIO(samples["pptx"])) == "pptx"
+
+    with pytest.raises(UnsupportedFormatError, match="pptx"):
+        detect_format(samples["docx"][:8], io.BytesIO(samples["docx"]))
+    with pytest.raises(UnsupportedFormatError, match=r"\.ppt\)"):
+        detect_format(OLE_HEADER)
+    with pytest.raises(UnsupportedFormatError):
+        detect_format(b"Bonjour, ceci n'est pas un document.")
+
+
+def test_source_name_follows_content(samples):
+    upload = _spool("Rapport annuel.PDF", samples["pdf"])
+    assert (upload.format, upload.name) == ("pdf", "Rapport annuel.PDF")
+    assert upload.file.read() == samples["pdf"]
+    assert upload.size == len(samples["pdf"])
+
+    assert _spool("deck.pdf", samples["pptx"]).name == "deck.pptx"
+    assert _spool("scan", samples["pdf"]).name == "scan.pdf"
+    assert _spool(None, samples["pdf"]).name == "document.pdf"
+
+
+def test_spool_moves_to_disk_beyond_memory_limit(samples):
+    assert _spool("doc.pdf", samples["pdf"], max_memory=len(samples["pdf"]) + 1).in_memory
+    upload = _spool("doc.pdf", samples["pdf"], max_memory=1024)
+    assert not upload.in_memory
+    assert upload.file.read() == samples["pdf"]
+
+
+def test_upload_too_large(samples):
+    with pytest.raises(UploadTooLargeError):
+        _spool("doc.pdf", samples["pdf"], max_bytes=len(samples["pdf"]) - 1)
+
+
+def test_api_rejects_unsupported_and_oversized_files(client, samples, monkeypatch):
+    response = client.post("/index_pdf", files={"pdf_file": ("slides.ppt", OLE_HEADER)})
+    assert response.status_code == 415
+    assert ".pptx" in response.json()["detail"]
+
+    response = client.post("/index_stream?filename=rapport.docx", content=samples["docx"])
+    assert response.status_code == 415
+
+    response = client.post("/index_batch", files=[("files", ("a.pdf", samples["pdf"])),
+                                                  ("files", ("b.docx", samples["docx"]))])
+    assert response.status_code == 415
+    assert response.json()["detail"].startswith("b.docx")
+
+    monkeypatch.setattr(uploads, "SpooledUpload", functools.partial(SpooledUpload, max_bytes=1024))
+    response = client.post("/index_pdf", files={"pdf_file": ("doc.pdf", samples["pdf"])})
+    assert response.status_code == 413
+
+
+def test_api_names_source_after_detected_format(client, samples):
+    response = client.post("/index_pdf", files={"pdf_file": ("rapport.bin", samples["pdf"])})
+    assert response.status_code == 202
+    assert response.json()["source"] == "rapport.pdf"
+
+    # Attente de la fin de l'indexation en arrière-plan
+    job_id = response.json()["job_id"]
+    deadline = time.time() + 60
+    while (job := client.get(f"/jobs/{job_id}").json())["status"] in ("queued", "running"):
+        assert time.time() < deadline
+        time.sleep(0.05)
+    assert job["status"] == "done"
@@ -0,0 +1,77 @@
+"""Suppression puis recherche sur chaque type d'index FAISS (avant et après rechargement).
+
+    cd api && python -m pytest -q test_vector_store.py
+"""
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+
+import vector_store
+from vector_store import FaissBackend
+
+pytest.importorskip("faiss")
+
+DIM = 16
+COUNT = 400
+
+
+@pytest.fixture
+def small_ivf(monkeypatch):
+    # Passage à IVF dès 39 * 4 vecteurs, toutes les listes sondées (recherche exacte)
+    monkeypatch.setattr(vector_store, "FAISS_IVF_NLIST", 4)
+    monkeypatch.setattr(vector_store, "FAISS_IVF_NPROBE", 4)
+
+
+def _populate(backend: FaissBackend):
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((COUNT, DIM)).astype("float32")
+    uuids = [f"uuid-{i}" for i in range(COUNT)]
+    documents = [Document(page_content=f"chunk {i}", metadata={"source": f"doc-{i % 4}.pdf", "page": i})
+                 for i in range(COUNT)]
+    backend.upsert_stream(zip(uuids, documents, vectors.tolist()), batch_size=64)
+    return uuids, vectors
+
+
+def _check(backend: FaissBackend, uuids, vectors, deleted):
+    assert backend.count() == COUNT - len(deleted)
+    for i, uuid in enumerate(uuids):
+        hits = [doc.metadata["id"] for doc, _ in backend.search(vectors[i].tolist(), 3)]
+        if uuid in deleted:
+            assert uuid not in hits
+        else:
+            assert hits[0] == uuid
+    exported = {uuid: vector for uuid, _, vector in backend.iterate(include_vectors=True)}
+    assert set(exported) == set(uuids) - deleted
+    kept = uuids.index(next(iter(exported)))
+    expected = vectors[kept] / np.linalg.norm(vectors[kept])
+    assert np.allclose(exported[uuids[kept]], expected, atol=1e-5)
+
+
+@pytest.mark.parametrize("index_type", ["flat", "ivf", "hnsw"])
+def test_delete_then_search(tmp_path, small_ivf, index_type):
+    backend = FaissBackend(str(tmp_path), index_type=index_type, mmap=False)
+    uuids, vectors = _populate(backend)
+    if index_type == "ivf":
+        assert isinstance(backend._base(), backend._faiss.IndexIVF)
+
+    deleted = set(uuids[::7])
+    assert backend.delete(sorted(deleted)) == len(deleted)
+    deleted |= {uuid for i, uuid in enumerate(uuids) if i % 4 == 1}
+    backend.delete_source("doc-1.pdf")
+    backend.flush()
+    _check(backend, uuids, vectors, deleted)
+
+    # Rechargement depuis le disque, en mmap puis avec une nouvelle écriture
+    reloaded = FaissBackend(str(tmp_path), index_type=index_type, mmap=True)
+    _check(reloaded, uuids, vectors, deleted)
+    reloaded.delete([uuids[2]])
+    _check(reloaded, uuids, vectors, deleted | {uuids[2]})
+
+
+def test_incomplete_backend_fails_at_instantiation():
+    class SearchOnly(vector_store.VectorBackend):
+        def search(self, vector, k):
+            return []
+
+    with pytest.raises(TypeError, match="upsert"):
+        SearchOnly()
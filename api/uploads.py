@@ -0,0 +1,173 @@
+"""Réception des fichiers envoyés à l'API, sans fichier temporaire intermédiaire.
+
+Le contenu est reçu par blocs dans un `SpooledTemporaryFile` : il reste en
+mémoire jusqu'à `UPLOAD_SPOOL_MAX_MEMORY` octets et ne passe sur disque
+qu'au-delà. L'empreinte SHA-256 (pour le manifeste) est calculée pendant
+la réception, et le format est déduit des premiers octets du fichier
+plutôt que de son extension. Une fois le tampon passé sur disque, les
+écritures sont faites dans le pool de threads pour ne pas bloquer la
+boucle d'événements. Le tampon est libéré par `close()`, appelé
+automatiquement à la fin de l'indexation.
+"""
+import hashlib
+import os
+import tempfile
+import zipfile
+from typing import Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from config import UPLOAD_SPOOL_MAX_MEMORY, UPLOAD_MAX_BYTES, UPLOAD_CHUNK_SIZE
+
+_PDF_MAGIC = b"%PDF-"
+_ZIP_MAGIC = b"PK\x03\x04"
+_OLE_MAGIC = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"
+
+EXTENSIONS = {"pdf": ".pdf", "pptx": ".pptx"}
+
+
+class UnsupportedFormatError(ValueError):
+    """Le contenu reçu n'est ni un PDF ni une présentation PowerPoint (.pptx)."""
+
+
+class UploadTooLargeError(ValueError):
+    """Le fichier reçu dépasse `UPLOAD_MAX_BYTES`."""
+
+
+def detect_format(head: bytes, file=None) -> str:
+    """
+    Déduit le format d'un document de ses premiers octets.
+
+    Args:
+        head: Début du fichier (au moins 8 octets).
+        file: Fichier complet (seekable), pour distinguer un .pptx des autres archives ZIP.
+
+    Returns:
+        str: "pdf" ou "pptx".
+
+    Raises:
+        UnsupportedFormatError: Pour tout autre contenu.
+    """
+    # Certains générateurs ajoutent quelques octets avant l'en-tête PDF
+    if _PDF_MAGIC in head[:1024]:
+        return "pdf"
+    if head.startswith(_ZIP_MAGIC):
+        if file is None:
+            return "pptx"
+        position = file.tell()
+        try:
+            file.seek(0)
+            with zipfile.ZipFile(file) as archive:
+                if any(name.startswith("ppt/") for name in archive.namelist()):
+                    return "pptx"
+        except zipfile.BadZipFile:
+            pass
+        finally:
+            file.seek(position)
+        raise UnsupportedFormatError("Archive ZIP qui n'est pas une présentation PowerPoint (.pptx)")
+    if head.startswith(_OLE_MAGIC):
+        raise UnsupportedFormatError(
+            "Format PowerPoint 97-2003 (.ppt) non supporté : convertissez le fichier en .pptx"
+        )
+    raise UnsupportedFormatError("Format de fichier non supporté (PDF ou PowerPoint .pptx attendu)")
+
+
+class SpooledUpload:
+    """Document reçu, en mémoire ou sur disque selon sa taille."""
+
+    def __init__(self, filename: Optional[str], max_memory: int = UPLOAD_SPOOL_MAX_MEMORY,
+                 max_bytes: int = UPLOAD_MAX_BYTES):
+        self.file = tempfile.SpooledTemporaryFile(max_size=max_memory)
+        self.max_memory = max_memory
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.format = None
+        self._digest = hashlib.sha256()
+        self._head = b""
+        self._requested_name = os.path.basename(filename or "")
+
+    def write(self, chunk: bytes) -> None:
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            self.close()
+            raise UploadTooLargeError(f"Fichier trop volumineux (limite : {self.max_bytes // (1024 * 1024)} Mo)")
+        if len(self._head) < 1024:
+            self._head += chunk[:1024 - len(self._head)]
+        self._digest.update(chunk)
+        self.file.write(chunk)
+
+    def finish(self) -> "SpooledUpload":
+        """Termine la réception : détection du format et retour au début du tampon."""
+        try:
+            self.format = detect_format(self._head, self.file)
+        except UnsupportedFormatError:
+            self.close()
+            raise
+        self.file.seek(0)
+        return self
+
+    @property
+    def sha256(self) -> str:
+        return self._digest.hexdigest()
+
+    @property
+    def name(self) -> str:
+        """Nom de la source, avec l'extension correspondant au contenu réel."""
+        stem, extension = os.path.splitext(self._requested_name)
+        expected = EXTENSIONS.get(self.format, "")
+        if not stem:
+            return f"document{expected}"
+        return self._requested_name if extension.lower() == expected else f"{stem}{expected}"
+
+    @property
+    def in_memory(self) -> bool:
+        return not getattr(self.file, "_rolled", False)
+
+    def stays_in_memory(self, size: int) -> bool:
+        """Vrai si `size` octets de plus tiennent encore en mémoire (écriture sans accès disque)."""
+        return self.in_memory and self.size + size <= self.max_memory
+
+    def save_to(self, directory: str) -> str:
+        """Écrit le contenu dans un dossier (pour les traitements qui exigent un chemin)."""
+        path = os.path.join(directory, self.name)
+        self.file.seek(0)
+        with open(path, "wb") as out:
+            while chunk := self.file.read(UPLOAD_CHUNK_SIZE):
+                out.write(chunk)
+        self.file.seek(0)
+        return path
+
+    def close(self) -> None:
+        self.file.close()
+
+
+async def _write(upload: SpooledUpload, chunk: bytes) -> None:
+    # Passage sur disque (et écritures suivantes) hors de la boucle d'événements
+    if upload.stays_in_memory(len(chunk)):
+        upload.write(chunk)
+    else:
+        await run_in_threadpool(upload.write, chunk)
+
+
+async def _finish(upload: SpooledUpload) -> SpooledUpload:
+    # La détection du format relit le fichier (archive PowerPoint) : sur disque, dans le pool
+    if upload.in_memory:
+        return upload.finish()
+    return await run_in_threadpool(upload.finish)
+
+
+async def spool_async_stream(filename: Optional[str], chunks) -> SpooledUpload:
+    """Reçoit un flux asynchrone, par exemple `request.stream()` de Starlette."""
+    upload = SpooledUpload(filename)
+    async for chunk in chunks:
+        if chunk:
+            await _write(upload, chunk)
+    return await _finish(upload)
+
+
+async def spool_upload_file(upload_file) -> SpooledUpload:
+    """Reçoit un `UploadFile` multipart, bloc par bloc."""
+    upload = SpooledUpload(upload_file.filename)
+    while chunk := await upload_file.read(UPLOAD_CHUNK_SIZE):
+        await _write(upload, chunk)
+    return await _finish(upload)
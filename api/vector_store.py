@@ -0,0 +1,534 @@
+"""Abstraction de la base vectorielle et ses moteurs interchangeables.
+
+- `WeaviateBackend` : collection Weaviate v4, connexion ouverte au premier usage.
+- `FaissBackend` : index FAISS en processus (flat, IVF ou HNSW), persisté sur
+  disque, chargé en mmap et enrichi par ajouts incrémentaux. Aucun service
+  externe n'est nécessaire (déploiement mono-nœud, tests).
+
+Le moteur est choisi par la variable `VECTOR_BACKEND`. Les scores retournés
+par `search()` sont des similarités cosinus dans les deux cas.
+"""
+import json
+import os
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from config import (
+    VECTOR_BACKEND,
+    COLLECTION_NAME,
+    WEAVIATE_HOST,
+    WEAVIATE_PORT,
+    WEAVIATE_GRPC_PORT,
+    FAISS_INDEX_DIR,
+    FAISS_INDEX_TYPE,
+    FAISS_IVF_NLIST,
+    FAISS_IVF_NPROBE,
+    FAISS_HNSW_M,
+    FAISS_HNSW_EF_SEARCH,
+    FAISS_MMAP,
+)
+from weaviate_writer import WeaviateBatchWriter
+
+
+class VectorBackend(ABC):
+    """Interface commune aux moteurs vectoriels.
+
+    Chaque objet est identifié par un UUID (chaîne) et porte les propriétés
+    `content`, `source` et `page`.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    def upsert(self, ids: List[str], documents: List[Document],
+               vectors: List[List[float]]) -> int:
+        """Insère ou remplace des objets ; retourne le nombre d'objets écrits."""
+
+    def upsert_stream(self, objects: Iterable[Tuple[str, Document, List[float]]],
+                      batch_size: int = 256) -> int:
+        """
+        Insère des objets produits au fil de l'eau (uuid, document, vecteur).
+
+        L'itérable n'est consommé qu'au rythme des écritures : s'il calcule
+        les embeddings à la demande, l'encodage suit la vitesse de la base.
+        """
+        written, batch = 0, []
+        for item in objects:
+            batch.append(item)
+            if len(batch) >= batch_size:
+                written += self.upsert(*map(list, zip(*batch)))
+                batch = []
+        if batch:
+            written += self.upsert(*map(list, zip(*batch)))
+        self.flush()
+        return written
+
+    @abstractmethod
+    def delete(self, ids: List[str]) -> int:
+        """Supprime des objets par UUID ; retourne le nombre d'objets supprimés."""
+
+    @abstractmethod
+    def delete_source(self, source: str) -> int:
+        """Supprime tous les objets d'une source."""
+
+    @abstractmethod
+    def search(self, vector: List[float], k: int) -> List[Tuple[Document, float]]:
+        """Retourne les k objets les plus proches avec leur similarité cosinus."""
+
+    @abstractmethod
+    def count(self) -> int:
+        """Nombre d'objets de la collection."""
+
+    def count_by(self, prop: str, source: Optional[str] = None) -> Dict[object, int]:
+        """Nombre d'objets par valeur de `prop` ("source" ou "page"), éventuellement pour une source."""
+        counts: Dict[object, int] = {}
+        for _, doc, _ in self.iterate():
+            if source is not None and doc.metadata.get("source") != source:
+                continue
+            value = doc.metadata.get(prop)
+            counts[value] = counts.get(value, 0) + 1
+        return counts
+
+    @abstractmethod
+    def sample(self, limit: int = 10) -> List[dict]:
+        """Retourne les propriétés de quelques objets (débogage)."""
+
+    @abstractmethod
+    def iterate(self, include_vectors: bool = False) -> Iterator[Tuple[str, Document, Optional[List[float]]]]:
+        """Parcourt tous les objets : (uuid, document, vecteur ou None)."""
+
+    def is_ready(self) -> bool:
+        """Vrai si la base répond (sonde de disponibilité de l'API)."""
+        return True
+
+    def flush(self) -> None:
+        """Persiste les écritures en attente (bases locales ; sans effet pour un serveur)."""
+
+    def close(self) -> None:
+        pass
+
+
+def _to_document(properties: dict, object_id: str) -> Document:
+    return Document(
+        page_content=properties.get("content", ""),
+        metadata={"id": object_id, "source": properties.get("source", ""),
+                  "page": properties.get("page", 0)}
+    )
+
+
+class WeaviateBackend(VectorBackend):
+    name = "weaviate"
+
+    def __init__(self, collection_name: str = COLLECTION_NAME):
+        self.collection_name = collection_name
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        """Client Weaviate v4, connecté (et collection créée) au premier usage."""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._connect()
+        return self._client
+
+    def _connect(self):
+        import weaviate
+        import weaviate.classes.config as wvcc
+
+        # ✅ CONNEXION WEAVIATE V4
+        print("\n💾 Connexion à Weaviate...")
+        client = weaviate.connect_to_local(
+            host=WEAVIATE_HOST,
+            port=WEAVIATE_PORT,
+            grpc_port=WEAVIATE_GRPC_PORT,
+            skip_init_checks=True
+        )
+
+        # ✅ CRÉATION DE L'INDEX AVEC SYNTAXE V4
+        try:
+            if not client.collections.exists(self.collection_name):
+                client.collections.create(
+                    name=self.collection_name,
+                    properties=[
+                        wvcc.Property(name="content", data_type=wvcc.DataType.TEXT),
+                        wvcc.Property(name="source", data_type=wvcc.DataType.TEXT),
+                        wvcc.Property(name="page", data_type=wvcc.DataType.NUMBER),
+                    ]
+                )
+            print("✅ Collection Weaviate prête")
+        except Exception as e:
+            print(f"❌ Erreur création collection: {str(e)}")
+            client.close()
+            raise
+        return client
+
+    @property
+    def collection(self):
+        return self.client.collections.get(self.collection_name)
+
+    def upsert(self, ids, documents, vectors) -> int:
+        return self.upsert_stream(zip(ids, documents, vectors))
+
+    def upsert_stream(self, objects, batch_size: int = 256) -> int:
+        # Batching v4 concurrent (gRPC), avec reprise des objets rejetés
+        return WeaviateBatchWriter(self.collection).write(objects).inserted
+
+    def delete(self, ids) -> int:
+        from weaviate.classes.query import Filter
+
+        deleted = 0
+        for start in range(0, len(ids), 1000):
+            batch = ids[start:start + 1000]
+            deleted += self.collection.data.delete_many(
+                where=Filter.by_id().contains_any(batch)
+            ).successful
+        return deleted
+
+    def delete_source(self, source: str) -> int:
+        from weaviate.classes.query import Filter
+
+        return self.collection.data.delete_many(
+            where=Filter.by_property("source").equal(source)
+        ).successful
+
+    def search(self, vector, k):
+        from weaviate.classes.query import MetadataQuery
+
+        response = self.collection.query.near_vector(
+            near_vector=vector,
+            limit=k,
+            return_metadata=MetadataQuery(distance=True)
+        )
+        return [
+            (_to_document(obj.properties, str(obj.uuid)), 1.0 - obj.metadata.distance)
+            for obj in response.objects
+        ]
+
+    def count(self) -> int:
+        return self.collection.aggregate.over_all(total_count=True).total_count
+
+    def count_by(self, prop: str, source: Optional[str] = None) -> Dict[object, int]:
+        from weaviate.classes.aggregate import GroupByAggregate
+        from weaviate.classes.query import Filter
+
+        # Agrégation côté serveur : aucun objet n'est rapatrié
+        response = self.collection.aggregate.over_all(
+            group_by=GroupByAggregate(prop=prop, limit=100_000),
+            total_count=True,
+            filters=Filter.by_property("source").equal(source) if source is not None else None,
+        )
+        return {group.grouped_by.value: group.total_count for group in response.groups}
+
+    def sample(self, limit: int = 10) -> List[dict]:
+        return [obj.properties for obj in self.collection.query.fetch_objects(limit=limit).objects]
+
+    def iterate(self, include_vectors: bool = False):
+        # Itération par curseur : les objets ne sont jamais tous chargés en mémoire
+        for obj in self.collection.iterator(include_vector=include_vectors):
+            vector = obj.vector.get("default") if include_vectors and obj.vector else None
+            yield str(obj.uuid), _to_document(obj.properties, str(obj.uuid)), vector
+
+    def is_ready(self) -> bool:
+        try:
+            return bool(self.client.is_ready())
+        except Exception as e:
+            # Serveur injoignable : la connexion sera retentée au prochain appel
+            print(f"⚠️ Weaviate indisponible : {str(e)}")
+            return False
+
+    def close(self) -> None:
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+
+
+class FaissBackend(VectorBackend):
+    """Index FAISS local (produit scalaire sur vecteurs normalisés = cosinus).
+
+    Fichiers du dossier `index_dir` :
+      - `index.faiss` : index FAISS ; "flat" et "hnsw" sont enveloppés dans un
+        `IndexIDMap2`, "ivf" stocke lui-même les identifiants (avec une table
+        directe pour `reconstruct`) ;
+      - `objects.json` : propriétés et UUID de chaque identifiant interne.
+
+    Avec HNSW, qui ne sait pas supprimer de vecteurs, les suppressions sont
+    des pierres tombales filtrées à la recherche ; l'index est reconstruit
+    quand elles dépassent 20 % des vecteurs.
+
+    Les écritures restent en mémoire jusqu'à `flush()` (appelé à la fin de
+    `upsert_stream()`, à la validation d'un document et à la fermeture) :
+    réécrire l'index à chaque lot rendrait l'ingestion quadratique.
+    """
+
+    name = "faiss"
+
+    def __init__(self, index_dir: str = FAISS_INDEX_DIR, index_type: str = FAISS_INDEX_TYPE,
+                 mmap: bool = FAISS_MMAP):
+        import faiss
+
+        if index_type not in ("flat", "ivf", "hnsw"):
+            raise ValueError(f"Type d'index FAISS inconnu : {index_type}")
+        self._faiss = faiss
+        self.index_dir = index_dir
+        self.index_type = index_type
+        self._lock = threading.RLock()
+        self._index = None
+        self._mmapped = False
+        self._objects: Dict[int, dict] = {}      # id interne -> propriétés + uuid
+        self._ids: Dict[str, int] = {}           # uuid -> id interne
+        self._tombstones = set()
+        self._next_id = 0
+        self._dirty = False
+        self._load(mmap)
+
+    # --- Persistance -----------------------------------------------------
+
+    @property
+    def _index_path(self) -> str:
+        return os.path.join(self.index_dir, "index.faiss")
+
+    @property
+    def _objects_path(self) -> str:
+        return os.path.join(self.index_dir, "objects.json")
+
+    def _load(self, mmap: bool) -> None:
+        if not os.path.exists(self._index_path):
+            return
+        flags = self._faiss.IO_FLAG_MMAP if mmap else 0
+        self._index = self._faiss.read_index(self._index_path, flags)
+        self._mmapped = mmap
+        self._configure_search()
+        self._ensure_direct_map()
+        with open(self._objects_path, encoding="utf-8") as f:
+            state = json.load(f)
+        self._objects = {int(i): obj for i, obj in state["objects"].items()}
+        self._tombstones = set(state.get("tombstones", []))
+        self._next_id = state.get("next_id", 0)
+        self._ids = {
+            obj["uuid"]: i for i, obj in self._objects.items() if i not in self._tombstones
+        }
+        print(f"📂 Index FAISS chargé ({len(self._ids)} objets, mmap={mmap})")
+
+    def flush(self) -> None:
+        """Écrit l'index et les objets sur disque (écriture atomique tmp + rename)."""
+        with self._lock:
+            if self._dirty and self._index is not None:
+                self._save()
+                self._dirty = False
+
+    def close(self) -> None:
+        self.flush()
+
+    def _save(self) -> None:
+        os.makedirs(self.index_dir, exist_ok=True)
+        tmp_index = f"{self._index_path}.tmp"
+        self._faiss.write_index(self._index, tmp_index)
+        os.replace(tmp_index, self._index_path)
+        tmp_objects = f"{self._objects_path}.tmp"
+        with open(tmp_objects, "w", encoding="utf-8") as f:
+            json.dump({
+                "index_type": self.index_type,
+                "next_id": self._next_id,
+                "tombstones": sorted(self._tombstones),
+                "objects": self._objects,
+            }, f, ensure_ascii=False)
+        os.replace(tmp_objects, self._objects_path)
+
+    def _ensure_writable(self) -> None:
+        # Un index chargé en mmap est recopié en mémoire avant toute écriture
+        if self._mmapped:
+            self._index = self._faiss.read_index(self._index_path)
+            self._configure_search()
+            self._ensure_direct_map()
+            self._mmapped = False
+
+    # --- Construction de l'index ----------------------------------------
+
+    def _new_index(self, dim: int, training: Optional[np.ndarray] = None):
+        faiss = self._faiss
+        if self.index_type == "hnsw":
+            base = faiss.IndexHNSWFlat(dim, FAISS_HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        elif self.index_type == "ivf" and training is not None:
+            nlist = max(1, min(FAISS_IVF_NLIST, len(training) // 39))
+            ivf = faiss.IndexIVFFlat(faiss.IndexFlatIP(dim), dim, nlist, faiss.METRIC_INNER_PRODUCT)
+            ivf.train(training)
+            # Pas d'IndexIDMap2 : remove_ids sur un IVF enveloppé désynchronise id_map
+            # des identifiants stockés dans les listes ; l'IVF garde les ids externes.
+            ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+            return ivf
+        else:
+            # IVF non entraîné : index exact jusqu'à avoir assez de vecteurs
+            base = faiss.IndexFlatIP(dim)
+        return faiss.IndexIDMap2(base)
+
+    def _base(self):
+        if isinstance(self._index, self._faiss.IndexIDMap):
+            return self._faiss.downcast_index(self._index.index)
+        return self._faiss.downcast_index(self._index)
+
+    def _ensure_direct_map(self) -> None:
+        """Table directe id -> vecteur de l'IVF (nécessaire à `reconstruct`)."""
+        if self._index is None or isinstance(self._index, self._faiss.IndexIDMap):
+            return
+        base = self._base()
+        if isinstance(base, self._faiss.IndexIVF) and base.direct_map.type != self._faiss.DirectMap.Hashtable:
+            base.set_direct_map_type(self._faiss.DirectMap.Hashtable)
+
+    def _configure_search(self) -> None:
+        base = self._base()
+        if isinstance(base, self._faiss.IndexHNSW):
+            base.hnsw.efSearch = FAISS_HNSW_EF_SEARCH
+        elif isinstance(base, self._faiss.IndexIVF):
+            base.nprobe = min(FAISS_IVF_NPROBE, base.nlist)
+
+    def _live_vectors(self) -> Tuple[np.ndarray, np.ndarray]:
+        ids = np.array(sorted(i for i in self._objects if i not in self._tombstones), dtype="int64")
+        vectors = np.vstack([self._index.reconstruct(int(i)) for i in ids]) if len(ids) else None
+        return ids, vectors
+
+    def _rebuild(self) -> None:
+        """Reconstruit l'index (compaction HNSW ou passage à IVF une fois entraînable)."""
+        ids, vectors = self._live_vectors()
+        for i in self._tombstones:
+            self._objects.pop(i, None)
+        self._tombstones = set()
+        self._index = self._new_index(self._index.d, training=vectors)
+        if len(ids):
+            self._index.add_with_ids(vectors, ids)
+        self._configure_search()
+
+    def _maybe_rebuild(self) -> None:
+        live = len(self._ids)
+        if self._tombstones and len(self._tombstones) > 0.2 * max(live, 1):
+            self._rebuild()
+        elif (self.index_type == "ivf" and isinstance(self._base(), self._faiss.IndexFlat)
+              and live >= 39 * FAISS_IVF_NLIST):
+            self._rebuild()
+
+    # --- Interface -------------------------------------------------------
+
+    def upsert(self, ids, documents, vectors) -> int:
+        if not ids:
+            return 0
+        matrix = np.asarray(vectors, dtype="float32")
+        self._faiss.normalize_L2(matrix)
+        with self._lock:
+            if self._index is None:
+                self._index = self._new_index(matrix.shape[1])
+                self._configure_search()
+            self._ensure_writable()
+            self._remove_ids([self._ids[u] for u in ids if u in self._ids])
+
+            internal_ids = np.arange(self._next_id, self._next_id + len(ids), dtype="int64")
+            self._next_id += len(ids)
+            self._index.add_with_ids(matrix, internal_ids)
+            for internal_id, object_id, doc in zip(internal_ids.tolist(), ids, documents):
+                self._objects[internal_id] = {
+                    "uuid": object_id,
+                    "content": doc.page_content,
+                    "source": doc.metadata.get("source", ""),
+                    "page": doc.metadata.get("page", 0),
+                }
+                self._ids[object_id] = internal_id
+            self._maybe_rebuild()
+            self._dirty = True
+        return len(ids)
+
+    def _remove_ids(self, internal_ids: List[int]) -> int:
+        if not internal_ids:
+            return 0
+        for internal_id in internal_ids:
+            self._ids.pop(self._objects[internal_id]["uuid"], None)
+        if isinstance(self._base(), self._faiss.IndexHNSW):
+            self._tombstones.update(internal_ids)
+        else:
+            self._index.remove_ids(np.asarray(internal_ids, dtype="int64"))
+            for internal_id in internal_ids:
+                self._objects.pop(internal_id, None)
+        return len(internal_ids)
+
+    def delete(self, ids) -> int:
+        with self._lock:
+            if self._index is None:
+                return 0
+            self._ensure_writable()
+            deleted = self._remove_ids([self._ids[u] for u in ids if u in self._ids])
+            if deleted:
+                self._maybe_rebuild()
+                self._dirty = True
+            return deleted
+
+    def delete_source(self, source: str) -> int:
+        with self._lock:
+            ids = [obj["uuid"] for i, obj in self._objects.items()
+                   if obj["source"] == source and i not in self._tombstones]
+        return self.delete(ids)
+
+    def search(self, vector, k):
+        with self._lock:
+            if self._index is None or not self._ids:
+                return []
+            query = np.asarray([vector], dtype="float32")
+            self._faiss.normalize_L2(query)
+            # Sur-échantillonnage pour compenser les pierres tombales
+            fetch = min(k + len(self._tombstones), self._index.ntotal)
+            scores, internal_ids = self._index.search(query, fetch)
+            results = []
+            for score, internal_id in zip(scores[0], internal_ids[0]):
+                if internal_id < 0 or internal_id in self._tombstones:
+                    continue
+                obj = self._objects[int(internal_id)]
+                results.append((_to_document(obj, obj["uuid"]), float(score)))
+                if len(results) == k:
+                    break
+            return results
+
+    def count(self) -> int:
+        with self._lock:
+            return len(self._ids)
+
+    def sample(self, limit: int = 10) -> List[dict]:
+        with self._lock:
+            return [
+                {key: obj[key] for key in ("content", "source", "page")}
+                for i, obj in self._objects.items() if i not in self._tombstones
+            ][:limit]
+
+    def iterate(self, include_vectors: bool = False):
+        with self._lock:
+            items = [(i, obj) for i, obj in self._objects.items() if i not in self._tombstones]
+        for internal_id, obj in items:
+            vector = None
+            if include_vectors:
+                with self._lock:
+                    vector = self._index.reconstruct(internal_id).tolist()
+            yield obj["uuid"], _to_document(obj, obj["uuid"]), vector
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def create_vector_backend(name: str = VECTOR_BACKEND) -> VectorBackend:
+    if name == "weaviate":
+        return WeaviateBackend()
+    if name == "faiss":
+        return FaissBackend()
+    raise ValueError(f"Moteur vectoriel inconnu : {name} (attendu : weaviate ou faiss)")
+
+
+def get_vector_backend() -> VectorBackend:
+    """Retourne le moteur vectoriel configuré, partagé par le processus."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_vector_backend()
+    return _backend
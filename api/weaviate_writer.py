@@ -0,0 +1,127 @@
+"""Écriture par lots dans Weaviate (client v4, gRPC).
+
+`insert_many` envoyait chaque document en une seule requête. Le writer
+utilise le batching du client v4 (taille fixe ou dynamique) avec plusieurs
+requêtes simultanées, réessaie les objets rejetés, et consomme les objets
+à partir d'un itérable : quand les files du client sont pleines,
+`add_object` bloque et l'itérable (qui calcule les embeddings au fil de
+l'eau) n'avance plus. C'est cette contre-pression qui évite d'accumuler en
+mémoire tous les vecteurs d'un gros document.
+"""
+import time
+from dataclasses import dataclass
+from typing import Iterable, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from config import (
+    WEAVIATE_BATCH_MODE,
+    WEAVIATE_BATCH_SIZE,
+    WEAVIATE_BATCH_CONCURRENCY,
+    WEAVIATE_BATCH_RETRIES,
+)
+
+
+@dataclass
+class WriteStats:
+    inserted: int = 0
+    retried: int = 0
+    failed: int = 0
+    seconds: float = 0.0
+
+    @property
+    def inserted_per_s(self) -> Optional[float]:
+        return round(self.inserted / self.seconds, 1) if self.seconds else None
+
+    def to_dict(self) -> dict:
+        return {
+            "inserted": self.inserted,
+            "retried": self.retried,
+            "failed": self.failed,
+            "seconds": round(self.seconds, 3),
+            "inserted_per_s": self.inserted_per_s,
+        }
+
+
+def _properties(doc: Document) -> dict:
+    return {
+        "content": doc.page_content,
+        "source": doc.metadata.get("source", ""),
+        "page": doc.metadata.get("page", 0),
+    }
+
+
+class WeaviateBatchWriter:
+    """
+    Insère des objets (uuid, Document, vecteur) par lots concurrents.
+
+    Args:
+        collection: Collection Weaviate v4.
+        mode: "fixed" (lots de `batch_size`, `concurrency` requêtes simultanées)
+            ou "dynamic" (taille ajustée par le client selon la charge du serveur).
+        batch_size: Objets par requête en mode "fixed".
+        concurrency: Requêtes simultanées en mode "fixed".
+        max_retries: Nouvelles tentatives pour les objets rejetés.
+    """
+
+    def __init__(self, collection, mode: str = WEAVIATE_BATCH_MODE, batch_size: int = WEAVIATE_BATCH_SIZE,
+                 concurrency: int = WEAVIATE_BATCH_CONCURRENCY, max_retries: int = WEAVIATE_BATCH_RETRIES):
+        self.collection = collection
+        self.mode = mode
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+
+    def _batch(self, batch_size: Optional[int] = None):
+        if self.mode == "dynamic":
+            return self.collection.batch.dynamic()
+        return self.collection.batch.fixed_size(
+            batch_size=batch_size or self.batch_size,
+            concurrent_requests=self.concurrency,
+        )
+
+    def _send(self, objects: Iterable[Tuple[str, dict, list]], batch_size: Optional[int] = None) -> Tuple[int, list]:
+        """Un passage de batching ; retourne (objets envoyés, objets rejetés)."""
+        sent = 0
+        with self._batch(batch_size) as batch:
+            for object_id, properties, vector in objects:
+                batch.add_object(properties=properties, uuid=object_id, vector=vector)
+                sent += 1
+        failed = [
+            (str(error.object_.uuid), error.object_.properties, error.object_.vector, error.message)
+            for error in self.collection.batch.failed_objects
+        ]
+        return sent, failed
+
+    def write(self, objects: Iterable[Tuple[str, Document, list]]) -> WriteStats:
+        """
+        Insère (ou remplace, à UUID identique) les objets fournis.
+
+        Raises:
+            RuntimeError: Si des objets sont encore rejetés après `max_retries` tentatives.
+        """
+        stats = WriteStats()
+        start = time.perf_counter()
+        sent, failed = self._send(
+            (object_id, _properties(doc), vector) for object_id, doc, vector in objects
+        )
+
+        attempt = 0
+        while failed and attempt < self.max_retries:
+            attempt += 1
+            stats.retried += len(failed)
+            print(f"🔁 Weaviate : {len(failed)} objet(s) rejeté(s), tentative {attempt}/{self.max_retries}")
+            time.sleep(min(2 ** attempt * 0.5, 10))
+            # Les objets rejetés sont renvoyés en petits lots
+            _, failed = self._send(
+                ((object_id, properties, vector) for object_id, properties, vector, _ in failed),
+                batch_size=max(1, self.batch_size // 4),
+            )
+
+        stats.seconds = time.perf_counter() - start
+        stats.failed = len(failed)
+        stats.inserted = sent - stats.failed
+        print(f"📤 Weaviate : {stats.inserted} objet(s) insérés ({stats.inserted_per_s} obj/s)")
+        if failed:
+            raise RuntimeError(f"{len(failed)} objets rejetés par Weaviate : {failed[0][3]}")
+        return stats
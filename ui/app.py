@@ -1,7 +1,8 @@
 import streamlit as st
 import requests
+import json
 import os
-import tempfile
+import time
 
 st.set_page_config(page_title="e-QWANZA", layout="centered")
 # st.markdown("<h2 style='text-align: center;'>🤖 AIQWANZA</h2>", unsafe_allow_html=True)
@@ -15,12 +16,43 @@ st.markdown("<h2 style='text-align: center;'>e-QWANZA</h2>", unsafe_allow_html=T
 st.markdown("<p style='text-align: center;'>Gagnez du temps, accédez à la bonne info en un instant. Votre assistant IA est à votre service.</p>", unsafe_allow_html=True)
 
 
+def wait_for_job(job_id: str, filename: str) -> dict:
+    """Interroge /jobs/{id} jusqu'à la fin de l'indexation en affichant la progression."""
+    progress_bar = st.progress(0, text=f"{filename} : en attente...")
+    while True:
+        job = requests.get(f"{API_URL}/jobs/{job_id}").json()
+        progress = job["progress"]
+        total = progress["chunks_total"] or progress["pages_total"] or 0
+        done = progress["chunks_done"] if progress["chunks_total"] else progress["pages_done"]
+        ratio = min(done / total, 1.0) if total else 0.0
+        progress_bar.progress(ratio, text=f"{filename} : {job['stage']}")
+        if job["status"] in ("done", "error"):
+            progress_bar.empty()
+            return job
+        time.sleep(1)
+
+
+def read_sse(response):
+    """Décode un flux Server-Sent Events en couples (événement, données JSON)."""
+    event, data_lines = "message", []
+    for line in response.iter_lines(decode_unicode=True):
+        if line == "":
+            if data_lines:
+                yield event, json.loads("\n".join(data_lines))
+            event, data_lines = "message", []
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data_lines.append(line[len("data:"):].strip())
+
+
 # Section : Uploader un PDF
 st.markdown("### 📎 Uploader un fichier PDF ou PowerPoint")
 
 uploaded_files = st.file_uploader(
-    "Chargez un ou plusieurs fichiers PDF/PPT/PPTX :", 
-    type=["pdf", "ppt", "pptx"], 
+    "Chargez un ou plusieurs fichiers PDF/PPTX :", 
+    # Les .ppt (format binaire antérieur à 2007) sont refusés par l'API : à convertir en .pptx
+    type=["pdf", "pptx"], 
     accept_multiple_files=True
 )
 
@@ -29,23 +61,39 @@ if uploaded_files:
 
     if st.button("Confirmer"):
         with st.spinner("Indexation en cours..."):
-            for uploaded_file in uploaded_files:
-                try:
-                    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-                        tmp.write(uploaded_file.read())
-                        temp_pdf_path = tmp.name
-
-                    index_response = requests.post(
-                        f"{API_URL}/index_pdf", 
-                        files={"pdf_file": open(temp_pdf_path, "rb")}
-                    )
-
-                    if index_response.status_code == 200:
-                        st.success(f"📚 Document '{uploaded_file.name}' indexé avec succès !")
+            try:
+                # Un seul envoi pour tout le lot : l'API traite les fichiers en pipeline
+                index_response = requests.post(
+                    f"{API_URL}/index_batch",
+                    files=[("files", (f.name, f, f.type)) for f in uploaded_files]
+                )
+
+                if index_response.status_code in (200, 202) and "job_id" in index_response.json():
+                    job = wait_for_job(index_response.json()["job_id"], f"{len(uploaded_files)} fichier(s)")
+                    if job["status"] == "done":
+                        failed = job["result"]["failed"]
+                        # Nom de source retenu par l'API pour chaque fichier (extension corrigée)
+                        sources = index_response.json().get("sources", [f.name for f in uploaded_files])
+                        for uploaded_file, source in zip(uploaded_files, sources):
+                            if source in failed:
+                                st.error(f"❌ Erreur pour '{uploaded_file.name}' : {failed[source]}")
+                            else:
+                                st.success(f"📚 Document '{uploaded_file.name}' indexé avec succès !")
+                        throughput = job["result"]["throughput"]
+                        st.caption(
+                            f"⏱️ {throughput['pages_per_s']} pages/s · "
+                            f"{throughput['chunks_per_s']} chunks/s · "
+                            f"{throughput['vectors_per_s']} vecteurs/s"
+                        )
                     else:
-                        st.error(f"❌ Erreur pour '{uploaded_file.name}' : {index_response.status_code}")
-                except Exception as e:
-                    st.error(f"⚠️ Problème avec '{uploaded_file.name}' : {e}")
+                        st.error(f"❌ Erreur d'indexation : {job['error']}")
+                else:
+                    # 400 (fichiers homonymes), 413, 415, 429 : l'API explique le refus
+                    detail = index_response.json().get("detail", "") if index_response.headers.get(
+                        "content-type", "").startswith("application/json") else ""
+                    st.error(f"❌ Erreur API : {index_response.status_code} {detail}".rstrip())
+            except Exception as e:
+                st.error(f"⚠️ Problème lors de l'indexation : {e}")
 
 st.markdown("### 🧠 Choix du modèle de génération")
 model_choice = st.selectbox("Choisissez le modèle LLM :", ["llama3.2", "mistral", "deepseek-r1:7b"])
@@ -62,23 +110,38 @@ if st.button("Obtenir une réponse"):
             "model": model_choice
         }
 
-        with st.spinner("Analyse de votre question... ⏳"):
-            try:
-                # Send request to API
-                response = requests.post(f"{API_URL}/predict", json=payload)
-
-                # Process response
-                if response.status_code == 200:
-                    result = response.json()
-                    st.success("✅ Réponse obtenue avec succès !")
-                    st.markdown(f"**📌 Question :** {question}")
-                    st.markdown(f"**📝 Réponse :** {result['result']}")
-
-                else:
-                    st.error(f"🚨 Erreur API : {response.status_code}")
-
-            except requests.exceptions.RequestException as e:
-                st.error(f"❌ Problème de connexion avec l'API : {e}")
+        try:
+            # Send request to API (réponse diffusée token par token)
+            response = requests.post(f"{API_URL}/predict_stream", json=payload, stream=True)
+
+            # Process response
+            if response.status_code == 200:
+                st.markdown(f"**📌 Question :** {question}")
+                answer_placeholder = st.empty()
+                answer_placeholder.markdown("**📝 Réponse :** ⏳")
+                answer = ""
+                for event, data in read_sse(response):
+                    if event == "sources":
+                        if data["route"] == "grounded":
+                            sources = sorted({f"{s['source']} (p. {s['page']})" for s in data["sources"]})
+                            st.caption("📚 Sources : " + " · ".join(sources))
+                        else:
+                            st.caption("ℹ️ Réponse hors documents indexés")
+                    elif event == "token":
+                        answer += data
+                        answer_placeholder.markdown(f"**📝 Réponse :** {answer}▌")
+                    elif event == "done":
+                        answer_placeholder.markdown(f"**📝 Réponse :** {answer}")
+                        st.success(f"✅ Réponse obtenue avec succès ! "
+                                   f"(premier token : {data['ttft_ms'] / 1000:.1f}s)")
+                    elif event == "error":
+                        st.error(data)
+
+            else:
+                st.error(f"🚨 Erreur API : {response.status_code}")
+
+        except requests.exceptions.RequestException as e:
+            st.error(f"❌ Problème de connexion avec l'API : {e}")
 
     else:
         st.warning("⚠️ Veuillez entrer une question avant de soumettre.")